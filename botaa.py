@@ -22,78 +22,68 @@
 # Author Gaius Mulley <gaius.mulley@southwales.ac.uk>
 #
 
-from array2d import array2d
+from chgrid import glyphGrid, numberGrid
 from chvec import *
 from botutils import *
+from chroom import readPen
+from chpvs import floorPlan, computePvs, loadPvs, pvsName, doorSquares, doorKey
 
-import sys
 import os
+import heapq
+import math
+import threading
+from collections import OrderedDict
 initMapSize = 1
 
 
 mapdir = os.path.join (os.environ['HOME'], ".local/share/dhewm3/base/maps")
-debugging = False
-debugroute = False
-debugmap = True
+log = getLog ("botaa")
 
-status_open, status_closed, status_secret = list(range(3))
-rooms = {}           #  dictionary of rooms
-maxx, maxy = 0, 0    #  the size of our map
 INFINITY = 1000000   #  must be bigger than all computed distance costs
 wallCost = 0         #  a number used to represent the cost of going through a wall
 
+entityPenalty = 8    #  the extra cost of entering a square occupied by an entity
+blockingClasses = ["player", "python_doommarine", "monster_"]   #  the classname prefixes of the entities in the way
+penaltyDecay = 0.5   #  the fraction of a penalty which remains after each update
+routeCacheSize = 256 #  the number of routes remembered by calcnav
+flowCacheSize = 16   #  the number of flow fields remembered
+sharedFlows = OrderedDict ()   #  the flow fields of the static cost layer of each map
+cooperativeWindow = 16   #  the number of steps of a route reserved by calcnavCooperative
+waitCost = 1         #  the cost of waiting on a square for one step
+sharedReservations = {}   #  the reservation table of each map
+closedDoorsBlockSight = False  #  closed and secret doors block the line of sight (pen2map builds them open)
+sightCacheSize = 65536   #  the number of line of sight results remembered
+sightInset = 0.05    #  the distance of the sampled corners from the edges of a square
+influenceRadius = 6  #  the number of squares an influence spreads
+influenceFalloff = 0.6   #  the fraction of an influence which remains each square it spreads
+influenceDecay = 0.8     #  the fraction of an event influence which remains each tick
+influenceMinimum = 0.05  #  influences below this are forgotten
+influenceWeights = {"threat": 4, "damage": 8}   #  the route cost of one unit of each layer
+
+#  the searches which calcnav can use
+gridSearch, roomSearch, jumpSearch = list(range(3))
+
+
+#
+#  drPrintf - log route detail.
+#
 
 def drPrintf (format, *args):
-    if debugroute:
-        printf (format, args)
+    log.log (TRACE, format.rstrip (), *args)
+
+#
+#  dPrintf - log debugging information.
+#
 
 def dPrintf (format, *args):
-    if debugging:
-        printf (format, args)
+    log.debug (format.rstrip (), *args)
 
-def dmPrintf (format, *args):
-    if debugmap:
-        printf (format, args)
-
-
-class roomInfo:
-    def __init__ (self, r, w, d):
-        self.walls = w
-        self.doors = d
-        self.doorLeadsTo = []
-        self.pythonMonsters = []
-        self.monsters = []
-        self.weapons = []
-        self.ammo = []
-        self.lights = []
-        self.worldspawn = []
-        self.labels = {}
-    def _addWall (self, line):
-        global maxx, maxy
-        line = toLine (line)
-        self.walls += [line]
-        maxx = max (line[0][0], maxx)
-        maxx = max (line[1][0], maxx)
-        maxy = max (line[0][1], maxy)
-        maxy = max (line[1][1], maxy)
-    def _addDoor (self, line, leadsto, status):
-        self.doors += [[toLine (line), leadsto, status]]
-    def _addAmmo (self, ammoType, ammoAmount, ammoPos):
-        self.ammo += [[ammoType, ammoAmount, ammoPos]]
-    def _addLight (self, pos):
-        self.lights += [intVec (pos)]
-    def _addWeapon (self, weapon, pos):
-        self.weapons += [[weapon, pos]]
-    def _addPythonMonster (self, monType, pos):
-        self.pythonMonsters += [[monType, pos]]
-    def _addMonster (self, monType, pos):
-        self.monsters += [[monType, pos]]
-    def _addPlayerSpawn (self, pos):
-        self.worldspawn += [pos]
-    def _addLabel (self, label, pos):
-        self.labels[label] = pos
-        print ("all labels =", self.labels)
+#
+#  dmPrintf - log map detail.
+#
 
+def dmPrintf (format, *args):
+    log.log (TRACE, format.rstrip (), *args)
 
 #
 #  isVertical - return True if, c, is a vertical line.
@@ -126,7 +116,7 @@ def toLine (l):
 #
 
 def _sortWall (w):
-    dPrintf ("sortwall", w)
+    dPrintf ("sortwall %s", w)
     if isVertical (w):
         if w[0][1] > w[1][1]:
             return [w[1], w[0]]
@@ -138,12 +128,522 @@ def _sortWall (w):
     errorLine ("the wall must be horizontal or vertical")
 
 
-def newRoom (n):
-    global rooms
-    if n in rooms:
-        errorLine ("room " + n + " has already been defined")
-    rooms[n] = roomInfo (n, [], [])
-    return rooms[n]
+#
+#  _nearReached - return True if any square in, changed, or one of its
+#                 neighbours is a key of the dictionary, reached.
+#
+
+def _nearReached (reached, changed):
+    for k in changed:
+        for dx in [-1, 0, 1]:
+            for dy in [-1, 0, 1]:
+                if (k[0] + dx, k[1] + dy) in reached:
+                    return True
+    return False
+
+
+#
+#  _routeRegion - return the squares [x0, y0, x1, y1] which a route of,
+#                 cost, from, src, to, dest, can depend upon.  Every
+#                 step costs at least one, so any route as cheap stays
+#                 within cost squares of both ends.  The region is
+#                 widened by one for the corners cut by diagonal steps.
+#
+
+def _routeRegion (src, dest, cost):
+    return [max (src[0], dest[0]) - cost - 1, max (src[1], dest[1]) - cost - 1,
+            min (src[0], dest[0]) + cost + 1, min (src[1], dest[1]) + cost + 1]
+
+
+#
+#  _inRegion - return True if any square in, changed, lies inside, region.
+#
+
+def _inRegion (changed, region):
+    for k in changed:
+        if (region[0] <= k[0] <= region[2]) and (region[1] <= k[1] <= region[3]):
+            return True
+    return False
+
+
+#
+#  distanceField - the costs of the routes from one square, src, to the
+#                  rest of the map.  The Dijkstra search is only run as
+#                  far as the queries need and is resumed by later
+#                  queries, so a field can answer many questions about
+#                  routes from the same square.
+#
+
+class distanceField:
+    def __init__ (self, area, src):
+        self._aas = area
+        self._src = (src[0], src[1])
+        self._cost = {self._src: 0}
+        self._prev = {self._src: None}
+        self._done = set ()
+        self._queue = [(0, self._src)]
+
+    #
+    #  reached - return True if the search has reached square, p.
+    #
+
+    def reached (self, p):
+        return (p[0], p[1]) in self._cost
+
+    #
+    #  getSrc - return the square from which the field was calculated.
+    #
+
+    def getSrc (self):
+        return self._src
+
+    #
+    #  touches - return True if a change to the cost of any square in,
+    #            changed, can alter the field.  A square which neither
+    #            the search nor its neighbours reached is met later, if
+    #            at all, with its new cost.
+    #
+
+    def touches (self, changed):
+        return _nearReached (self._cost, changed)
+
+    #
+    #  _settleNext - settle the next square of the search and return it,
+    #                or None if every reachable square has been settled.
+    #
+
+    def _settleNext (self):
+        while self._queue != []:
+            c, u = heapq.heappop (self._queue)
+            if u not in self._done:
+                self._done.add (u)
+                for v in self._aas._getNeighbours (u):
+                    v = (v[0], v[1])
+                    alternative = c + self._aas._getLength (v)
+                    if (alternative < INFINITY) and ((v not in self._cost) or (alternative < self._cost[v])):
+                        self._cost[v] = alternative
+                        self._prev[v] = u
+                        heapq.heappush (self._queue, (alternative, v))
+                return u
+        return None
+
+    #
+    #  nearest - return the square in, targets, with the cheapest route
+    #            from src or None if none can be reached.
+    #
+
+    def nearest (self, targets):
+        targets = set ([(t[0], t[1]) for t in targets])
+        best = None
+        for t in targets & self._done:
+            if (best == None) or (self._cost[t] < self._cost[best]):
+                best = t
+        while best == None:
+            u = self._settleNext ()
+            if u == None:
+                return None
+            if u in targets:
+                best = u
+        return best
+
+    #
+    #  cost - return the cost of the route from src to, p, or None if p
+    #         cannot be reached.
+    #
+
+    def cost (self, p):
+        if self.nearest ([p]) == None:
+            return None
+        return self._cost[(p[0], p[1])]
+
+    #
+    #  route - return the list of squares on the route from src to, p.
+    #
+
+    def route (self, p):
+        if self.nearest ([p]) == None:
+            return []
+        return self._aas._followPrev (self._prev, p)
+
+
+#
+#  flowField - the costs of the routes from every square of the map to
+#              one square, dest, and the next square to step onto.  It
+#              is calculated once by a Dijkstra search backwards from
+#              dest and afterwards any number of bots heading for dest
+#              can look up their next hop.
+#
+
+class flowField:
+    def __init__ (self, area, dest):
+        self._dest = (dest[0], dest[1])
+        self._cost = {}
+        self._next = {}
+        if area._walkable (dest[0], dest[1]):
+            self._cost[self._dest] = 0
+            self._next[self._dest] = None
+        done = set ()
+        queue = [(0, self._dest)]
+        while queue != []:
+            c, v = heapq.heappop (queue)
+            if (v not in done) and (v in self._cost):
+                done.add (v)
+                #  stepping from a neighbour onto v costs the length of v.
+                alternative = c + area._getLength (v)
+                for u in area._getNeighbours (v):
+                    u = (u[0], u[1])
+                    if (u not in self._cost) or (alternative < self._cost[u]):
+                        self._cost[u] = alternative
+                        self._next[u] = v
+                        heapq.heappush (queue, (alternative, u))
+
+    #
+    #  getDest - return the square to which the field was calculated.
+    #
+
+    def getDest (self):
+        return self._dest
+
+    #
+    #  touches - return True if a change to the cost of any square in,
+    #            changed, can alter the field.  A square which neither
+    #            the search nor its neighbours reached is met later, if
+    #            at all, with its new cost.
+    #
+
+    def touches (self, changed):
+        return _nearReached (self._cost, changed)
+
+    #
+    #  cost - return the cost of the route from, p, to dest, or None if
+    #         dest cannot be reached.
+    #
+
+    def cost (self, p):
+        return self._cost.get ((p[0], p[1]), None)
+
+    #
+    #  nextHop - return the square to step onto from, p, or None if p is
+    #            dest or dest cannot be reached.
+    #
+
+    def nextHop (self, p):
+        n = self._next.get ((p[0], p[1]), None)
+        if n == None:
+            return None
+        return [n[0], n[1]]
+
+    #
+    #  route - return the list of squares on the route from, p, to dest.
+    #
+
+    def route (self, p):
+        p = (p[0], p[1])
+        if p not in self._next:
+            return []
+        r = []
+        while p != None:
+            r += [[p[0], p[1]]]
+            p = self._next[p]
+        return r
+
+
+#
+#  reservationTable - the squares which the bots of a process intend to
+#                     occupy at each step of time.  A step is the time
+#                     taken to move one square.  A bot reserves the
+#                     squares of its route so that the other bots plan
+#                     their routes around it.  Each bot keeps its own
+#                     clock, advanced as it follows its route, and the
+#                     reservations are only forgotten once the slowest
+#                     bot has passed them.
+#
+
+class reservationTable:
+    def __init__ (self):
+        self._now = 0
+        self._clocks = {}     #  owner -> step
+        self._cells = {}      #  (x, y, t) -> owner
+        self._moves = {}      #  (from, to, t) -> owner
+        self._owned = {}      #  owner -> [cell keys, move keys]
+
+    #
+    #  now - return the current step, the step of the slowest bot.
+    #
+
+    def now (self):
+        return self._now
+
+    #
+    #  clock - return the step of, owner.  A bot without a clock starts
+    #          at the current step.
+    #
+
+    def clock (self, owner):
+        return self._clocks.get (owner, self._now)
+
+    #
+    #  advanceOwner - advance the clock of, owner, to step, t, unless it is
+    #                 already later.  The current step follows the
+    #                 slowest bot.
+    #
+
+    def advanceOwner (self, owner, t):
+        if t > self.clock (owner):
+            self._clocks[owner] = t
+            self.advance (min (self._clocks.values ()))
+
+    #
+    #  tick - advance the clock by, steps, and forget the reservations
+    #         which are now in the past.
+    #
+
+    def tick (self, steps = 1):
+        self.advance (self._now + steps)
+
+    #
+    #  advance - advance the clock to step, t, unless it is already later,
+    #            and forget the reservations which are now in the past.
+    #            The bots behind t are brought up to it.
+    #
+
+    def advance (self, t):
+        if t <= self._now:
+            return
+        self._now = t
+        for owner in self._clocks:
+            self._clocks[owner] = max (self._clocks[owner], t)
+        for owner in list (self._owned.keys ()):
+            cells, moves = self._owned[owner]
+            for k in [k for k in cells if k[2] < self._now]:
+                if self._cells.get (k, None) == owner:
+                    del self._cells[k]
+                cells.remove (k)
+            for k in [k for k in moves if k[2] < self._now]:
+                if self._moves.get (k, None) == owner:
+                    del self._moves[k]
+                moves.remove (k)
+
+    #
+    #  isFree - return True if square, p, is not reserved at step, t,
+    #           by anyone other than, owner.
+    #
+
+    def isFree (self, p, t, owner):
+        return self._cells.get ((p[0], p[1], t), owner) == owner
+
+    #
+    #  isSwap - return True if moving from, u, to, v, during step, t,
+    #           would pass a bot moving from v to u.
+    #
+
+    def isSwap (self, u, v, t, owner):
+        return self._moves.get ((v, u, t), owner) != owner
+
+    #
+    #  passed - return True if every other bot reserving square, p, at a
+    #           step up to, t, has already moved on.
+    #
+
+    def passed (self, p, t, owner):
+        for s in range (self._now, t + 1):
+            o = self._cells.get ((p[0], p[1], s), owner)
+            if (o != owner) and (self.clock (o) <= s):
+                return False
+        return True
+
+    #
+    #  reserve - reserve the list of squares, path, for, owner, starting
+    #            at step, t.  The clock of owner starts at t.
+    #
+
+    def reserve (self, owner, path, t):
+        if owner not in self._clocks:
+            self._clocks[owner] = t
+        if owner not in self._owned:
+            self._owned[owner] = [[], []]
+        cells, moves = self._owned[owner]
+        for i, p in enumerate (path):
+            k = (p[0], p[1], t + i)
+            self._cells[k] = owner
+            cells += [k]
+            if i > 0:
+                k = ((path[i-1][0], path[i-1][1]), (p[0], p[1]), t + i - 1)
+                self._moves[k] = owner
+                moves += [k]
+
+    #
+    #  release - forget every reservation made by, owner.
+    #
+
+    def release (self, owner):
+        if owner in self._owned:
+            cells, moves = self._owned[owner]
+            for k in cells:
+                if self._cells.get (k, None) == owner:
+                    del self._cells[k]
+            for k in moves:
+                if self._moves.get (k, None) == owner:
+                    del self._moves[k]
+            del self._owned[owner]
+
+    #
+    #  leave - forget every reservation and the clock of, owner, so the
+    #          slowest bot no longer waits for it.
+    #
+
+    def leave (self, owner):
+        self.release (owner)
+        if owner in self._clocks:
+            del self._clocks[owner]
+            if self._clocks != {}:
+                self.advance (min (self._clocks.values ()))
+
+
+#
+#  influenceMap - the spatial influence of the objects of the game on
+#                 the squares of the map, held in named layers (for
+#                 example "threat", "damage" and "items").  An influence
+#                 spreads from its square across the walkable squares,
+#                 losing influenceFalloff each square, so walls stop it.
+#                 Presences (a monster, an item) are moved by setting
+#                 them again and only their old and new spread is
+#                 touched.  Events (damage taken) fade each tick.
+#
+
+class influenceMap:
+    def __init__ (self, area):
+        self._aas = area
+        self._events = {}       #  layer -> {square: value}
+        self._presence = {}     #  layer -> {square: value}
+        self._sources = {}      #  key -> [layer, {square: value}]
+
+    #
+    #  _spread - return the influence of, strength, at square, p, on
+    #            the squares around it.
+    #
+
+    def _spread (self, p, strength):
+        p = (p[0], p[1])
+        spread = {}
+        if not self._aas._walkable (p[0], p[1]):
+            return spread
+        frontier = [p]
+        spread[p] = float (strength)
+        value = float (strength)
+        for step in range (influenceRadius):
+            value *= influenceFalloff
+            if value < influenceMinimum:
+                break
+            reached = []
+            for u in frontier:
+                for v in self._aas._getNeighbours (u):
+                    v = (v[0], v[1])
+                    if v not in spread:
+                        spread[v] = value
+                        reached += [v]
+            frontier = reached
+        return spread
+
+    #
+    #  _add - add the squares of, spread, multiplied by, sign, to the
+    #         layer dictionary, d.
+    #
+
+    def _add (self, d, spread, sign):
+        for k, v in spread.items ():
+            v = d.get (k, 0) + sign * v
+            if v < influenceMinimum:
+                if k in d:
+                    del d[k]
+            else:
+                d[k] = v
+
+    #
+    #  setPresence - place the presence, key, of, strength, at square, p,
+    #                in, layer.  A previous presence of key is removed.
+    #
+
+    def setPresence (self, key, layer, p, strength):
+        self.removePresence (key)
+        spread = self._spread (p, strength)
+        if layer not in self._presence:
+            self._presence[layer] = {}
+        self._add (self._presence[layer], spread, 1)
+        self._sources[key] = [layer, spread]
+
+    #
+    #  removePresence - remove the presence, key.
+    #
+
+    def removePresence (self, key):
+        if key in self._sources:
+            layer, spread = self._sources[key]
+            self._add (self._presence[layer], spread, -1)
+            del self._sources[key]
+
+    #
+    #  addEvent - add an event of, strength, at square, p, to, layer.
+    #             Its influence fades each tick.
+    #
+
+    def addEvent (self, layer, p, strength):
+        if layer not in self._events:
+            self._events[layer] = {}
+        self._add (self._events[layer], self._spread (p, strength), 1)
+
+    #
+    #  tick - fade the events by, factor.
+    #
+
+    def tick (self, factor = influenceDecay):
+        for d in self._events.values ():
+            for k in list (d.keys ()):
+                v = d[k] * factor
+                if v < influenceMinimum:
+                    del d[k]
+                else:
+                    d[k] = v
+
+    #
+    #  get - return the influence of, layer, at square, p.
+    #
+
+    def get (self, layer, p):
+        k = (p[0], p[1])
+        return self._events.get (layer, {}).get (k, 0) + self._presence.get (layer, {}).get (k, 0)
+
+    #
+    #  costs - return a dictionary mapping each influenced square onto
+    #          its extra route cost, the sum of its layers multiplied by
+    #          their, weights.
+    #
+
+    def costs (self, weights):
+        total = {}
+        for layers in [self._events, self._presence]:
+            for layer, d in layers.items ():
+                w = weights.get (layer, 0)
+                if w > 0:
+                    for k, v in d.items ():
+                        total[k] = total.get (k, 0) + w * v
+        result = {}
+        for k, v in total.items ():
+            if int (v) > 0:
+                result[k] = int (v)
+        return result
+
+    #
+    #  best - return the square of, squares, with the greatest influence
+    #         in, layer, or None if squares is empty.
+    #
+
+    def best (self, layer, squares):
+        b = None
+        for p in squares:
+            if (b == None) or (self.get (layer, p) > self.get (layer, b)):
+                b = p
+        return b
 
 
 #
@@ -151,15 +651,39 @@ def newRoom (n):
 #
 
 class aas:
-    def __init__ (self, mapname):
+    def __init__ (self, mapname, penmap = None):
         self._verbose = False
         self._route = []
-        self._floor = array2d (initMapSize, initMapSize, ' ')
-        self._weightings = array2d (initMapSize, initMapSize, [1])
-        self._currentLineNo = 1
-        self._loadMap (mapname)
+        self._neighbours = {}
+        self._field = None
+        self._penalties = {}
+        self._influenceCosts = {}
+        self._influence = None
+        self._blocked = set ()
+        self._entityClasses = {}
+        self._routeChanged = False
+        self._routes = OrderedDict ()
+        self._flows = OrderedDict ()
+        self._version = 0
+        self._routeHits = 0
+        self._routeMisses = 0
+        self._prefetched = set ()
+        self._lock = threading.RLock ()
+        self._changes = 0
+        self._schedule = None
+        self._prefetches = 0
+        self._prefetchHits = 0
+        self._floor = glyphGrid (initMapSize, initMapSize, ' ')
+        self._weightings = numberGrid (initMapSize, initMapSize, 1)
+        if penmap == None:
+            penmap = self._loadMap (mapname)
+        else:
+            self._filename = mapname
+        self._map = penmap
         self._recreateFloor (None)
         self._calcWeightings ()
+        self._loadRooms ()
+        self._loadPvs ()
 
     #
     #  _drawLine -
@@ -193,26 +717,51 @@ class aas:
 
     def _recreateFloor (self, b):
         del self._floor
-        self._floor = array2d (initMapSize, initMapSize, ' ')
-        for r in list(rooms.keys ()):
-            for w in rooms[r].walls:
-                self._drawLine (w, '#')
-            for d in rooms[r].doors:
-                self._drawLine (d[0], ' ')
-            for l in rooms[r].lights:
+        self._field = None
+        self._neighbours = {}
+        self._newVersion ()
+        self._floor = glyphGrid (initMapSize, initMapSize, ' ')
+        for r in self._map.rooms.values ():
+            for w in r.walls:
+                self._drawLine (toLine (w), '#')
+            for d in r.doors:
+                self._drawLine (toLine (d[0]), ' ')
+            for l in self._pillars (r):
                 self._floor.set (l[0], l[1], 'l')
-        if debugmap:
-            self.printFloor ()
+        self._calcOpaque ()
+        if log.isEnabledFor (TRACE):
+            log.log (TRACE, "floor plan\n%s", self.floorText ())
         if b != None:
             self._updateEntities (b)
 
     #
-    #  updateKnowlege - generate a floor map with all static and dynamic entities
-    #                   placed on it.
+    #  _calcOpaque - record the squares which block the line of sight.
+    #                These are the walls and, if closedDoorsBlockSight,
+    #                the closed and secret doors.
+    #
+
+    def _calcOpaque (self):
+        self._sight = {}
+        self._opaque = numberGrid (self._floor.high ()[0], self._floor.high ()[1], 0)
+        for x in range (self._floor.high ()[0]):
+            for y in range (self._floor.high ()[1]):
+                if self._floor.get (x, y) == '#':
+                    self._opaque.set (x, y, 1)
+        if closedDoorsBlockSight:
+            for r in self._map.rooms.values ():
+                for d in r.doors:
+                    if d[1] != 'OPEN':
+                        for p in doorSquares (d[0]):
+                            self._opaque.set (p[0], p[1], 1)
+
+    #
+    #  updateKnowlege - update the dynamic layer with the entities of the
+    #                   game, b.  The static floor and weightings are
+    #                   left alone.
     #
 
     def updateKnowlege (self, b):
-        self._recreateFloor (b)
+        self._updateEntities (b)
 
 
     #
@@ -223,606 +772,606 @@ class aas:
 
     def _calcWeightings (self):
         del self._weightings
-        self._weightings = array2d (self._floor.high ()[0], self._floor.high ()[1], [1])
-        for r in list(rooms.keys ()):
-            for w in rooms[r].walls:
-                self._weightLine (w, [wallCost])
-            for d in rooms[r].doors:
-                self._weightLine (d[0], [1])
-            for l in rooms[r].lights:
-                self._weightings.set (l[0], l[1], [wallCost])
-        if debugmap:
-            self.printWeightings ()
+        self._field = None
+        self._neighbours = {}
+        self._newVersion ()
+        self._weightings = numberGrid (self._floor.high ()[0], self._floor.high ()[1], 1)
+        for r in self._map.rooms.values ():
+            for w in r.walls:
+                self._weightLine (toLine (w), wallCost)
+            for d in r.doors:
+                self._weightLine (toLine (d[0]), 1)
+            for l in self._pillars (r):
+                self._weightings.set (l[0], l[1], wallCost)
+        if log.isEnabledFor (TRACE):
+            log.log (TRACE, "weightings\n%s", self.weightingsText ())
 
     #
-    #  updateEntities - add movable and fixed entities to our aa map.
+    #  _pillars - return the positions of the lights in room, r, which
+    #             create a pillar.  These are the MID lights (the default)
+    #             and the bot needs to avoid them.
     #
 
-    def _updateEntities (self, b):
-        self._entities = []
-        for e in range (b.maxobj ()):
-            pass
+    def _pillars (self, r):
+        p = []
+        for pos, colour, on in r.lights:
+            if (on == None) or (on == 'MID'):
+                p += [pos]
+        return p
 
-    def printXaxis (self, top):
-        if not top:
-            s = "  +" + self._floor.high ()[0] * "-"
-            printf ("%s-+\n", s)
-        s = "   "
-        for i in range (self._floor.high ()[0]):
-            if i % 10 == 0:
-                s += "%d" % int (i / 10)
-            else:
-                s += " "
-        printf ("%s\n", s)
-        if top:
-            s = "  +" + self._floor.high ()[0] * "-"
-            printf ("%s-+\n", s)
+    #
+    #  _updateEntities - penalise the squares of the entities of the game,
+    #                    b, which are in the way.  The bot itself and the
+    #                    entities which are walked over, such as ammo and
+    #                    weapons, are ignored.
+    #
+
+    def _updateEntities (self, b):
+        positions = []
+        me = b.me ()
+        for e in b.allobj ():
+            if (e != me) and self._isBlocking (b, e):
+                positions += [b.d2pv (b.getpos (e))]
+        self.updatePenalties (positions)
 
     #
-    #  inRoute - return True if pos is in the current route.
+    #  _isBlocking - return True if entity, e, of the game, b, is in the
+    #                way of the bots.  The classnames are remembered as
+    #                they never change.
     #
 
-    def inRoute (self, pos):
-        for p in self._route:
-            if equVec (p, pos):
+    def _isBlocking (self, b, e):
+        if e not in self._entityClasses:
+            self._entityClasses[e] = b.objectname (e)
+        for c in blockingClasses:
+            if self._entityClasses[e].startswith (c):
                 return True
         return False
 
     #
-    #  printFloor - print out the floor plan of the map
+    #  updatePenalties - decay the existing penalties and add entityPenalty
+    #                    to the squares in, positions.
     #
 
-    def printFloor (self, src = None, dest = None):
-        self.printXaxis (True)
-        yaxis = list(range(self._floor.high ()[1]))
-        yaxis.reverse ()
-        for j in yaxis:
-            s = "%2d" % j
-            s += "|"
-            for i in range (self._floor.high ()[0]):
-                curpos = [i, j]
-                if (src != None) and equVec (curpos, src):
-                    s += 'S'
-                elif (dest != None) and equVec (curpos, dest):
-                    s += 'E'
-                elif self.inRoute (curpos):
-                    s += '*'
-                else:
-                    s += self._floor.get (i, j)
-            s += " |"
-            s += "%2d" % j
-            printf ("%s\n", s)
-        self.printXaxis (False)
-
+    def updatePenalties (self, positions):
+        changed = self._decayPenalties (penaltyDecay)
+        for p in positions:
+            changed += self._changePenalty (p, self._penalties.get ((p[0], p[1]), 0) + entityPenalty)
+        self._invalidate (changed)
 
     #
-    #  printWeightings - print out the floor weighings of the map
+    #  setPenalty - set the extra cost of entering square, p, to, amount.
+    #               The static weightings are unchanged.
     #
 
-    def printWeightings (self):
-        self.printXaxis (True)
-        yaxis = list(range(self._floor.high ()[1]))
-        yaxis.reverse ()
-        for j in yaxis:
-            s = "%2d" % j
-            s += "|"
-            for i in range (self._floor.high ()[0]):
-                if self._weightings.get (i, j) == 0:
-                    s += '0'
-                else:
-                    s += '1'
-            printf ("%s\n", s)
-        self.printXaxis (False)
-
+    def setPenalty (self, p, amount):
+        self._invalidate (self._changePenalty (p, amount))
 
     #
-    #  lexicalPen - return a list of tokens to be read by the parser.
-    #               A special token <eoln> is added at the end of each line.
-    #               <eof> is added at the end.
+    #  _changePenalty - set the penalty of square, p, to, amount, and
+    #                   return the list of squares whose cost changed.
     #
 
-    def lexicalPen (self, i):
-        words = []
-        for l in i.readlines ():
-            w = l.split ()
-            w += ['<eoln>']
-            for j in w:
-                if j != "":
-                    i = j.rstrip ()
-                    words += [i]
-            words += ['<eof>']
-        return words
+    def _changePenalty (self, p, amount):
+        k = (p[0], p[1])
+        if self._penalties.get (k, 0) == amount:
+            return []
+        if amount > 0:
+            self._penalties[k] = amount
+        else:
+            del self._penalties[k]
+        return [k]
 
     #
-    #  _loadMap - internal method which is run when the constructor
-    #             is initiated.
+    #  addPenalty - add, amount, to the extra cost of entering square, p.
     #
 
-    def _loadMap (self, mapname):
-        self._filename = os.path.join (mapdir, mapname)
-        printf ("need to read in: %s\n", self._filename)
-        self.words = self.lexicalPen (open (self._filename, 'r'))
-        self.parsePen ()
+    def addPenalty (self, p, amount):
+        self.setPenalty (p, self._penalties.get ((p[0], p[1]), 0) + amount)
 
     #
-    #  errorLine - issue an error message using the filename and line of error.
+    #  decayPenalties - reduce every penalty by, factor.  Only the squares
+    #                   with a penalty are visited.
     #
 
-    def errorLine (self, text):
-        printf ("%s:%d:%s\n" % (self._filename, self._currentLineNo, text))
+    def decayPenalties (self, factor = penaltyDecay):
+        self._invalidate (self._decayPenalties (factor))
 
     #
-    #  doGetToken - return the first word and remaining words.
-    #               return car, cdr
-    #               at a mimimum cdr will always contain ['<eof>']
+    #  _decayPenalties - reduce every penalty by, factor, and return the
+    #                    list of squares whose cost changed.
     #
 
-    def doGetToken (self):
-        if len (self.words) > 1:
-            return self.words[0], self.words[1:]
-        elif len (self.words) == 1:
-            return self.words[0], ['<eof>']
+    def _decayPenalties (self, factor):
+        changed = []
+        for k in list (self._penalties.keys ()):
+            changed += self._changePenalty (k, int (self._penalties[k] * factor))
+        return changed
 
+    #
+    #  setBlocked - mark square, p, as blocked (or free if blocked is False)
+    #               by a dynamic obstacle.
+    #
 
-    def expectEoln (self):
-        if self.words[0] == '<eoln>':
-            self._currentLineNo += 1
-            self.words = self.words[1:]
-
+    def setBlocked (self, p, blocked = True):
+        k = (p[0], p[1])
+        if blocked != (k in self._blocked):
+            with self._lock:
+                if blocked:
+                    self._blocked.add (k)
+                else:
+                    self._blocked.remove (k)
+                self._invalidate ([k])
+                for dx in [-1, 0, 1]:
+                    for dy in [-1, 0, 1]:
+                        n = '%d_%d' % (k[0] + dx, k[1] + dy)
+                        if n in self._neighbours:
+                            del self._neighbours[n]
+
+    #
+    #  _invalidate - forget the cached searches whose cost depends on the
+    #                squares in, changed.  A remembered route is only
+    #                forgotten if a changed square lies in its region and
+    #                a field only if its search came near a changed square,
+    #                whether the cost went up or down.  The route is only
+    #                scanned once.  The route cache is shared with
+    #                prefetch and so is changed under the lock.
+    #
+
+    def _invalidate (self, changed):
+        if changed == []:
+            return
+        with self._lock:
+            self._changes += 1
+            for k in list (self._routes.keys ()):
+                region = self._routes[k][2]
+                if (region == None) or _inRegion (changed, region):
+                    del self._routes[k]
+                    self._prefetched.discard (k)
+        for k in list (self._flows.keys ()):
+            if self._flows[k].touches (changed):
+                del self._flows[k]
+        if (self._field != None) and self._field.touches (changed):
+            self._field = None
+        route = set ()
+        for p in self._route:
+            route.add ((p[0], p[1]))
+        for k in changed:
+            for n in self._squareRooms.get (k, []):
+                if n in self._doorCosts:
+                    del self._doorCosts[n]
+            if (k[0], k[1]) in route:
+                self._routeChanged = True
 
     #
-    #  get - returns the next token and the remainder of the words.
+    #  routeChanged - return True if the cost of a square on the current
+    #                 route has changed since the route was calculated.
     #
 
-    def get (self):
-        n, self.words = self.doGetToken ()
-        while n == '<eoln>':
-            self.expectEoln ()
-            n, self.words = self.doGetToken ()
-        return n
-
+    def routeChanged (self):
+        return self._routeChanged
 
     #
-    #  peek - returns the first token without removing it from input.
-    #         It will advance the linenumber if <eoln> is seen.
+    #  _uniformCost - return True if no penalties or influence costs are
+    #                 present, so every free square costs the same.
     #
 
-    def peek (self):
-        n = self.words[0]
-        while n == '<eoln>':
-            self.expectEoln ()
-            return self.peek ()
-        return n
-
+    def _uniformCost (self):
+        return (self._penalties == {}) and (self._influenceCosts == {})
 
     #
-    #  expect - expect a token, t.
+    #  getInfluence - return the influence map of the game.  It starts
+    #                 with the monsters of the pen map as threats and the
+    #                 ammo and weapons as items.
     #
 
-    def expect (self, t):
-        g = self.get ()
-        if g != t:
-            self.errorLine ('expecting ' + t + ' and seen ' + g)
-
+    def getInfluence (self):
+        if self._influence == None:
+            self._influence = influenceMap (self)
+            for n, r in self._map.rooms.items ():
+                for i, (kind, pos) in enumerate (r.monsters):
+                    if not kind.startswith ("python_doommarine"):
+                        self._influence.setPresence (("monster", n, i), "threat", pos, 1)
+                for i, (kind, amount, pos) in enumerate (r.ammo):
+                    self._influence.setPresence (("ammo", n, i), "items", pos, 1)
+                for i, (weapon, pos) in enumerate (r.weapons):
+                    self._influence.setPresence (("weapon", n, i), "items", pos, 1)
+        return self._influence
 
     #
-    #  expecting - return True if the next token is one of, l.
+    #  applyInfluence - use the influence map as an extra cost layer for
+    #                   the route searches, each layer costing, weights,
+    #                   per unit.  Only the squares whose cost changes
+    #                   are invalidated.
     #
 
-    def expecting (self, l):
-        t = self.peek ()
-        return t in l
-
+    def applyInfluence (self, weights = None):
+        if weights == None:
+            weights = influenceWeights
+        costs = self.getInfluence ().costs (weights)
+        changed = []
+        for k in set (costs.keys ()) | set (self._influenceCosts.keys ()):
+            if costs.get (k, 0) != self._influenceCosts.get (k, 0):
+                changed += [k]
+        self._influenceCosts = costs
+        self._invalidate (changed)
 
     #
-    #  lexicalPen - return a list of tokens to be read by the parser.
-    #               A special token <eoln> is added at the end of each line.
-    #               <eof> is added at the end.
+    #  clearInfluence - stop using the influence map as a cost layer.
     #
 
-    def lexicalPen (self, i):
-        self.words = []
-        for l in i.readlines ():
-            w = l.split ()
-            w += ['<eoln>']
-            for j in w:
-                if j != "":
-                    i = j.rstrip ()
-                    self.words += [i]
-        self.words += ['<eof>']
-        return self.words
-
+    def clearInfluence (self):
+        changed = list (self._influenceCosts.keys ())
+        self._influenceCosts = {}
+        self._invalidate (changed)
 
     #
-    #  wallCoord - return True if four numbers were seen
+    #  _newVersion - start a new version of the cost layer.  The routes
+    #                remembered for the previous version are forgotten.
     #
 
-    def wallCoords (self):
-        if self.integer ():
-            x0 = self._curInteger
-            if self.integer ():
-                y0 = self._curInteger
-                if self.integer ():
-                    x1 = self._curInteger
-                    if self.integer ():
-                        y1 = self._curInteger
-                        self._curRoom._addWall ([[x0, y0], [x1, y1]])
-                        return True
-                    else:
-                        self.errorLine ('expecting fourth integer for a wall')
-                else:
-                    self.errorLine ('expecting third integer for a wall')
-            else:
-                self.errorLine ('expecting second integer for a wall')
-        return False
-
+    def _newVersion (self):
+        with self._lock:
+            self._version += 1
+            self._routes.clear ()
+            self._prefetched.clear ()
+        self._flows.clear ()
 
     #
-    #  wallDesc :- 'WALL' wallCoords { wallCoords } -:
+    #  _recallRoute - return the [route, cost, region] remembered for the
+    #                 key, k, or None.
     #
 
-    def wallDesc (self):
-        self.expect ('WALL')
-        if self.wallCoords ():
-            while self.wallCoords ():
-                pass
-
+    def _recallRoute (self, k):
+        with self._lock:
+            if k in self._routes:
+                self._routes.move_to_end (k)
+                self._routeHits += 1
+                if k in self._prefetched:
+                    self._prefetched.remove (k)
+                    self._prefetchHits += 1
+                return self._routes[k]
+            self._routeMisses += 1
+            return None
 
     #
-    #  status := "STATUS" ( [ 'OPEN' | 'CLOSED' | 'SECRET' ] ) =:
+    #  _rememberRoute - remember the current route and its, cost, under
+    #                   the key, k, together with the region of squares
+    #                   whose cost it depends upon, at least, bound.  A
+    #                   failed search depends upon every square.  The
+    #                   least recently used route is forgotten once
+    #                   routeCacheSize routes are held.
     #
 
-    def status (self):
-        self.expect ('STATUS')
-        if self.expecting (['OPEN', 'CLOSED', 'SECRET']):
-            if self.expecting (['OPEN']):
-                self.curStatus = status_open
-                self.expect ('OPEN')
-            elif expecting (['CLOSED']):
-                self.curStatus = status_closed
-                self.curStatus = status_open    # --fixme-- closed doors would be nice!
-                self.expect ('CLOSED')
-            elif expecting (['SECRET']):
-                self.curStatus = status_secret
-                self.curStatus = status_open    # --fixme-- secret doors would be nice!
-                self.expect ('SECRET')
-            return True
-        return False
-
+    def _rememberRoute (self, k, cost, bound):
+        self._storeRoute (k, list (self._route), cost, bound)
 
     #
-    #  integer - if the next token is an integer then
-    #               consume it and save it into curInteger
-    #               return True
-    #            else:
-    #               return False
+    #  _storeRoute - remember the, route, of, cost, under the key, k, as
+    #                _rememberRoute.
     #
 
-    def integer (self):
-        i = self.peek ()
-        if i.isdigit ():
-            self._curInteger = self.get ()
-            return True
-        return False
-
+    def _storeRoute (self, k, route, cost, bound):
+        region = None
+        if cost != None:
+            region = _routeRegion (k[0], k[1], max (cost, bound))
+        with self._lock:
+            self._routes[k] = [route, cost, region]
+            if len (self._routes) > routeCacheSize:
+                self._prefetched.discard (self._routes.popitem (last=False)[0])
 
     #
-    #  doorCoords := integer integer integer integer status "LEADS" "TO" integer =:
+    #  routeCacheStats - return the hits, misses and size of the route cache,
+    #                    the version of the cost layer and the number of
+    #                    prefetched routes and of those used.
     #
 
-    def doorCoords (self):
-        if self.integer ():
-            x0 = self._curInteger
-            if self.integer ():
-                y0 = self._curInteger
-                if self.integer ():
-                    x1 = self._curInteger
-                    if self.integer ():
-                        y1 = self._curInteger
-                        if self.status ():
-                            self.expect ("LEADS")
-                            self.expect ("TO")
-                            if self.integer ():
-                                leadsTo = self._curInteger
-                                self._curRoom._addDoor ([[x0, y0], [x1, y1]], leadsTo, self.curStatus)
-                                return True
-                    else:
-                        self.errorLine ('expecting fourth integer for a wall')
-                else:
-                    self.errorLine ('expecting third integer for a wall')
-            else:
-                self.errorLine ('expecting second integer for a wall')
-        return False
-
+    def routeCacheStats (self):
+        return {"hits": self._routeHits, "misses": self._routeMisses,
+                "size": len (self._routes), "version": self._version,
+                "prefetches": self._prefetches, "prefetch_hits": self._prefetchHits}
 
     #
-    #  doorDesc := "DOOR" doorCoords { doorCoords } =:
+    #  _xaxisText - return the lines of the x axis drawn above (top) or
+    #               below the floor plan.
     #
 
-    def doorDesc (self):
-        self.expect ('DOOR')
-        if self.doorCoords ():
-            while self.doorCoords ():
-                pass
-            return True
-        return False
+    def _xaxisText (self, top):
+        border = "  +" + self._floor.high ()[0] * "-" + "-+"
+        s = "   "
+        for i in range (self._floor.high ()[0]):
+            if i % 10 == 0:
+                s += "%d" % int (i / 10)
+            else:
+                s += " "
+        if top:
+            return [s, border]
+        return [border, s]
 
+    def printXaxis (self, top):
+        printf ("%s\n", "\n".join (self._xaxisText (top)))
 
     #
-    #  posDesc := integer integer =:
+    #  inRoute - return True if pos is in the current route.
     #
 
-    def posDesc (self):
-        global curPos
-        if self.integer ():
-            x = self._curInteger
-            if self.integer ():
-                curPos = [x, self._curInteger]
+    def inRoute (self, pos):
+        for p in self._route:
+            if equVec (p, pos):
                 return True
-            else:
-                self.errorLine ('expecting second integer in the position pair')
         return False
 
-
     #
-    #  ammoDesc := "AMMO" integer "AMOUNT" integer "AT" posDesc =:
+    #  floorText - return the floor plan of the map as text with the
+    #              route marked by '*' and src and dest by 'S' and 'E'.
     #
 
-    def ammoDesc (self):
-        self.expect ('AMMO')
-        ammoType = self.get ()
-        self.expect ('AMOUNT')
-        if self.integer ():
-            ammoAmount = self._curInteger
-            self.expect ('AT')
-            if self.posDesc ():
-                ammoPos = curPos
-                self._curRoom._addAmmo (ammoType, ammoAmount, ammoPos)
-            else:
-                self.errorLine ('expecting a position for the ammo')
-        else:
-            self.errorLine ('expecting an amount of ammo')
+    def floorText (self, src = None, dest = None):
+        route = set ()
+        for p in self._route:
+            route.add ((p[0], p[1]))
+        lines = self._xaxisText (True)
+        yaxis = list(range(self._floor.high ()[1]))
+        yaxis.reverse ()
+        for j in yaxis:
+            s = "%2d" % j
+            s += "|"
+            for i in range (self._floor.high ()[0]):
+                if (src != None) and (i == src[0]) and (j == src[1]):
+                    s += 'S'
+                elif (dest != None) and (i == dest[0]) and (j == dest[1]):
+                    s += 'E'
+                elif (i, j) in route:
+                    s += '*'
+                else:
+                    s += self._floor.get (i, j)
+            s += " |"
+            s += "%2d" % j
+            lines += [s]
+        return "\n".join (lines + self._xaxisText (False))
 
     #
-    #  labelDesc := 'LABEL' 'AT' posDesc string =:
+    #  printFloor - print out the floor plan of the map
     #
 
-    def labelDesc (self):
-        self.expect ('LABEL')
-        self.expect ('AT')
-        if self.posDesc ():
-            labelPos = curPos
-            label = self.get ()
-            self._curRoom._addLabel (label, curPos)
-            return True
-        else:
-            errorLine ('expecting a position for a label')
-            return False
+    def printFloor (self, src = None, dest = None):
+        printf ("%s\n", self.floorText (src, dest))
+
 
     #
-    #  lightOn := 'ON' type =:
+    #  weightingsText - return the floor weighings of the map as text.
     #
 
-    def lightOn (self):
-        self.expect ('ON')
-        if self.expecting (['FLOOR']):
-            self.expect ('FLOOR')
-        elif self.expecting (['CEIL']):
-            self.expect ('CEIL')
-        elif self.expecting (['MID']):
-            self.expect ('MID')
-            self._curRoom._addLight (curPos)
-        else:
-            self.errorLine ('expecting FLOOR or CEIL or MID after ON in LIGHT description')
-
+    def weightingsText (self):
+        lines = self._xaxisText (True)
+        yaxis = list(range(self._floor.high ()[1]))
+        yaxis.reverse ()
+        for j in yaxis:
+            s = "%2d" % j
+            s += "|"
+            for i in range (self._floor.high ()[0]):
+                if self._weightings.get (i, j) == 0:
+                    s += '0'
+                else:
+                    s += '1'
+            lines += [s]
+        return "\n".join (lines + self._xaxisText (False))
 
     #
-    #  lightDesc := 'LIGHT' 'AT' posDesc [ 'COLOUR' int int int ] [ 'ON' string ] =:
+    #  printWeightings - print out the floor weighings of the map
     #
 
-    def lightDesc (self):
-        self.expect ('LIGHT')
-        self.expect ('AT')
-        if self.posDesc ():
-            if self.expecting (['COLOUR']):
-                self.expect ('COLOUR')
-                self.colourDesc ()
-            if self.expecting (['ON']):
-                self.lightOn ()
-            else:
-                # defaults to MID light which creates a pillar
-                # and the bot needs to avoid it.
-                self._curRoom._addLight (curPos)
-            return True
-        else:
-            self.errorLine ('expecting a position for a light')
-            return False
+    def printWeightings (self):
+        printf ("%s\n", self.weightingsText ())
 
 
     #
-    #  weaponDesc := 'LIGHT' 'AT' posDesc =:
+    #  _loadMap - internal method which is run when the constructor
+    #             is initiated.  It returns the parsed pen map.
     #
 
-    def weaponDesc (self):
-        self.expect ('WEAPON')
-        if self.integer ():
-            weapon = self._curInteger
-            self.expect ('AT')
-            if self.posDesc ():
-                self._curRoom._addWeapon (weapon, curPos)
-                return True
-            else:
-                self.errorLine ('expecting a position for a weapon')
-        else:
-            self.errorLine ('expecting a weapon number')
-        return False
-
+    def _loadMap (self, mapname):
+        self._filename = os.path.join (mapdir, mapname)
+        log.info ("need to read in: %s", self._filename)
+        return readPen (self._filename, self._errorLine)
+
+    #
+    #  _loadRooms - find the squares of each room and its doors.
+    #               A door is recorded as [key, squares, centre, leadsTo].
+    #
+
+    def _loadRooms (self):
+        self._roomOf = floorPlan (self._map)
+        self._squares = {}
+        self._squareRooms = {}
+        self._doors = {}
+        self._doorCosts = {}
+        for n in self._map.rooms.keys ():
+            self._squares[n] = set ()
+            self._doors[n] = []
+        for p, n in self._roomOf.items ():
+            self._squares[n].add (p)
+        for n, r in self._map.rooms.items ():
+            for d in r.doors:
+                squares = doorSquares (d[0])
+                self._squares[n].update (squares)
+                centre = squares[int (len (squares) / 2)]
+                self._doors[n] += [[doorKey (d[0]), squares, centre, str (d[2])]]
+        for n, squares in self._squares.items ():
+            for p in squares:
+                if p in self._squareRooms:
+                    self._squareRooms[p] += [n]
+                else:
+                    self._squareRooms[p] = [n]
 
     #
-    #  monsterDesc := 'MONSTER' type 'AT' posDesc =:
+    #  _loadPvs - load the potentially visible set of rooms which pen2map
+    #             wrote beside the map.  If it is missing the set is
+    #             computed from the pen map.
     #
 
-    def monsterDesc (self):
-        self.expect ('MONSTER')
-        monType = self.get ()
-        self.expect ('AT')
-        if self.posDesc ():
-            if (len (monType) > len ("python_")) and ("python_" == monType[:len ("python_")]):
-                self._curRoom._addPythonMonster (monType, curPos)
-            else:
-                self._curRoom._addMonster (monType, curPos)
-            return True
-        else:
-            self.errorLine ('expecting a position for a monster')
-        return False
-
+    def _loadPvs (self):
+        self._pvs = loadPvs (pvsName (self._filename))
+        if self._pvs == None:
+            self._pvs = computePvs (self._map)
 
     #
-    #  spawnDesc := "SPAWN" "PLAYER" "AT" posDesc =:
+    #  getRoom - return the room number (a string) containing pen
+    #            coordinate, pos, or None if pos is not inside a room.
     #
 
-    def spawnDesc (self):
-        self.expect ('SPAWN')
-        self.expect ('PLAYER')
-        self.expect ('AT')
-        if self.posDesc ():
-            self._curRoom._addPlayerSpawn (curPos)
-            return True
-        else:
-            self.errorLine ('expecting a position for a player spawn')
-        return False
+    def getRoom (self, pos):
+        return self._roomOf.get ((pos[0], pos[1]))
 
     #
-    #  insideDesc := 'INSIDE' 'AT' Pos
+    #  potentiallyVisible - return False if pen coordinate, dest, cannot
+    #                       possibly be seen from pen coordinate, src.
+    #                       A True result means an isvisible is still
+    #                       needed to determine line of sight.
     #
 
-    def insideDesc (self):
-        self.expect ('INSIDE')
-        self.expect ('AT')
-        return self.posDesc ()
+    def potentiallyVisible (self, src, dest):
+        a = self.getRoom (src)
+        b = self.getRoom (dest)
+        if (a == None) or (b == None) or (a not in self._pvs):
+            return True
+        return b in self._pvs[a]
 
     #
-    #  colourDesc := int int int =:
+    #  _rayBlocked - return True if an opaque square lies on the line from
+    #                point x0, y0 to point x1, y1 (in pen units where
+    #                square x, y covers x..x+1, y..y+1).  The squares
+    #                holding the end points are not tested.  The squares
+    #                crossed are stepped through in order (a DDA walk).
     #
 
-    def colourDesc (self):
-        if self.integer ():
-            if self.integer ():
-                if self.integer ():
-                    return True
+    def _rayBlocked (self, x0, y0, x1, y1):
+        x, y = int (math.floor (x0)), int (math.floor (y0))
+        ex, ey = int (math.floor (x1)), int (math.floor (y1))
+        dx, dy = x1 - x0, y1 - y0
+        if dx > 0:
+            stepX, deltaX, maxX = 1, 1.0 / dx, (x + 1 - x0) / dx
+        elif dx < 0:
+            stepX, deltaX, maxX = -1, -1.0 / dx, (x0 - x) / -dx
+        else:
+            stepX, deltaX, maxX = 0, INFINITY, INFINITY
+        if dy > 0:
+            stepY, deltaY, maxY = 1, 1.0 / dy, (y + 1 - y0) / dy
+        elif dy < 0:
+            stepY, deltaY, maxY = -1, -1.0 / dy, (y0 - y) / -dy
+        else:
+            stepY, deltaY, maxY = 0, INFINITY, INFINITY
+        for i in range (abs (ex - x) + abs (ey - y)):
+            if maxX < maxY:
+                x += stepX
+                maxX += deltaX
+            else:
+                y += stepY
+                maxY += deltaY
+            if ((x != ex) or (y != ey)) and (self._opaque.get (x, y) != 0):
+                return True
         return False
 
     #
-    #  defaultDesc := "DEFAULT" defaultColourConfig =:
+    #  _samplePoints - return the centre, the inset corners and the
+    #                  inset edge middles of square, p.
     #
-    def defaultDesc (self):
-        self.expect ('DEFAULT')
-        self.defaultConfig ()
+
+    def _samplePoints (self, p):
+        l = [[p[0] + 0.5, p[1] + 0.5]]
+        for i in [sightInset, 0.5, 1.0 - sightInset]:
+            for j in [sightInset, 0.5, 1.0 - sightInset]:
+                if (i != 0.5) or (j != 0.5):
+                    l += [[p[0] + i, p[1] + j]]
+        return l
 
     #
-    #  defaultConfig := "COLOUR" defaultColourConfig |
-    #                   "TEXTURE" defaultTextureConfig =:
+    #  _hullTouches - return True if square, p, touches the convex hull of
+    #                 the squares whose lower left corners are, a, and, b.
+    #                 The hull is the unit square swept along the line
+    #                 from a to b, so p touches it if that line meets the
+    #                 box p-1..p+1.
     #
 
-    def defaultConfig (self):
-        if self.expecting (['COLOUR']):
-            self.defaultColourConfig ()
-        elif self.expecting (['TEXTURE']):
-            self.defaultTextureConfig ()
-        else:
-            self.errorLine ('expecting COLOUR or TEXTURE after DEFAULT')
+    def _hullTouches (self, a, b, p):
+        t0, t1 = 0.0, 1.0
+        for i in [0, 1]:
+            d = b[i] - a[i]
+            lo, hi = p[i] - 1 - a[i], p[i] + 1 - a[i]
+            if d == 0:
+                if (lo > 0) or (hi < 0):
+                    return False
+            else:
+                u, v = lo / d, hi / d
+                if u > v:
+                    u, v = v, u
+                t0, t1 = max (t0, u), min (t1, v)
+                if t0 > t1:
+                    return False
+        return True
 
     #
-    #  defaultColourConfig := "COLOUR" ( "CEILING" | "MID" | "FLOOR" ) int int int =:
+    #  _hullConnected - return True if the squares, src, and, dest, are
+    #                   joined by a chain of clear squares touching the
+    #                   convex hull of the two.  Squares sharing a corner
+    #                   are joined, so every line between src and dest
+    #                   which misses the opaque squares is found.
     #
 
-    def defaultColourConfig (self):
-        self.expect ('COLOUR')
-        if self.expecting (['MID']):
-            self.expect ('MID')
-        elif self.expecting (['CEILING']):
-            self.expect ('CEILING')
-        elif self.expecting (['FLOOR']):
-            self.expect ('FLOOR')
-        return self.colourDesc ()
-
+    def _hullConnected (self, src, dest):
+        a, b = (src[0], src[1]), (dest[0], dest[1])
+        seen = set ([a])
+        todo = [a]
+        while todo != []:
+            u = todo.pop ()
+            for dx in [-1, 0, 1]:
+                for dy in [-1, 0, 1]:
+                    v = (u[0] + dx, u[1] + dy)
+                    if v == b:
+                        return True
+                    if ((v not in seen) and (self._opaque.get (v[0], v[1]) == 0)
+                        and self._hullTouches (a, b, v)):
+                        seen.add (v)
+                        todo += [v]
+        return False
 
     #
-    #  defaultTextureConfig := "TEXTURE" ( "CEILING" | "FLOOR" | "WALL" ) string =:
+    #  lineOfSight - return False if the walls (and closed doors) of the
+    #                map certainly block the view from pen square, src,
+    #                to pen square, dest.  Lines between the centres, the
+    #                corners and the edge middles of the two squares are
+    #                cast first and any clear line shows the view.  Else
+    #                the view is only blocked if no chain of clear squares
+    #                within the hull of the two squares joins them, as any
+    #                line of sight must pass along such a chain.  A True
+    #                result means an isvisible is still needed.  The
+    #                results are remembered until the floor changes.
     #
 
-    def defaultTextureConfig (self):
-        self.expect ('TEXTURE')
-        if self.expecting (['COLOUR', 'FLOOR', 'WALL']):
-            if self.expecting (['COLOUR']):
-                self.expect ('COLOUR')
-            elif self.expecting (['FLOOR']):
-                self.expect ('FLOOR')
-            elif self.expecting (['WALL']):
-                self.expect ('WALL')
-            else:
-                self.errorLine ('expecting COLOUR or FLOOR or WALL')
-            texture = self.get ()
-
-    #
-    #  roomDesc := "ROOM" integer { doorDesc | wallDesc | treasureDesc | ammoDesc |
-    #                     lightDesc | insideDesc | weaponDesc | labelDesc |
-    #                     monsterDesc | spawnDesc | defaultDesc | soundDesc } =:
-    #
-
-    def roomDesc (self):
-        if self.expecting (['ROOM']):
-            self.expect ("ROOM")
-            if self.integer ():
-                self._curRoomNo = self._curInteger
-                self._curRoom = newRoom (self._curRoomNo)
-                if self._verbose:
-                    printf ("roomDesc: %d\n", curRoomNo)
-                while self.expecting (['DOOR', 'WALL', 'TREASURE', 'AMMO', 'WEAPON', 'LABEL', 'LIGHT', 'MONSTER', 'SPAWN', 'INSIDE', 'DEFAULT', 'SOUND']):
-                    if self.expecting (['DOOR']):
-                        self.doorDesc ()
-                    elif self.expecting (['WALL']):
-                        self.wallDesc ()
-                    elif self.expecting (['TREASURE']):
-                        self.treasureDesc ()
-                    elif self.expecting (['AMMO']):
-                        self.ammoDesc ()
-                    elif self.expecting (['WEAPON']):
-                        self.weaponDesc ()
-                    elif self.expecting (['LABEL']):
-                        self.labelDesc ()
-                    elif self.expecting (['LIGHT']):
-                        self.lightDesc ()
-                    elif self.expecting (['WEAPON']):
-                        self.weaponDesc ()
-                    elif self.expecting (['MONSTER']):
-                        self.monsterDesc ()
-                    elif self.expecting (['SPAWN']):
-                        self.spawnDesc ()
-                    elif self.expecting (['INSIDE']):
-                        self.insideDesc ()
-                    elif self.expecting (['DEFAULT']):
-                        self.defaultDesc ()
-                    elif self.expecting (['SOUND']):
-                        self.soundDesc ()
-                self.expect ('END')
-                return True
-            else:
-                self.errorLine ('expecting an integer after ROOM')
-        return False
-
+    def lineOfSight (self, src, dest):
+        k = (src[0], src[1], dest[0], dest[1])
+        if k not in self._sight:
+            if len (self._sight) >= sightCacheSize:
+                self._sight = {}
+            seen = False
+            for a in self._samplePoints (src):
+                for b in self._samplePoints (dest):
+                    if not self._rayBlocked (a[0], a[1], b[0], b[1]):
+                        seen = True
+                        break
+                if seen:
+                    break
+            if not seen:
+                seen = self._hullConnected (src, dest)
+            self._sight[k] = seen
+        return self._sight[k]
 
     #
-    #  parsePen := roomDesc { roomDesc } "END." =:
+    #  _errorLine - issue an error message using the filename and line of error.
     #
 
-    def parsePen (self):
-        if self.roomDesc ():
-            while self.roomDesc ():
-                pass
-            self.expect ("END.")
-            return True
-        return False
+    def _errorLine (self, lineNo, text):
+        log.error ("%s:%d:%s", self._filename, lineNo, text)
 
     #
     #  checkLegal - pos is checked to make sure it is not on a wall.
@@ -831,7 +1380,7 @@ class aas:
 
     def checkLegal (self, pos, message):
         if self._floor.get (pos[0], pos[1]) == '#':
-            printf ("error %s position %s is a wall\n", message, pos)
+            log.warning ("error %s position %s is a wall", message, pos)
             # sys.exit (1)
             return False
         return True
@@ -844,10 +1393,20 @@ class aas:
     #            object, d, assuming this route was followed.  Notice
     #            this is not the same as a line of sight distance.
     #            The distance returned is a doom3 unit.
-    #
-
-    def calcnav (self, src, dest):
-        self._neighbours = {}
+    #            search selects gridSearch (every square of the map),
+    #            roomSearch (the door graph followed by the squares of
+    #            the rooms on the chosen corridor) or jumpSearch (jump
+    #            point search, which gives the same cost as gridSearch
+    #            but only expands the squares where the route can turn).
+    #            jumpSearch needs every square to cost the same so
+    #            gridSearch is used while any penalties or influence
+    #            costs are present.
+    #            The last routeCacheSize routes are remembered until the
+    #            cost of a square they depend upon changes.
+    #
+
+    def calcnav (self, src, dest, search = gridSearch):
+        self._routeChanged = False
         self._cost = {}
         self._prev = {}
         self._route = []
@@ -860,6 +1419,54 @@ class aas:
         if equVec (src, dest):
             self._route = [dest]
             return 0
+        k = ((src[0], src[1]), (dest[0], dest[1]), search, self._version)
+        r = self._recallRoute (k)
+        if r != None:
+            self._route = list (r[0])
+            return r[1]
+        self._corridorCost = 0
+        cost = self._search (src, dest, search)
+        self._rememberRoute (k, cost, self._corridorCost)
+        return cost
+
+    #
+    #  prefetch - work out the route from, src, to, dest, and remember it
+    #             in the route cache so that a later calcnav from src to
+    #             dest is answered at once.  The search stops once dest is
+    #             reached.  Only the cache is touched, not the current
+    #             route, so prefetch may run on a worker thread while the
+    #             bot follows its route.  The route is not remembered if
+    #             the cost layer changes during the search.
+    #
+
+    def prefetch (self, src, dest):
+        if (equVec (src, dest) or (not self._walkable (src[0], src[1])) or
+            (not self._walkable (dest[0], dest[1]))):
+            return
+        goal = (dest[0], dest[1])
+        with self._lock:
+            k = ((src[0], src[1]), goal, gridSearch, self._version)
+            if k in self._routes:
+                return
+            changes = self._changes
+        cost, prev = self._dijkstra (src, [goal])
+        if goal in cost:
+            with self._lock:
+                if changes == self._changes:
+                    self._storeRoute (k, self._followPrev (prev, goal), cost[goal] + 1, 0)
+                    self._prefetched.add (k)
+                    self._prefetches += 1
+
+    #
+    #  _search - return the cost of the route from, src, to, dest, using
+    #            the, search, method and set the current route.
+    #
+
+    def _search (self, src, dest, search):
+        if (search == roomSearch) and (self.getRoom (src) != None) and (self.getRoom (dest) != None):
+            return self._calcnavRooms (src, dest)
+        if (search == jumpSearch) and self._uniformCost ():
+            return self._calcnavJump (src, dest)
         while self._choices != []:
             # drPrintf ("we have the following nodes to explore: %s\n", self._choices)
             u = self._getBestChoice ()
@@ -868,8 +1475,8 @@ class aas:
             if equVec (u, dest):
                 drPrintf ("found end of route\n")
                 self._route = self._defineRoute (src, dest)
-                if debugroute:
-                    self.printFloor (src, dest)
+                if log.isEnabledFor (TRACE):
+                    log.log (TRACE, "route\n%s", self.floorText (src, dest))
                 return self._getCost (dest)
             for v in self._getNeighbours (u):
                 self._addChoice (v)
@@ -885,10 +1492,511 @@ class aas:
         return None
 
 
+    #
+    #  _dijkstra - return the cost and previous square dictionaries of a
+    #              search from, src.  The search only enters the squares
+    #              in, allowed, if given and stops once all the squares in
+    #              targets, if given, have been reached.  The squares are
+    #              tuples and the cost of src is 0.
+    #
+
+    def _dijkstra (self, src, targets = None, allowed = None):
+        src = (src[0], src[1])
+        cost = {src: 0}
+        prev = {src: None}
+        remaining = None
+        if targets != None:
+            remaining = set (targets)
+        done = set ()
+        queue = [(0, src)]
+        while queue != []:
+            c, u = heapq.heappop (queue)
+            if u not in done:
+                done.add (u)
+                if remaining != None:
+                    remaining.discard (u)
+                    if len (remaining) == 0:
+                        break
+                for v in self._getNeighbours (u):
+                    v = (v[0], v[1])
+                    if (allowed == None) or (v in allowed):
+                        alternative = c + self._getLength (v)
+                        if (alternative < INFINITY) and ((v not in cost) or (alternative < cost[v])):
+                            cost[v] = alternative
+                            prev[v] = u
+                            heapq.heappush (queue, (alternative, v))
+        return cost, prev
+
+    #
+    #  _followPrev - return the route to, dest, held in the previous
+    #                square dictionary, prev.
+    #
+
+    def _followPrev (self, prev, dest):
+        r = []
+        p = (dest[0], dest[1])
+        while p != None:
+            r += [[p[0], p[1]]]
+            p = prev[p]
+        r.reverse ()
+        return r
+
+    #
+    #  _roomDoorCosts - return a dictionary mapping pairs of door keys of
+    #                   room, n, onto the cost of walking between them
+    #                   inside the room.  The costs are cached.
+    #
+
+    def _roomDoorCosts (self, n):
+        if n not in self._doorCosts:
+            costs = {}
+            for k, squares, centre, leadsTo in self._doors[n]:
+                targets = [d[2] for d in self._doors[n]]
+                cost, prev = self._dijkstra (centre, targets, self._squares[n])
+                for d in self._doors[n]:
+                    if (d[0] != k) and (d[2] in cost):
+                        costs[(k, d[0])] = cost[d[2]]
+            self._doorCosts[n] = costs
+        return self._doorCosts[n]
+
+    #
+    #  _roomCorridor - return the list of rooms on the cheapest route from
+    #                  src to dest found by searching the door graph.
+    #                  Each door is entered at its centre square.  The
+    #                  cost of the corridor is left in _corridorCost as
+    #                  a cheaper corridor could be chosen within it.
+    #                  None is returned if there is no such route.
+    #
+
+    def _roomCorridor (self, src, dest):
+        a = self.getRoom (src)
+        b = self.getRoom (dest)
+        fromSrc = self._dijkstra (src, [d[2] for d in self._doors[a]] + [(dest[0], dest[1])], self._squares[a])[0]
+        toDest = self._dijkstra (dest, [d[2] for d in self._doors[b]], self._squares[b])[0]
+        #
+        #  a node is [door key, room about to be crossed]
+        #
+        best = {}
+        prev = {}
+        queue = []
+        order = 0    # breaks ties between equal costs
+        if (dest[0], dest[1]) in fromSrc:
+            heapq.heappush (queue, (fromSrc[(dest[0], dest[1])], order, 'dest', None))
+        for k, squares, centre, leadsTo in self._doors[a]:
+            if (centre in fromSrc) and (leadsTo in self._squares):
+                order += 1
+                heapq.heappush (queue, (fromSrc[centre], order, (k, leadsTo), None))
+        while queue != []:
+            c, o, node, before = heapq.heappop (queue)
+            if node not in best:
+                best[node] = c
+                prev[node] = before
+                if node == 'dest':
+                    self._corridorCost = c
+                    rooms = [a, b]
+                    while before != None:
+                        rooms += [before[1]]
+                        before = prev[before]
+                    return rooms
+                k, n = node
+                for d in self._doors[n]:
+                    if d[0] == k:
+                        if (n == b) and (d[2] in toDest):
+                            order += 1
+                            heapq.heappush (queue, (c + toDest[d[2]], order, 'dest', node))
+                    else:
+                        costs = self._roomDoorCosts (n)
+                        if ((k, d[0]) in costs) and (d[3] in self._squares):
+                            order += 1
+                            heapq.heappush (queue, (c + costs[(k, d[0])], order, (d[0], d[3]), node))
+        return None
+
+    #
+    #  _calcnavRooms - calculate the route from src to dest by first
+    #                  choosing the rooms to pass through using the door
+    #                  graph and then searching only the squares of those
+    #                  rooms.  The route is the best through the chosen
+    #                  rooms.  It returns the cost of the route (as calcnav)
+    #                  or None if no route was found.
+    #
+
+    def _calcnavRooms (self, src, dest):
+        self._route = []
+        rooms = self._roomCorridor (src, dest)
+        if rooms == None:
+            return None
+        allowed = set ()
+        for n in rooms:
+            allowed.update (self._squares[n])
+        cost, prev = self._dijkstra (src, [(dest[0], dest[1])], allowed)
+        if (dest[0], dest[1]) not in cost:
+            return None
+        self._route = self._followPrev (prev, dest)
+        if log.isEnabledFor (TRACE):
+            log.log (TRACE, "route\n%s", self.floorText (src, dest))
+        return cost[(dest[0], dest[1])] + 1
+
+    #
+    #  getDistanceField - return the distance field of the routes from, src.
+    #                  The field of the last square asked for is kept
+    #                  until the floor changes.
+    #
+
+    def getDistanceField (self, src):
+        if (self._field == None) or (self._field.getSrc () != (src[0], src[1])):
+            self._field = distanceField (self, src)
+        return self._field
+
+    #
+    #  getFlowField - return the flow field of the routes to, dest.  A
+    #                 field is only calculated when dest moves to another
+    #                 square.  While the cost layer holds no penalties or
+    #                 blocked squares the field is shared by every aas of
+    #                 the same map, so the bots of one process chasing
+    #                 the same target share a single search.
+    #
+
+    def getFlowField (self, dest):
+        if self._uniformCost () and (self._blocked == set ()):
+            flows, k = sharedFlows, (self._filename, dest[0], dest[1])
+        else:
+            flows, k = self._flows, (dest[0], dest[1])
+        if k in flows:
+            flows.move_to_end (k)
+        else:
+            flows[k] = flowField (self, dest)
+            if len (flows) > flowCacheSize:
+                flows.popitem (last=False)
+        return flows[k]
+
+    #
+    #  getReservations - return the reservation table shared by the bots
+    #                    of this process which use the same map.
+    #
+
+    def getReservations (self):
+        if self._filename not in sharedReservations:
+            sharedReservations[self._filename] = reservationTable ()
+        return sharedReservations[self._filename]
+
+    #
+    #  calcnavCooperative - calculate the route from, src, to, dest, for
+    #                       the bot, owner, avoiding the squares reserved
+    #                       by the other bots.  The first window steps
+    #                       are planned in space and time (the bot may
+    #                       wait on a square) and then reserved for owner,
+    #                       replacing its previous reservations.  The rest
+    #                       of the route follows the flow field of dest,
+    #                       whose costs also guide the search.  It returns
+    #                       the cost as calcnav and records the route or
+    #                       returns None.  The route holds each square once,
+    #                       the steps to wait on a square are given by
+    #                       scheduledWait and the progress along the route
+    #                       is reported with advanceSchedule.
+    #
+
+    def calcnavCooperative (self, src, dest, owner, window = cooperativeWindow):
+        self._route = []
+        if (not self.checkLegal (src, "source")) or (not self.checkLegal (dest, "destination")):
+            return None
+        table = self.getReservations ()
+        table.release (owner)
+        field = self.getFlowField (dest)
+        if field.cost (src) == None:
+            return None
+        start = table.clock (owner)
+        goal = (dest[0], dest[1])
+        k = ((src[0], src[1]), 0)
+        cost = {k: 0}
+        prev = {k: None}
+        order = 0
+        queue = [(field.cost (src), 0, order, k)]
+        k = None
+        while queue != []:
+            e, c, o, u = heapq.heappop (queue)
+            if c == cost[u]:
+                #  dest is only kept if no other bot needs it next step.
+                if ((u[0] == goal) and table.isFree (goal, start + u[1] + 1, owner)) or (u[1] == window):
+                    k = u
+                    break
+                p, t = u
+                moves = [[p, waitCost]]
+                for v in self._getNeighbours (p):
+                    moves += [[(v[0], v[1]), self._getLength (v)]]
+                for v, length in moves:
+                    h = field.cost (v)
+                    if ((length < INFINITY) and (h != None) and
+                        table.isFree (v, start + t + 1, owner) and
+                        (not table.isSwap (p, v, start + t, owner))):
+                        n = (v, t + 1)
+                        if (n not in cost) or (c + length < cost[n]):
+                            cost[n] = c + length
+                            prev[n] = u
+                            order += 1
+                            heapq.heappush (queue, (c + length + h, c + length, order, n))
+        if k == None:
+            return None
+        path = []
+        u = k
+        while u != None:
+            path += [u[0]]
+            u = prev[u]
+        path.reverse ()
+        #  stay on dest for the rest of the window while it is free.
+        while (k[0] == goal) and (len (path) <= window) and table.isFree (goal, start + len (path), owner):
+            path += [goal]
+        table.reserve (owner, path, start)
+        route = []
+        waits = []
+        for p in path + [tuple (q) for q in field.route (k[0])[1:]]:
+            if (route == []) or (route[-1] != [p[0], p[1]]):
+                route += [[p[0], p[1]]]
+                waits += [0]
+            elif p != goal:
+                waits[-1] += 1
+        self._route = route
+        self._schedule = [owner, start, 0, route, waits]
+        return cost[k] + field.cost (k[0]) + 1
+
+    #
+    #  _scheduledHop - return the index of the first hop of the route
+    #                  calculated by calcnavCooperative on square, p, or
+    #                  None if p is not on it or the route has changed.
+    #                  The route may return to a square, so each hop holds
+    #                  its own wait.
+    #
+
+    def _scheduledHop (self, p):
+        if (self._schedule == None) or (self._schedule[3] is not self._route):
+            return None
+        for i, q in enumerate (self._route):
+            if equVec (q, p):
+                return i
+        return None
+
+    #
+    #  scheduledWait - return the number of steps the route calculated by
+    #                  calcnavCooperative waits on square, p, before
+    #                  moving on.  0 is returned for any other route.
+    #
+
+    def scheduledWait (self, p):
+        i = self._scheduledHop (p)
+        if i == None:
+            return 0
+        return self._schedule[4][i]
+
+    #
+    #  takeWait - return the steps to wait on square, p, (as scheduledWait)
+    #             and forget them so that the wait is only made once.
+    #
+
+    def takeWait (self, p):
+        w = self.scheduledWait (p)
+        if w > 0:
+            self._schedule[4][self._scheduledHop (p)] = 0
+        return w
+
+    #
+    #  waitOver - return True if the bots the route calculated by
+    #             calcnavCooperative gives way to on square, p, for,
+    #             steps, have moved off the square after p.
+    #
+
+    def waitOver (self, p, steps):
+        i = self._scheduledHop (p)
+        if (i == None) or (i + 1 == len (self._route)):
+            return True
+        owner, start, step, route, waits = self._schedule
+        return self.getReservations ().passed (route[i+1], start + step + steps, owner)
+
+    #
+    #  advanceSchedule - record that the bot following the route calculated
+    #                    by calcnavCooperative has moved or waited, steps.
+    #                    The bot's clock in the reservation table is
+    #                    advanced to its step.
+    #
+
+    def advanceSchedule (self, steps):
+        if (self._schedule != None) and (self._schedule[3] is self._route):
+            self._schedule[2] += steps
+            self.getReservations ().advanceOwner (self._schedule[0], self._schedule[1] + self._schedule[2])
+
+    #
+    #  releaseRoute - forget the squares reserved by, owner, and its clock.
+    #
+
+    def releaseRoute (self, owner):
+        self.getReservations ().leave (owner)
+        if (self._schedule != None) and (self._schedule[0] == owner):
+            self._schedule = None
+
+    #
+    #  nextHop - return the square to step onto from, src, when heading
+    #            for, dest, or None if src is dest or dest cannot be
+    #            reached.  It is a lookup in the flow field of dest.
+    #
+
+    def nextHop (self, src, dest):
+        return self.getFlowField (dest).nextHop (src)
+
+    #
+    #  nearest - find the nearest of the positions, targets, to, src, with
+    #            one search.  It returns [position, cost] where cost is as
+    #            calcnav, or None if no target can be reached.  The route
+    #            to the position is recorded as by calcnav.  Later queries
+    #            from the same src reuse the search.
+    #
+
+    def nearest (self, src, targets):
+        self._route = []
+        f = self.getDistanceField (src)
+        t = f.nearest (targets)
+        if t == None:
+            return None
+        self._route = f.route (t)
+        return [[t[0], t[1]], f.cost (t) + 1]
+
+    #
+    #  _walkable - return True if square x, y can be entered.
+    #
+
+    def _walkable (self, x, y):
+        if (x, y) in self._blocked:
+            return False
+        return self._weightings.inRange (x, y) and (self._weightings.get (x, y) != wallCost)
+
+    #
+    #  _jump - step from square x, y in direction dx, dy and return the
+    #          first jump point reached, or None if a wall is reached.
+    #          A jump point is the destination or a square where a
+    #          route may need to turn.  As in _getNeighbours a diagonal
+    #          step is only taken if the squares either side are free.
+    #
+
+    def _jump (self, x, y, dx, dy, dest):
+        while self._walkable (x, y):
+            if (x == dest[0]) and (y == dest[1]):
+                return (x, y)
+            if (dx != 0) and (dy != 0):
+                if (self._jump (x + dx, y, dx, 0, dest) != None) or (self._jump (x, y + dy, 0, dy, dest) != None):
+                    return (x, y)
+                if not (self._walkable (x + dx, y) and self._walkable (x, y + dy)):
+                    return None
+            elif dx != 0:
+                if ((self._walkable (x, y - 1) and not self._walkable (x - dx, y - 1)) or
+                    (self._walkable (x, y + 1) and not self._walkable (x - dx, y + 1))):
+                    return (x, y)
+            else:
+                if ((self._walkable (x - 1, y) and not self._walkable (x - 1, y - dy)) or
+                    (self._walkable (x + 1, y) and not self._walkable (x + 1, y - dy))):
+                    return (x, y)
+            x += dx
+            y += dy
+        return None
+
+    #
+    #  _jumpDirections - return the directions worth searching from square,
+    #                    p, which was reached from square, parent.
+    #
+
+    def _jumpDirections (self, p, parent):
+        x, y = p
+        if parent == None:
+            l = []
+            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                if self._walkable (x + dx, y + dy):
+                    l += [(dx, dy)]
+            for dx, dy in [(-1, -1), (-1, 1), (1, 1), (1, -1)]:
+                if self._walkable (x + dx, y) and self._walkable (x, y + dy):
+                    l += [(dx, dy)]
+            return l
+        dx = (x > parent[0]) - (x < parent[0])
+        dy = (y > parent[1]) - (y < parent[1])
+        l = []
+        if (dx != 0) and (dy != 0):
+            if self._walkable (x, y + dy):
+                l += [(0, dy)]
+            if self._walkable (x + dx, y):
+                l += [(dx, 0)]
+            if self._walkable (x, y + dy) and self._walkable (x + dx, y):
+                l += [(dx, dy)]
+        elif dx != 0:
+            ahead = self._walkable (x + dx, y)
+            for side in [-1, 1]:
+                if self._walkable (x, y + side):
+                    l += [(0, side)]
+                    if ahead:
+                        l += [(dx, side)]
+            if ahead:
+                l += [(dx, 0)]
+        else:
+            ahead = self._walkable (x, y + dy)
+            for side in [-1, 1]:
+                if self._walkable (x + side, y):
+                    l += [(side, 0)]
+                    if ahead:
+                        l += [(side, dy)]
+            if ahead:
+                l += [(0, dy)]
+        return l
+
+    #
+    #  _calcnavJump - calculate the route from src to dest using jump point
+    #                 search.  Every square costs one to enter so the cost
+    #                 between jump points is the number of steps.  It
+    #                 returns the cost of the route (as calcnav) or None
+    #                 if no route was found.
+    #
+
+    def _calcnavJump (self, src, dest):
+        start = (src[0], src[1])
+        end = (dest[0], dest[1])
+        cost = {start: 0}
+        parent = {start: None}
+        done = set ()
+        queue = [(max (abs (end[0] - start[0]), abs (end[1] - start[1])), 0, start)]
+        while queue != []:
+            f, c, p = heapq.heappop (queue)
+            if p not in done:
+                done.add (p)
+                if p == end:
+                    self._route = self._jumpRoute (parent, end)
+                    if log.isEnabledFor (TRACE):
+                        log.log (TRACE, "route\n%s", self.floorText (src, dest))
+                    return c + 1
+                for dx, dy in self._jumpDirections (p, parent[p]):
+                    j = self._jump (p[0] + dx, p[1] + dy, dx, dy, end)
+                    if j != None:
+                        alternative = c + max (abs (j[0] - p[0]), abs (j[1] - p[1]))
+                        if (j not in cost) or (alternative < cost[j]):
+                            cost[j] = alternative
+                            parent[j] = p
+                            h = max (abs (end[0] - j[0]), abs (end[1] - j[1]))
+                            heapq.heappush (queue, (alternative + h, alternative, j))
+        return None
+
+    #
+    #  _jumpRoute - return the route to, dest, filling in the squares
+    #               between the jump points held in, parent.
+    #
+
+    def _jumpRoute (self, parent, dest):
+        points = self._followPrev (parent, dest)
+        r = [points[0]]
+        for p in points[1:]:
+            x, y = r[-1]
+            dx = (p[0] > x) - (p[0] < x)
+            dy = (p[1] > y) - (p[1] < y)
+            while (x != p[0]) or (y != p[1]):
+                x += dx
+                y += dy
+                r += [[x, y]]
+        return r
+
     def _setCostRoute (self, n, cost, prev):
         k = '%d_%d' % (n[0], n[1])
-        if debugroute:
-            print('cost[', k, '] =', cost, 'prev =', prev, '_prev[', k, '] =', prev)
+        log.log (TRACE, "cost[%s] = %s prev = %s", k, cost, prev)
         self._cost[k] = cost
         self._prev[k] = prev
 
@@ -898,16 +2006,13 @@ class aas:
     #
 
     def _defineRoute (self, src, dest):
-        if debugroute:
-            print("route from", src, "to", dest, "is", end=' ')
         r = [dest]
         while src != dest:
             k = '%d_%d' % (dest[0], dest[1])
             dest = self._prev[k]
             r += [dest]
         r.reverse ()
-        if debugroute:
-            print(r)
+        log.log (TRACE, "route from %s to %s is %s", src, dest, r)
         return r
 
 
@@ -938,17 +2043,25 @@ class aas:
     def removeHop (self, i, p):
         if (len (self._route) > 1) and (i < len (self._route)):
             if equVec (p, self._route[i]):
+                if (self._schedule != None) and (self._schedule[3] is self._route):
+                    del self._schedule[4][i]
                 del self._route[i]
 
+    #
+    #  _skipPos - remove the first hop of the journey route if it is the
+    #             square, p, where the bot already stands.
+    #
+
+    def _skipPos (self, p):
+        self.removeHop (0, p)
+
 
     #
     #  addChoice - adds a unique choice to the choices list
     #
 
     def _addChoice (self, c):
-        if debugroute:
-            print("choices =", self._choices)
-            print("visited =", self._visited)
+        log.log (TRACE, "choices = %s visited = %s", self._choices, self._visited)
         if len (self._choices) > 0:
             for i in self._choices:
                 if equVec (i, c):
@@ -973,7 +2086,7 @@ class aas:
                 if self._getCost (i) < cost:
                     c = i
                     cost = self._getCost (c)
-                    z = x
+                    z = x + 1
             del self._choices[z]
         else:
             self._choices = []
@@ -987,8 +2100,7 @@ class aas:
     def _getCost (self, p):
         k = '%d_%d' % (p[0], p[1])
         if k not in self._cost:
-            if debugroute:
-                print("no cost entry, setting to infinity", k)
+            log.log (TRACE, "no cost entry for %s, setting to infinity", k)
             self._cost[k] = INFINITY
         return self._cost[k]
 
@@ -1000,8 +2112,10 @@ class aas:
     def _getLength (self, p):
         if self._weightings.get (p[0], p[1]) == wallCost:
             return INFINITY
+        if (p[0], p[1]) in self._blocked:
+            return INFINITY
         f = self._weightings.get (p[0], p[1])
-        return f
+        return f + self._penalties.get ((p[0], p[1]), 0) + self._influenceCosts.get ((p[0], p[1]), 0)
 
 
     #
@@ -1009,33 +2123,38 @@ class aas:
     #
 
     def clearOfObstacle (self, v):
+        if (v[0], v[1]) in self._blocked:
+            return False
         return (self._floor.get (v[0], v[1]) != '#') and (self._floor.get (v[0], v[1]) != 'l')
 
     #
-    #  _getNeighbours - returns the neighbours of, p.
+    #  _getNeighbours - returns the neighbours of, p.  The neighbours are
+    #                   remembered under the lock as prefetch may search
+    #                   on a worker thread.
     #
 
     def _getNeighbours (self, p):
         k = '%d_%d' % (p[0], p[1])
-        if k not in self._neighbours:
-            n = []
-            # south, east, west, north
-            for v in [[-1, 0], [1, 0], [0, -1], [0, 1]]:
-                w = addVec (p, v)
-                if self._weightings.inRange (w[0], w[1]) and (self._weightings.get (w[0], w[1]) != wallCost):
-                    n += [w]
-            # now the diagonals so long as the two square either side are also free
-            for v in [[[-1, -1], [-1, 0], [0, -1]],
-                      [[-1,  1], [-1, 0], [0,  1]],
-                      [[ 1,  1], [ 1, 0], [0,  1]],
-                      [[ 1, -1], [ 1, 0], [0, -1]]]:
-                d = addVec (p, v[0])
-                a = addVec (p, v[1])
-                b = addVec (p, v[2])
-                if (self._weightings.inRange (d[0], d[1]) and self.clearOfObstacle (d) and self.clearOfObstacle (a) and self.clearOfObstacle (b)):
-                    n += [d]
-            self._neighbours[k] = n
-        return self._neighbours[k]
+        with self._lock:
+            if k not in self._neighbours:
+                n = []
+                # south, east, west, north
+                for v in [[-1, 0], [1, 0], [0, -1], [0, 1]]:
+                    w = addVec (p, v)
+                    if self._weightings.inRange (w[0], w[1]) and (self._weightings.get (w[0], w[1]) != wallCost) and ((w[0], w[1]) not in self._blocked):
+                        n += [w]
+                # now the diagonals so long as the two square either side are also free
+                for v in [[[-1, -1], [-1, 0], [0, -1]],
+                          [[-1,  1], [-1, 0], [0,  1]],
+                          [[ 1,  1], [ 1, 0], [0,  1]],
+                          [[ 1, -1], [ 1, 0], [0, -1]]]:
+                    d = addVec (p, v[0])
+                    a = addVec (p, v[1])
+                    b = addVec (p, v[2])
+                    if (self._weightings.inRange (d[0], d[1]) and self.clearOfObstacle (d) and self.clearOfObstacle (a) and self.clearOfObstacle (b)):
+                        n += [d]
+                self._neighbours[k] = n
+            return self._neighbours[k]
 
 
     #
@@ -1044,11 +2163,11 @@ class aas:
     #
 
     def getPlayerStart (self):
-        for r in list (rooms.keys ()):
-            if rooms[r].worldspawn != []:
-                return rooms[r].worldspawn[0]
-        print("the pen map should contain one worldspawn location")
-        print("this needs to be fixed before area awareness makes any sence to the bot")
+        for r in self._map.rooms.values ():
+            if r.worldspawn != []:
+                return r.worldspawn[0]
+        log.warning ("the pen map should contain one worldspawn location")
+        log.warning ("this needs to be fixed before area awareness makes any sence to the bot")
         return [1, 1]
 
     #
@@ -1058,19 +2177,46 @@ class aas:
     #
 
     def getSpawnFromName (self, name):
-        for r in list (rooms.keys ()):
-            for m in rooms[r].pythonMonsters:
+        for r in self._map.rooms.values ():
+            for m in r.monsters:
                 if name == m[0]:
                     return m[1]
         return None
     #
+    #  getAmmoPositions - return the pen coordinates of the ammo in the map.
+    #                     If kind is given only ammo of this kind is returned.
+    #
+
+    def getAmmoPositions (self, kind = None):
+        l = []
+        for r in self._map.rooms.values ():
+            for k, amount, pos in r.ammo:
+                if (kind == None) or (kind == k):
+                    l += [pos]
+        return l
+
+    #
+    #  getWeaponPositions - return the pen coordinates of the weapons in the
+    #                       map.  If weapon is given only that weapon is
+    #                       returned.
+    #
+
+    def getWeaponPositions (self, weapon = None):
+        l = []
+        for r in self._map.rooms.values ():
+            for w, pos in r.weapons:
+                if (weapon == None) or (str (weapon) == str (w)):
+                    l += [pos]
+        return l
+
+    #
     #  get_label_list - returns a list of all user defined labels used in the map.
     #
 
     def get_label_list (self):
         label_list = []
-        for r in list (rooms.keys ()):
-            for label in list (rooms[r].labels):
+        for r in self._map.rooms.values ():
+            for pos, label in r.labels:
                 label_list += [label]
         return label_list
 
@@ -1078,8 +2224,8 @@ def _runtests ():
     print("_runtests")
     m = aas (os.path.join (os.path.join (os.environ['HOME'], ".local/share/dhewm3/base/maps"),
                            "tiny.pen"))
-    src = intVec (rooms['1'].pythonMonsters[0][1])
-    dest = intVec (rooms['1'].worldspawn[0])
+    src = intVec (m.getSpawnFromName ("python_doommarine_mp"))
+    dest = intVec (m.getPlayerStart ())
     m.printFloor (src, dest)
     c = m.calcnav (src, dest)
     printf ("cost = %d\n", c)
@@ -140,12 +140,15 @@ class basic:
 
     #
     #  getLine - read a character at a time until \n is seen.
+    #            An error is raised if the server closes the connection.
     #
 
     def getLine (self):
         l = ""
         while True:
             c = self.s.recv (1).decode ('utf-8')
+            if c == '':
+                raise ConnectionError ("the server closed the connection")
             if c == '\n':
                 break
             l += c
@@ -558,6 +561,32 @@ class basic:
             print("doom returned", l)
         return tovecint (l)
 
+    #
+    #  getStartup - return the startup information of the bot in one
+    #               request: [me, entity name, spawn position, player
+    #               start position, tag values] where tag values is the
+    #               list of the values of the tags, names.  It must
+    #               only be sent to a server which sets the bulk_startup
+    #               tag.  None is returned if the reply is not understood,
+    #               in which case the individual requests are used.
+    #
+
+    def getStartup (self, names):
+        l = "get_startup " + " ".join (names) + "\n"
+        if debug_protocol:
+            print("requesting", l)
+        self.s.send (l.encode ('utf-8'))
+        l = self.getLine ()
+        if debug_protocol:
+            print("doom returned", l)
+        w = l.split ('\t')
+        if len (w) != len (names) + 4:
+            return None
+        try:
+            return [int (w[0]), w[1], tovecint (w[2]), tovecint (w[3]), w[4:]]
+        except ValueError:
+            return None
+
     #
     #  getEntityName - returns the name string for, entity_no.
     #
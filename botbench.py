@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2020
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  botbench - benchmark the tool chain and the bot layers on synthetic
+#             maps.  Each map is generated as an ascii txt map (a maze
+#             of rooms, a grid of rooms or a large open hall) and then:
+#
+#             txt2pen and pen2map are timed and their peak memory recorded,
+#             automatic light placement is timed against the perimeter
+#             walk and wall matching it replaced on a large notched room,
+#             aas construction is timed,
+#             calcnav latency percentiles are measured for each search,
+#             basic RPC throughput is measured against botsim.
+#
+#  The results are written as JSON so that releases can be compared.
+#
+
+import contextlib
+import getopt
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import botaa
+import botbasic
+import botsim
+import chpipeline
+
+#
+#  the characters used to name rooms in the generated txt maps.
+#
+
+roomChars = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOQRTUVWXYZ"
+versionNumber = "0.1"
+
+
+#
+#  mapDefines - return the define lines for a map of, n, rooms.
+#
+
+def mapDefines (n):
+    l = []
+    for i in range (n):
+        l += ["define %s room %d" % (roomChars[i], i + 1)]
+    l += ["define S worldspawn", "define P monster python_doommarine_mp", ""]
+    return l
+
+
+#
+#  roomGrid - return the ascii grid (a list of lists of characters) of
+#             rows by cols rooms each, size, squares wide.  Only the
+#             walls between the rooms in the set, doors, are opened.
+#             doors contains pairs of room indices (lowest first).
+#
+
+def roomGrid (rows, cols, size, doors):
+    width = cols * (size + 1) + 1
+    height = rows * (size + 1) + 1
+    g = []
+    for y in range (height):
+        if y % (size + 1) == 0:
+            g += [['#'] * width]
+        else:
+            row = [' '] * width
+            for x in range (0, width, size + 1):
+                row[x] = '#'
+            g += [row]
+    mid = (size + 1) // 2
+    for a, b in doors:
+        ra, ca = divmod (a, cols)
+        rb, cb = divmod (b, cols)
+        if ra == rb:
+            x = (ca + 1) * (size + 1)
+            for y in range (mid, mid + 2):
+                g[ra * (size + 1) + y][x] = '.'
+        else:
+            y = (ra + 1) * (size + 1)
+            for x in range (mid, mid + 2):
+                g[y][ca * (size + 1) + x] = '.'
+    for i in range (rows * cols):
+        r, c = divmod (i, cols)
+        g[r * (size + 1) + 1][c * (size + 1) + 1] = roomChars[i]
+    g[1][3] = 'S'
+    r, c = divmod (rows * cols - 1, cols)
+    g[r * (size + 1) + size][c * (size + 1) + size] = 'P'
+    return g
+
+
+#
+#  gridText - return the txt map lines of, n, rooms laid out in grid, g.
+#
+
+def gridText (n, g):
+    return mapDefines (n) + ["".join (row) for row in g]
+
+
+#
+#  neighbourPairs - return every pair of adjacent rooms in a grid of
+#                   rows by cols rooms.
+#
+
+def neighbourPairs (rows, cols):
+    l = []
+    for i in range (rows * cols):
+        r, c = divmod (i, cols)
+        if c + 1 < cols:
+            l += [(i, i + 1)]
+        if r + 1 < rows:
+            l += [(i, i + cols)]
+    return l
+
+
+#
+#  mazeMap - return the txt map of a maze of rows by cols rooms.  The
+#            doors form a random spanning tree so there is exactly one
+#            route between any two rooms.
+#
+
+def mazeMap (rows, cols, size, seed):
+    rnd = random.Random (seed)
+    seen = set ([0])
+    todo = [0]
+    doors = []
+    while todo != []:
+        i = todo[-1]
+        r, c = divmod (i, cols)
+        choices = []
+        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            if (0 <= r + dr < rows) and (0 <= c + dc < cols):
+                j = (r + dr) * cols + c + dc
+                if j not in seen:
+                    choices += [j]
+        if choices == []:
+            todo.pop ()
+        else:
+            j = rnd.choice (choices)
+            seen.add (j)
+            doors += [(min (i, j), max (i, j))]
+            todo += [j]
+    return gridText (rows * cols, roomGrid (rows, cols, size, doors))
+
+
+#
+#  doorsMap - return the txt map of a grid of rows by cols rooms where
+#             every pair of neighbouring rooms shares a door of one or
+#             two squares at a random offset along their wall.
+#
+
+def doorsMap (rows, cols, size, seed):
+    rnd = random.Random (seed)
+    g = roomGrid (rows, cols, size, [])
+    for a, b in neighbourPairs (rows, cols):
+        r, c = divmod (a, cols)
+        width = rnd.randint (1, 2)
+        offset = rnd.randint (1, size - width + 1)
+        if b == a + 1:
+            x = (c + 1) * (size + 1)
+            for y in range (offset, offset + width):
+                g[r * (size + 1) + y][x] = '.'
+        else:
+            y = (r + 1) * (size + 1)
+            for x in range (offset, offset + width):
+                g[y][c * (size + 1) + x] = '.'
+    return gridText (rows * cols, g)
+
+
+#
+#  roomsMap - return the txt map of a grid of rows by cols rooms where
+#             every pair of neighbouring rooms shares a door.
+#
+
+def roomsMap (rows, cols, size):
+    return gridText (rows * cols, roomGrid (rows, cols, size, neighbourPairs (rows, cols)))
+
+
+#
+#  hallMap - return the txt map of a single open hall, width by height
+#            squares inside its walls.
+#
+
+def hallMap (width, height):
+    g = [['#'] * (width + 2)]
+    for y in range (height):
+        g += [['#'] + [' '] * width + ['#']]
+    g += [['#'] * (width + 2)]
+    g[1][1] = roomChars[0]
+    g[1][3] = 'S'
+    g[height][width] = 'P'
+    return gridText (1, g)
+
+
+#
+#  perimeterMap - return the txt map of a single room, size squares
+#                 wide, whose walls are notched every third square so
+#                 that its perimeter is long.
+#
+
+def perimeterMap (size):
+    g = [['#'] * (size + 2)]
+    for y in range (size):
+        g += [['#'] + [' '] * size + ['#']]
+    g += [['#'] * (size + 2)]
+    for i in range (4, size - 2, 3):
+        g[1][i] = '#'
+        g[size][i] = '#'
+        g[i][1] = '#'
+        g[i][size] = '#'
+    g[1][1] = roomChars[0]
+    g[2][3] = 'S'
+    g[size - 1][size - 1] = 'P'
+    return gridText (1, g)
+
+
+#
+#  syntheticMaps - return a list of [name, txt lines] of the benchmark maps.
+#                  quick selects the small maps.
+#
+
+def syntheticMaps (seed, quick):
+    if quick:
+        return [["maze", mazeMap (4, 4, 6, seed)],
+                ["rooms", roomsMap (3, 4, 8)],
+                ["hall", hallMap (40, 40)]]
+    return [["maze", mazeMap (7, 8, 8, seed)],
+            ["rooms", roomsMap (6, 8, 12)],
+            ["hall", hallMap (100, 60)]]
+
+
+#
+#  measure - call function, f, with args and return its result, the
+#            elapsed time in seconds and the peak memory in bytes.
+#
+
+def measure (f, *args):
+    tracemalloc.start ()
+    start = time.perf_counter ()
+    result = f (*args)
+    elapsed = time.perf_counter () - start
+    peak = tracemalloc.get_traced_memory ()[1]
+    tracemalloc.stop ()
+    return result, elapsed, peak
+
+
+#
+#  percentiles - return the summary statistics of the list of times, l.
+#
+
+def percentiles (l):
+    if l == []:
+        return {}
+    l = sorted (l)
+    result = {"count": len (l), "mean": sum (l) / len (l), "max": l[-1]}
+    for p in [50, 90, 99]:
+        result["p%d" % p] = l[min (len (l) - 1, (len (l) * p) // 100)]
+    return result
+
+
+#
+#  floorSquares - return the list of walkable squares of area, a.
+#
+
+def floorSquares (a):
+    high = a._floor.high ()
+    l = []
+    for x in range (high[0] + 1):
+        for y in range (high[1] + 1):
+            if a._walkable (x, y):
+                l += [[x, y]]
+    return l
+
+
+#
+#  benchCompile - compile the txt map, lines, in directory, d, and
+#                 return the results and the map model.
+#
+
+def benchCompile (name, lines, d):
+    txtname = os.path.join (d, name + ".txt")
+    penname = os.path.join (d, name + ".pen")
+    mapname = os.path.join (d, name + ".map")
+    with open (txtname, 'w') as o:
+        o.write ("\n".join (lines) + "\n")
+    with contextlib.redirect_stdout (open (os.devnull, 'w')):
+        m, t0, m0 = measure (chpipeline.txt2model, txtname)
+        chpipeline.writePen (m, penname)
+        r, t1, m1 = measure (chpipeline.model2map, m, penname, mapname)
+    return {"txt2pen_seconds": t0, "txt2pen_peak_bytes": m0,
+            "pen2map_seconds": t1, "pen2map_peak_bytes": m1,
+            "rooms": len (m.rooms)}, penname, m
+
+
+#
+#  lookingLeftLights - return the lights placed by the txt2pen tool, t,
+#                      around the room whose top left wall is, p, in
+#                      mapGrid.  It is the perimeter walk as it was
+#                      before the grid was classified once and is kept
+#                      as the reference for benchLights.
+#
+
+def lookingLeftLights (t, p, mapGrid):
+    s = p
+    d = 1  # 0 up, 1 right, 2 down, 3 left
+    leftVec = [[-1, 0], [0, -1], [1, 0], [0, 1]]
+    forwardVec = [[0, -1], [1, 0], [0, 1], [-1, 0]]
+    lightCount = 0
+    lights = []
+    doorStartPoint = None
+    doorEndPoint = None
+    suppressDoor = False
+    while True:
+        if (doorStartPoint == None) and t.lookingLeft (p, leftVec[d], mapGrid, '. '):
+            doorEndPoint = doorStartPoint
+            suppressDoor = True
+        if t.lookingLeft (t.addVec (p, forwardVec[d]), leftVec[d], mapGrid, '. '):
+            suppressDoor = True
+            doorEndPoint = t.addVec (t.addVec (p, forwardVec[d]), leftVec[d])
+        elif doorEndPoint != None:
+            doorEndPoint = None
+            doorStartPoint = None
+            suppressDoor = True
+        if t.lookingLeft (t.addVec (p, forwardVec[d]), leftVec[d], mapGrid, 'x '):
+            if suppressDoor:
+                li = t.light ()
+                li.settype ('FLOOR')
+                lights += [p + [li]]
+            else:
+                lights, lightCount = t.checkLight (p, lights, lightCount)
+            p = t.addVec (p, forwardVec[d])
+            suppressDoor = False
+        elif t.lookingLeft (t.addVec (p, forwardVec[d]), leftVec[d], mapGrid, 'x.'):
+            doorStartPoint = None
+            doorEndPoint = None
+            suppressDoor = True
+            d = (d + 1) % 4
+            if s == p:
+                return lights
+        elif t.lookingLeft (t.addVec (p, forwardVec[d]), leftVec[d], mapGrid, 'xx'):
+            doorStartPoint = None
+            doorEndPoint = None
+            suppressDoor = False
+            d = (d + 1) % 4
+            if s == p:
+                return lights
+        elif t.lookingLeft (t.addVec (p, forwardVec[d]), leftVec[d], mapGrid, '  '):
+            p = t.addVec (p, forwardVec[d])
+            d = (d + 3) % 4
+            suppressDoor = True
+            if s == p:
+                return lights
+        else:
+            return lights
+
+
+#
+#  scanNextTo - return the first wall in, el, next to light position, p,
+#               by testing every wall as pen2map did before the walls
+#               were indexed.
+#
+
+def scanNextTo (p, el, pos):
+    for w in el:
+        if p.nextTo (w, pos):
+            return w
+    return None
+
+
+#
+#  bestOf - return the result of calling, f, with args and the shortest
+#           elapsed time in seconds of, repeats, calls.
+#
+
+def bestOf (repeats, f, *args):
+    best = None
+    for i in range (repeats):
+        start = time.perf_counter ()
+        result = f (*args)
+        elapsed = time.perf_counter () - start
+        if (best == None) or (elapsed < best):
+            best = elapsed
+    return result, best
+
+
+#
+#  lightKeys - return the position and orientation of each light in, l,
+#              so that two placements can be compared.
+#
+
+def lightKeys (l):
+    return [[i[0], i[1], i[2].orientation] for i in l]
+
+
+#
+#  benchLights - time the automatic light placement of txt2pen and the
+#                matching of lights to walls in pen2map against the
+#                reference implementations on a notched room, size
+#                squares wide, compiled in directory, d.
+#
+
+def benchLights (size, d, repeats):
+    txtname = os.path.join (d, "perimeter.txt")
+    penname = os.path.join (d, "perimeter.pen")
+    lines = perimeterMap (size)
+    with open (txtname, 'w') as o:
+        o.write ("\n".join (lines) + "\n")
+    with contextlib.redirect_stdout (open (os.devnull, 'w')):
+        t = chpipeline.loadTool ("txt2pen")
+        t.handleOptions (["-l", txtname])
+        t.inputFile = txtname
+        m = t.buildModel (list (lines))
+        chpipeline.writePen (m, penname)
+        p = chpipeline.loadTool ("pen2map")
+        p.handleOptions ([penname])
+        p.checkRegression ()
+        p.inputFile = penname
+        p.processModel (m, open (os.devnull, 'w'))
+    grid = t.readMap (t.readDefines (list (lines)))[0]
+    topLeft = t.rooms["1"].topLeft
+    new, newTime = bestOf (repeats, t.introduceLights, topLeft, grid, [], [])
+    old, oldTime = bestOf (repeats, lookingLeftLights, t, topLeft, grid)
+    el = p.roomToEntities ("1")
+    positions = [l[0] for l in p.rooms["1"].lights]
+    index = p.wallIndex (el)
+    found, foundTime = bestOf (repeats, lambda: [p.findNextTo (index, pos) for pos in positions])
+    scanned, scanTime = bestOf (repeats, lambda: [scanNextTo (p, el, pos) for pos in positions])
+    return {"size": size, "lights": len (new), "walls": len (el),
+            "introduce_seconds": newTime, "introduce_reference_seconds": oldTime,
+            "introduce_same": lightKeys (new) == lightKeys (old),
+            "wall_match_seconds": foundTime, "wall_match_reference_seconds": scanTime,
+            "wall_match_same": found == scanned}
+
+
+#
+#  benchNavigation - time aas construction and calcnav for each search
+#                    mode over, queries, random source and destination
+#                    pairs of the map, m.
+#
+
+def benchNavigation (penname, m, queries, seed):
+    a, elapsed, peak = measure (botaa.aas, penname, m)
+    result = {"aas_seconds": elapsed, "aas_peak_bytes": peak}
+    squares = floorSquares (a)
+    result["squares"] = len (squares)
+    rnd = random.Random (seed)
+    pairs = []
+    for i in range (queries):
+        pairs += [[rnd.choice (squares), rnd.choice (squares)]]
+    for name, search in [["grid", botaa.gridSearch],
+                         ["room", botaa.roomSearch],
+                         ["jump", botaa.jumpSearch]]:
+        times = []
+        for src, dest in pairs:
+            start = time.perf_counter ()
+            a.calcnav (src, dest, search)
+            times += [time.perf_counter () - start]
+        result["calcnav_" + name] = percentiles (times)
+    return result
+
+
+#
+#  benchProtocol - measure the request throughput of botbasic.basic
+#                  against a botsim server for the pen map, penname.
+#
+
+def benchProtocol (penname, requests, port):
+    name = "python_doommarine 1"
+    s = botsim.server (penname, [name], port)
+    s.start ()
+    saved = botbasic.superServer, botbasic.debug_protocol
+    botbasic.superServer = port
+    botbasic.debug_protocol = False
+    try:
+        with contextlib.redirect_stdout (open (os.devnull, 'w')):
+            b = botbasic.basic ("localhost", name)
+            me = b.me ()
+            start = time.perf_counter ()
+            for i in range (requests):
+                b.getpos (me)
+            queries = time.perf_counter () - start
+            start = time.perf_counter ()
+            for i in range (requests // 4):
+                b.forward (100, 48)
+                b.select (['move'])
+                b.turn ((i * 90) % 360, 0)
+                b.select (['turn'])
+            moves = time.perf_counter () - start
+            b.s.close ()
+    finally:
+        botbasic.superServer, botbasic.debug_protocol = saved
+        s.stop ()
+    return {"getpos_per_second": requests / queries,
+            "move_turn_requests_per_second": requests / moves,
+            "simulated_ticks": s.getWorld ().getTicks ()}
+
+
+#
+#  runBenchmarks - run every benchmark and return the results.
+#
+
+def runBenchmarks (seed, quick, queries, requests, port):
+    results = {"version": versionNumber,
+               "python": platform.python_version (),
+               "platform": platform.platform (),
+               "seed": seed, "quick": quick, "maps": {}}
+    d = tempfile.mkdtemp (prefix="botbench")
+    try:
+        if quick:
+            results["lights"] = benchLights (48, d, 3)
+        else:
+            results["lights"] = benchLights (100, d, 10)
+        for i, (name, lines) in enumerate (syntheticMaps (seed, quick)):
+            r, penname, m = benchCompile (name, lines, d)
+            r.update (benchNavigation (penname, m, queries, seed))
+            if requests > 0:
+                r.update (benchProtocol (penname, requests, port + i * 10))
+            results["maps"][name] = r
+    finally:
+        shutil.rmtree (d)
+    return results
+
+
+def usage (code):
+    print ("Usage: botbench [-hq] [-n queries] [-o outputfile] [-p port] [-r requests] [-s seed]")
+    print ("  -h            help")
+    print ("  -n queries    calcnav queries per search mode (default 200)")
+    print ("  -o outputfile write the JSON results to outputfile (default stdout)")
+    print ("  -p port       first superserver port for the protocol benchmark (default 7400)")
+    print ("  -q            quick, use small maps")
+    print ("  -r requests   protocol requests, 0 skips the protocol benchmark (default 2000)")
+    print ("  -s seed       random seed (default 1)")
+    sys.exit (code)
+
+
+def main ():
+    outputName, port, queries, quick, requests, seed = None, 7400, 200, False, 2000, 1
+    try:
+        optlist, l = getopt.getopt (sys.argv[1:], ':hn:o:p:qr:s:')
+        for opt in optlist:
+            if opt[0] == '-h':
+                usage (0)
+            elif opt[0] == '-n':
+                queries = int (opt[1])
+            elif opt[0] == '-o':
+                outputName = opt[1]
+            elif opt[0] == '-p':
+                port = int (opt[1])
+            elif opt[0] == '-q':
+                quick = True
+            elif opt[0] == '-r':
+                requests = int (opt[1])
+            elif opt[0] == '-s':
+                seed = int (opt[1])
+    except getopt.GetoptError:
+        usage (1)
+    if l != []:
+        usage (1)
+    results = runBenchmarks (seed, quick, queries, requests, port)
+    if outputName == None:
+        json.dump (results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write ("\n")
+    else:
+        with open (outputName, 'w') as o:
+            json.dump (results, o, indent=2, sort_keys=True)
+            o.write ("\n")
+
+
+if __name__ == "__main__":
+    main ()
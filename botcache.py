@@ -28,6 +28,9 @@ import sys
 import os
 
 from botbasic import basic
+from botutils import getLog
+
+log = getLog ("botcache")
 
 
 #
@@ -54,7 +57,7 @@ class cache:
     #
 
     def reset (self):
-        print("reset cache")
+        log.debug ("reset cache")
         self._dict = {}
 
     #
@@ -76,6 +79,22 @@ class cache:
             self._dict[l] = self._basic.getpos (obj)
         return self._dict[l]
 
+    #
+    #  knownpos - return the position of, obj, if it is in the cache
+    #             otherwise return None.
+    #
+
+    def knownpos (self, obj):
+        return self._dict.get ('getpos_%d' % (obj), None)
+
+    #
+    #  knownme - return the bots entity, id, if it is in the cache
+    #            otherwise return None.
+    #
+
+    def knownme (self):
+        return self._dict.get ('me', None)
+
     #
     #  me - return the bots entity, id.
     #
@@ -273,7 +292,7 @@ class cache:
     #
 
     def aim (self, player_number):
-        print("cache aim")
+        log.debug ("cache aim")
         return self._basic.aim (player_number)
 
     #
@@ -347,6 +366,31 @@ class cache:
             self._dict['getpenmapname'] = self._basic.getPenMapName ()
         return self._dict['getpenmapname']
 
+    #
+    #  startup - fetch the startup information and the tags, names, with
+    #            a single request and remember them.  False is returned
+    #            if the server does not set the bulk_startup tag, the
+    #            values are then fetched one at a time when they are used.
+    #            The tag is remembered like any other.
+    #
+
+    def startup (self, names):
+        if self.getTag ("bulk_startup") != "true":
+            return False
+        s = self._basic.getStartup (names)
+        if s == None:
+            return False
+        me, name, spawn, start, values = s
+        self._dict['me'] = me
+        self._dict["entity name %d" % me] = name
+        self._dict["entity %d" % me] = spawn
+        self._dict['info_player_start'] = start
+        for n, v in zip (names, values):
+            self._dict["tag " + n] = v
+            if n == "penmap":
+                self._dict['getpenmapname'] = v
+        return True
+
     #
     #  getTag - returns the tag value in the map file.
     #
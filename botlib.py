@@ -27,20 +27,27 @@ import socket
 import sys
 import os
 import random
+import threading
 
 from botaa import aas
 from botbasic import basic
 from botcache import cache
 from chvec import *
+from botutils import getLog, TRACE
 from math import atan2, sqrt
 
 debugging = False
 debugBulk = False
+speculativeRoutes = True   # work out the next route on a worker thread while the bot moves
+log = getLog ("botlib")
 
 pen2doom3units = 48   # inches per ascii square
+startupTags = ["penmap", "penminx", "penminy", "penmaxx", "penmaxy",
+               "doomminx", "doomminy", "doommaxx", "doommaxy"]
 angle_offset = 0
 diagonal_scaling = 0.55
 vertical_horizontal_scaling = 0.55
+stepSeconds = 0.25   # time to move one square until a move has been measured
 
 
 #
@@ -74,13 +81,9 @@ def incAngle (angle, inc):
 
 def calcScaleOffset (pen0, doom0, pen1, doom1):
     diffPen = subVec (pen0, pen1)
-    print ("pen0 =", pen0)
-    print ("pen1 =", pen1)
-    print ("diffPen =", diffPen)
     diffD3 = subVec (doom0, doom1)
-    print ("doom0 =", doom0)
-    print ("doom1 =", doom1)
-    print ("diffD3 =", diffD3)
+    log.debug ("pen0 = %s pen1 = %s diffPen = %s", pen0, pen1, diffPen)
+    log.debug ("doom0 = %s doom1 = %s diffD3 = %s", doom0, doom1, diffD3)
     scaleX = float (diffD3[0]) / float (diffPen[0])
     scaleY = float (diffD3[1]) / float (diffPen[1])
     offsetX = doom0[0] - float (pen0[0]) * scaleX
@@ -105,8 +108,19 @@ class bot:
     #
 
     def __init__ (self, server, name):
+        self._startupTimes = {}
+        t = time.perf_counter ()
         self._cache = cache (server, name)
+        t = self._startupStep ("connect", t)
+        self._bulkStartup = self._cache.startup (startupTags)
+        t = self._startupStep ("handshake", t)
         self._aas = aas (self.getPenMapName ())
+        t = self._startupStep ("aas", t)
+        self._visibility = {"asked": 0, "pvs": 0, "walls": 0, "server": 0, "uncached": 0}
+        self._speculation = None
+        self._predicted = None
+        self._stepTime = stepSeconds
+        self._wait = None
         self._id = self.me ()
         penMin, penMax, doomMin, doomMax = self.getLimits ()
         spawnPenPlayer = intVec (self._aas.getPlayerStart ())
@@ -114,28 +128,42 @@ class bot:
         spawnD3Python = intVec (self._cache.getSpawnPos ())
         self._name = self._cache.getEntityName (self._id)
         spawnPenPython = intVec (self._aas.getSpawnFromName ("python_doommarine_mp"))
-        print ("spawnPenPython =", spawnPenPython)
+        log.debug ("spawnPenPython = %s", spawnPenPython)
         self._scaleX, self._offsetX, self._scaleY, self._offsetY = calcScaleOffset (penMin, doomMin, penMax, doomMax)
-        print (self._scaleX, self._offsetX, self._scaleY, self._offsetY)
-        print ("the doom3 coordinate", spawnD3Player, "really maps onto", spawnPenPlayer)
+        log.debug ("scale %s offset %s, scale %s offset %s", self._scaleX, self._offsetX, self._scaleY, self._offsetY)
         self._scale2DX = signOf (self._scaleX)
         self._scale2DY = signOf (self._scaleY)
-        print ("the 2D doom scale units are", self._scale2DX, "and", self._scale2DY)
-        test = self.d2pv (spawnD3Player)
-        print ("the doom3 coordinate", spawnD3Python, "really maps onto", spawnPenPython)
-        print ("the doom3 coordinate", spawnD3Player, "really maps onto", spawnPenPlayer)
-        print ("asserting spawn player coordinates on pen and doom3 maps match: ", end="")
+        log.debug ("the 2D doom scale units are %s and %s", self._scale2DX, self._scale2DY)
+        log.info ("the doom3 coordinate %s really maps onto %s", spawnD3Python, spawnPenPython)
+        log.info ("the doom3 coordinate %s really maps onto %s", spawnD3Player, spawnPenPlayer)
         assert (equVec (self.d2pv (spawnD3Player), spawnPenPlayer))
-        print ("passed")
-        print ("asserting spawn position of doom python bot coordinates on pen and doom3 maps match: ", end="")
+        log.info ("spawn player coordinates on pen and doom3 maps match")
         #
         # this assert will only work for a single python bot
         #
         # assert (equVec (self.d2pv (spawnD3Python), spawnPenPython))
-        # print ("passed")
-        print ("reversing transform d2pv (", spawnPenPython, ") ->", self.p2dv (spawnPenPython), " == ", spawnD3Python)
+        log.debug ("reversing transform d2pv (%s) -> %s == %s", spawnPenPython, self.p2dv (spawnPenPython), spawnD3Python)
+        self._startupStep ("transform", t)
+        log.info ("startup took %s (bulk handshake %s)", self._startupTimes, self._bulkStartup)
         # os.sys.exit (0)
 
+    #
+    #  _startupStep - record the time since, t, taken by the startup
+    #                 step, name, and return the current time.
+    #
+
+    def _startupStep (self, name, t):
+        now = time.perf_counter ()
+        self._startupTimes[name] = now - t
+        return now
+
+    #
+    #  startup_times - return the seconds taken by each step of startup.
+    #
+
+    def startup_times (self):
+        return dict (self._startupTimes)
+
     #
     #  getLimits -
     #
@@ -169,13 +197,28 @@ class bot:
     def get_label_list (self):
         return self._aas.get_label_list ()
 
+    #
+    #  get_ammo_positions - returns the pen positions of the ammo in the map.
+    #
+
+    def get_ammo_positions (self, kind = None):
+        return self._aas.getAmmoPositions (kind)
+
+    #
+    #  get_weapon_positions - returns the pen positions of the weapons in the map.
+    #
+
+    def get_weapon_positions (self, weapon = None):
+        return self._aas.getWeaponPositions (weapon)
+
 
     #
     #  me - return the bots entity, id.
     #
 
     def me (self):
-        self._aas.printFloor ()
+        if log.isEnabledFor (TRACE):
+            log.log (TRACE, "floor plan\n%s", self._aas.floorText ())
         return self._cache.me ()
 
     #
@@ -252,6 +295,13 @@ class bot:
     def get_doors (self, room_no = None):
         return [ ]   # --fixme-- finish this gaius
 
+    #
+    #  objectname - return the classname of the object, d.
+    #
+
+    def objectname (self, d):
+        return self._cache.objectname (d)
+
     #
     #  getpos - return the position of, obj in doom3 units.
     #
@@ -373,6 +423,7 @@ class bot:
     #
 
     def calcnav (self, d):
+        self._finishSpeculation ()
         self.reset ()
         src = self.d2pv (self.getpos (self.me ()))
         dest = self.d2pv (self.getpos (d))
@@ -391,11 +442,163 @@ class bot:
     #
 
     def calcnav_pos (self, dest):
+        self._finishSpeculation ()
         self.reset ()
         src = self.d2pv (self.getpos (self.me ()))
         return self._aas.calcnav (src, dest)
 
 
+    #
+    #  calcnav_nearest - calculate the navigation route between us and the
+    #                    nearest of the pen positions, dests, (for example
+    #                    those given by get_ammo_positions).  It returns
+    #                    [position, distance] with the distance in penguin
+    #                    tower units or None if none can be reached.
+    #
+
+    def calcnav_nearest (self, dests):
+        self._finishSpeculation ()
+        self.reset ()
+        src = self.d2pv (self.getpos (self.me ()))
+        return self._aas.nearest (src, dests)
+
+
+    #
+    #  predict_target - remember pen position, dest, as the place the bot
+    #                   is expected to head for next.  While journey moves
+    #                   the bot the routes to dest are worked out on a
+    #                   worker thread so that the following calcnav_pos
+    #                   (dest) is answered at once.
+    #                   None forgets the prediction.
+    #
+
+    def predict_target (self, dest):
+        self._predicted = dest
+
+
+    #
+    #  _speculate - start working out the route to the predicted target
+    #               on a worker thread while the bot moves to pen square,
+    #               src.  The route starts from the end of the current
+    #               route, where the journey stops.  Without a prediction
+    #               the target is the square of, obj, already in the cache
+    #               if it is off the end of the route, and the route starts
+    #               from src.  A speculation still running is left to
+    #               finish rather than waited for.
+    #
+
+    def _speculate (self, src, obj):
+        if (not speculativeRoutes) or (self._aas.noOfHops () == 0):
+            return
+        if (self._speculation != None) and self._speculation.is_alive ():
+            return
+        self._speculation = None
+        dest = self._predicted
+        if dest != None:
+            src = self._aas.getHop (self._aas.noOfHops () - 1)
+        elif obj != None:
+            p = self._cache.knownpos (obj)
+            if p == None:
+                return
+            dest = self.d2pv (p)
+            if equVec (dest, self._aas.getHop (self._aas.noOfHops () - 1)):
+                return
+        if (dest == None) or equVec (src, dest):
+            return
+        self._speculation = threading.Thread (target=self._aas.prefetch, args=(src, dest))
+        self._speculation.start ()
+
+
+    #
+    #  _finishSpeculation - wait for the route being worked out by
+    #                       _speculate to be remembered.  It is called
+    #                       before the aas state is used or changed by
+    #                       anything other than journey.
+    #
+
+    def _finishSpeculation (self):
+        if self._speculation != None:
+            self._speculation.join ()
+            self._speculation = None
+
+
+    #
+    #  route_cache_stats - return the hits, misses and size of the
+    #                      route cache used by calcnav and the number
+    #                      of speculative routes and of those used.
+    #
+
+    def route_cache_stats (self):
+        return self._aas.routeCacheStats ()
+
+
+    #
+    #  next_hop - return the pen square to step onto next when heading
+    #             for object, d, or None if there is no route.  The
+    #             square is looked up in the flow field of d's square,
+    #             which is shared with the other bots chasing d.
+    #
+
+    def next_hop (self, d):
+        self._finishSpeculation ()
+        self.reset ()
+        src = self.d2pv (self.getpos (self.me ()))
+        dest = self.d2pv (self.getpos (d))
+        return self._aas.nextHop (src, dest)
+
+
+    #
+    #  calcnav_cooperative - calculate the navigation route between us and
+    #                        object, d, as calcnav but avoiding the squares
+    #                        reserved by the other bots of this process.
+    #                        The start of the route is reserved for us.
+    #
+
+    def calcnav_cooperative (self, d):
+        self._finishSpeculation ()
+        self.reset ()
+        src = self.d2pv (self.getpos (self.me ()))
+        dest = self.d2pv (self.getpos (d))
+        return self._aas.calcnavCooperative (src, dest, self.me ())
+
+
+    #
+    #  release_route - forget the squares reserved by calcnav_cooperative.
+    #
+
+    def release_route (self):
+        self._finishSpeculation ()
+        self._aas.releaseRoute (self.me ())
+
+
+    #
+    #  update_influence - move the threat of each object in, enemies, to
+    #                     its current square, fade the damage taken and
+    #                     use the influence map as a route cost layer.
+    #
+
+    def update_influence (self, enemies):
+        self._finishSpeculation ()
+        self.reset ()
+        influence = self._aas.getInfluence ()
+        for e in enemies:
+            influence.setPresence (("enemy", e), "threat", self.d2pv (self.getpos (e)), 1)
+        influence.tick ()
+        self._aas.applyInfluence ()
+
+
+    #
+    #  record_damage - record that we took, amount, damage at our current
+    #                  square so routes avoid it for a while.
+    #
+
+    def record_damage (self, amount):
+        self._finishSpeculation ()
+        self.reset ()
+        src = self.d2pv (self.getpos (self.me ()))
+        self._aas.getInfluence ().addEvent ("damage", src, amount)
+
+
     #
     #  calcAngle - calculate the angle to face vector, v.
     #
@@ -502,6 +705,7 @@ class bot:
 
     def journey (self, velocity, distance_pen, destination_pen, obj = None):
         self.reset ()
+        self._wait = None
         if debugging:
             print ("journey along route", self._aas._route)
         if obj is None:
@@ -519,16 +723,26 @@ class bot:
         while (distance_pen > 0) and (velocity != 0) and self.on_pen (obj, initial_obj_pen) and (not equVec (self._aas.getHop (0), destination_pen)):
             if debugging:
                 print ("while loop: distance_pen =", distance_pen)
-            v = subVec (self.d2pv (self.getpos (self.me ())), self._aas.getHop (0))
+            self._aas.updateKnowlege (self)
+            mypos = self.d2pv (self.getpos (self.me ()))
+            if self._waitSchedule (mypos):
+                self.reset ()
+                continue
+            v = subVec (mypos, self._aas.getHop (0))
             hopPos = self._aas.getHop (0)
             hops = 1
-            while (hops < self._aas.noOfHops ()) and equVec (subVec (hopPos, self._aas.getHop (hops)), v):
+            #
+            #  a cooperative route stops at a square where it waits for another bot to pass
+            #
+            while (hops < self._aas.noOfHops ()) and equVec (subVec (hopPos, self._aas.getHop (hops)), v) and (self._aas.scheduledWait (hopPos) == 0):
                 hopPos = self._aas.getHop (hops)
                 hops += 1
             if debugging:
                 print("bulk hop nav", self._aas.getHop (hops-1), hops)
                 print("aas._route = ", self._aas._route)
-            distance_pen = self.ssBulkNav (velocity, self._aas.getHop (hops-1), hops)
+            t = time.perf_counter ()
+            distance_pen = self.ssBulkNav (velocity, self._aas.getHop (hops-1), hops, obj)
+            self._stepTime = (time.perf_counter () - t) / hops
             if debugging:
                 print("bulk hop nav: distance_pen =", distance_pen)
             if distance_pen > 0:
@@ -536,6 +750,7 @@ class bot:
                 mypos = self.d2pv (self.getpos (self.me ()))
                 for h in range (hops):
                     if equVec (mypos, self._aas.getHop (h)):
+                        self._aas.advanceSchedule (h + 1)
                         for i in range (h):
                             self._aas.removeHop (0, self._aas.getHop (0))
                         hops = 0  #  use first hop as we have discarded hops 0..h-1
@@ -570,6 +785,30 @@ class bot:
         return 5  # none of the above
 
 
+    #
+    #  _waitSchedule - return True if the bot is to stay on square, p, for
+    #                  the steps given by the cooperative route so the bot
+    #                  we are giving way to can pass.  The journey loop
+    #                  keeps running while we wait.  The wait ends once
+    #                  the other bot has moved on or the steps have taken
+    #                  their time.
+    #
+
+    def _waitSchedule (self, p):
+        if self._wait == None:
+            w = self._aas.takeWait (p)
+            if w == 0:
+                return False
+            log.debug ("waiting %d steps at %s", w, p)
+            self._wait = [p, w, time.perf_counter () + w * self._stepTime]
+        q, w, end = self._wait
+        if equVec (p, q) and (not self._aas.waitOver (q, w)) and (time.perf_counter () < end):
+            return True
+        self._wait = None
+        self._aas.advanceSchedule (w)
+        return False
+
+
     def runArc (self, angle, dist):
         self.forward (100, dist)
         self.turn (angle, 1)
@@ -579,11 +818,15 @@ class bot:
 
     #
     #  ssBulkNav - multiple square navigate, turn and move to position.
+    #              While the bot moves the route from position_pen to
+    #              obj (or from the end of the route to the predicted
+    #              target) is worked out.
     #
 
-    def ssBulkNav (self, velocity, position_pen, noHops):
+    def ssBulkNav (self, velocity, position_pen, noHops, obj = None):
         if debugBulk:
             print ("ssBulkNav (velocity =", velocity, "position_pen =", position_pen, "noHops =", noHops)
+        self._speculate (position_pen, obj)
         self.reset ()
         initpos_doom = self.getpos (self.me ())
         initpos_pen = self.d2pv (initpos_doom)
@@ -692,12 +935,46 @@ class bot:
         self._cache.reset ()
 
     #
-    #  isvisible - is object i visible?
+    #  isvisible - is object i visible?  Objects in rooms which cannot
+    #              be seen from our room, or which are hidden behind
+    #              walls on the floor grid, are rejected without asking
+    #              the server.  The check is only made if both positions
+    #              are already in the cache, as fetching them would cost
+    #              more server calls than it saves.
     #
 
     def isvisible (self, i):
+        self._visibility["asked"] += 1
+        me = self._cache.knownme ()
+        if me != None:
+            src = self._cache.knownpos (me)
+            dest = self._cache.knownpos (i)
+        if (me == None) or (src == None) or (dest == None):
+            self._visibility["uncached"] += 1
+            self._visibility["server"] += 1
+            return self._cache.isvisible (i)
+        src = self.d2pv (src)
+        dest = self.d2pv (dest)
+        if not self._aas.potentiallyVisible (src, dest):
+            self._visibility["pvs"] += 1
+            return False
+        if not self._aas.lineOfSight (src, dest):
+            self._visibility["walls"] += 1
+            return False
+        self._visibility["server"] += 1
         return self._cache.isvisible (i)
 
+    #
+    #  visibility_stats - return the number of isvisible calls, how many
+    #                     were answered by the pvs and by the floor grid
+    #                     and how many were sent to the server (of which
+    #                     uncached were sent without a check as the
+    #                     positions were not in the cache).
+    #
+
+    def visibility_stats (self):
+        return dict (self._visibility)
+
     #
     #  changeWeapon - change to, weapon_number.
     #                 Attempt to change to weapon_number
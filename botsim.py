@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2020
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  botsim - a headless game server which speaks the line protocol used
+#           by botbasic.basic.  The world is a pen map loaded through
+#           botaa.  Time is simulated in ticks: a select advances the
+#           world until the requested activity has finished, so bots
+#           run as fast as the host allows unless a speed is given.
+#           The connected bots then step the world together, one tick
+#           at a time.  With a speed the world follows the wall clock,
+#           however many bots are connected.
+#
+#  A pen square, [p, q], covers the doom3 units [p*48, p*48+48) and
+#  [q*48, q*48+48).  The pen and doom limits are given as map tags so
+#  botlib derives the same transformation as it would from a real map.
+#
+
+import getopt
+import math
+import os
+import socketserver
+import sys
+import threading
+import time
+
+from botaa import aas
+from botutils import getLog
+from chroom import readPen
+
+log = getLog ("botsim")
+
+unitsPerSquare = 48      #  doom3 units (inches) per pen square
+defaultPort = 7000       #  the superserver port
+botPortOffset = 100      #  bot servers listen from the superserver port plus this
+defaultTickRate = 60     #  ticks per simulated second
+defaultHealth = 100
+defaultAmmo = 50
+moveBit, fireBit, turnBit, reloadBit = 1, 2, 4, 8
+bulkStartup = True       #  answer get_startup, set False to act as a server without it
+stepWait = 0.1           #  seconds a step waits for a connected bot which is not selecting
+
+
+#
+#  pen2doom - return the doom3 coordinate of the centre of pen square, p.
+#
+
+def pen2doom (p):
+    return [p[0] * unitsPerSquare + unitsPerSquare / 2.0,
+            p[1] * unitsPerSquare + unitsPerSquare / 2.0, 0.0]
+
+
+#
+#  doom2pen - return the pen square containing doom3 coordinate, v.
+#
+
+def doom2pen (v):
+    return [int (math.floor (v[0] / unitsPerSquare)), int (math.floor (v[1] / unitsPerSquare))]
+
+
+#
+#  entity - an object in the simulated world.  Entities which move
+#           record their current movement and turn.
+#
+
+class entity:
+    def __init__ (self, classname, name, pen):
+        self.classname = classname
+        self.name = name
+        self.spawn = pen2doom (pen)
+        self.pos = list (self.spawn)
+        self.yaw = 0.0
+        self.health = defaultHealth
+        self.ammo = defaultAmmo
+        self.weapon = 0
+        self.firing = False
+        self.move = None        #  [dx, dy per tick, remaining distance]
+        self.turn = None        #  [target yaw, degrees per tick]
+
+    #
+    #  busy - return the activity bits of the activities not yet finished.
+    #
+
+    def busy (self):
+        b = 0
+        if self.move != None:
+            b |= moveBit
+        if self.turn != None:
+            b |= turnBit
+        return b
+
+
+#
+#  world - the pen map, its entities and the simulated clock.
+#
+
+class world:
+    def __init__ (self, penname, botNames, tickRate = defaultTickRate, speed = 0):
+        self._penname = penname
+        self._map = readPen (penname)
+        if self._map == None:
+            raise ValueError ("unable to read the pen map " + penname)
+        self._aas = aas (penname, self._map)
+        self._tickRate = tickRate
+        self._speed = speed
+        self._ticks = 0
+        self._start = time.perf_counter ()
+        self._lock = threading.RLock ()
+        self._stepped = threading.Condition (self._lock)
+        self._connected = set ()          #  bots with an open connection
+        self._waiting = {}                #  bots in select and the tick they last saw
+        self._entities = [None]           #  entity ids start at 1
+        self._bots = {}
+        self._addEntities (botNames)
+        self._tags = self._makeTags ()
+
+    #
+    #  _add - add entity, e, and return its id.
+    #
+
+    def _add (self, e):
+        self._entities += [e]
+        return len (self._entities) - 1
+
+    #
+    #  _addEntities - create the entities of the pen map.  Each bot name
+    #                 is placed on the next python marine spawn point.
+    #
+
+    def _addEntities (self, botNames):
+        start = self._aas.getPlayerStart ()
+        self._add (entity ("info_player_start", "info_player_start", start))
+        self._add (entity ("player", "player1", start))
+        spawns = []
+        for r in self._map.rooms.values ():
+            for kind, pos in r.monsters:
+                if kind.startswith ("python_doommarine"):
+                    spawns += [[kind, pos]]
+                else:
+                    self._add (entity (kind, kind, pos))
+            for kind, amount, pos in r.ammo:
+                self._add (entity ("ammo_" + kind, "ammo_" + kind, pos))
+            for weapon, pos in r.weapons:
+                self._add (entity ("weapon_" + str (weapon), "weapon_" + str (weapon), pos))
+        for i, name in enumerate (botNames):
+            if spawns == []:
+                kind, pos = "python_doommarine_mp", start
+            else:
+                kind, pos = spawns[i % len (spawns)]
+            self._bots[name] = self._add (entity (kind, kind, pos))
+
+    #
+    #  _makeTags - return the worldspawn tags of the map.
+    #
+
+    def _makeTags (self):
+        high = self._aas._floor.high ()
+        penMax = [high[0], high[1]]
+        tags = {"penmap": os.path.abspath (self._penname),
+                "penminx": "0", "penminy": "0",
+                "penmaxx": str (penMax[0]), "penmaxy": str (penMax[1]),
+                "doomminx": "0", "doomminy": "0",
+                "doommaxx": str (penMax[0] * unitsPerSquare),
+                "doommaxy": str (penMax[1] * unitsPerSquare)}
+        return tags
+
+    #
+    #  botNames - return the names of the bots which may connect.
+    #
+
+    def botNames (self):
+        return list (self._bots.keys ())
+
+    #
+    #  botId - return the entity id of bot, name.
+    #
+
+    def botId (self, name):
+        return self._bots[name]
+
+    #
+    #  getEntity - return entity, i, or None.
+    #
+
+    def getEntity (self, i):
+        if (i >= 1) and (i < len (self._entities)):
+            return self._entities[i]
+        return None
+
+    #
+    #  maxobj - return the number of entities.
+    #
+
+    def maxobj (self):
+        return len (self._entities) - 1
+
+    #
+    #  getTag - return the value of the worldspawn tag, name.
+    #
+
+    def getTag (self, name):
+        return self._tags.get (name, "")
+
+    #
+    #  findEntity - return the id of the first entity whose attribute,
+    #               left, is, right, or 0.
+    #
+
+    def findEntity (self, left, right):
+        for i, e in enumerate (self._entities[1:]):
+            if getattr (e, left, None) == right:
+                return i + 1
+        return 0
+
+    #
+    #  findClassName - return the id of the first entity whose classname
+    #                  contains, name, or 0.
+    #
+
+    def findClassName (self, name):
+        for i, e in enumerate (self._entities[1:]):
+            if name in e.classname:
+                return i + 1
+        return 0
+
+    #
+    #  canSee - return True if entity, j, can be seen from entity, i.
+    #
+
+    def canSee (self, i, j):
+        a = self.getEntity (i)
+        b = self.getEntity (j)
+        if (a == None) or (b == None):
+            return False
+        p = doom2pen (a.pos)
+        q = doom2pen (b.pos)
+        if not self._aas.potentiallyVisible (p, q):
+            return False
+        return not self._aas._rayBlocked (a.pos[0] / unitsPerSquare, a.pos[1] / unitsPerSquare,
+                                          b.pos[0] / unitsPerSquare, b.pos[1] / unitsPerSquare)
+
+    #
+    #  startMove - start entity, i, moving forward, fwd, and right, rgt,
+    #              at velocity, vel, (doom3 units per second) for, dist.
+    #
+
+    def startMove (self, i, fwd, rgt, vel, dist):
+        e = self.getEntity (i)
+        with self._lock:
+            yaw = math.radians (e.yaw)
+            dx = fwd * math.cos (yaw) + rgt * math.sin (yaw)
+            dy = fwd * math.sin (yaw) - rgt * math.cos (yaw)
+            length = math.sqrt (dx * dx + dy * dy)
+            if (length == 0) or (vel == 0) or (dist <= 0):
+                e.move = None
+            else:
+                step = abs (float (vel)) / self._tickRate
+                e.move = [dx / length * step, dy / length * step, float (dist)]
+        return int (dist)
+
+    #
+    #  startTurn - start entity, i, turning to, angle, at, vel, degrees
+    #              per tick (immediately if vel is 0).  It returns the
+    #              previous angle.
+    #
+
+    def startTurn (self, i, angle, vel):
+        e = self.getEntity (i)
+        with self._lock:
+            old = int (e.yaw)
+            if vel == 0:
+                e.yaw = float (angle % 360)
+                e.turn = None
+            else:
+                e.turn = [float (angle % 360), abs (float (vel))]
+        return old
+
+    #
+    #  _stepMove - advance the movement of entity, e, by one tick.
+    #
+
+    def _stepMove (self, e):
+        dx, dy, remaining = e.move
+        step = math.sqrt (dx * dx + dy * dy)
+        if step > remaining:
+            dx *= remaining / step
+            dy *= remaining / step
+            step = remaining
+        new = [e.pos[0] + dx, e.pos[1] + dy, e.pos[2]]
+        p = doom2pen (new)
+        if not self._aas._walkable (p[0], p[1]):
+            e.move = None
+            return
+        e.pos = new
+        remaining -= step
+        if remaining <= 0:
+            e.move = None
+        else:
+            e.move[2] = remaining
+
+    #
+    #  _stepTurn - advance the turn of entity, e, by one tick.
+    #
+
+    def _stepTurn (self, e):
+        target, rate = e.turn
+        diff = (target - e.yaw + 540.0) % 360.0 - 180.0
+        if abs (diff) <= rate:
+            e.yaw = target
+            e.turn = None
+        elif diff > 0:
+            e.yaw = (e.yaw + rate) % 360.0
+        else:
+            e.yaw = (e.yaw - rate) % 360.0
+
+    #
+    #  tick - advance the world by one tick.
+    #
+
+    def tick (self):
+        with self._lock:
+            for e in self._entities[1:]:
+                if e.move != None:
+                    self._stepMove (e)
+                if e.turn != None:
+                    self._stepTurn (e)
+            self._ticks += 1
+
+    #
+    #  catchUp - when running at a speed advance the world by the ticks
+    #            due since it was created.  The ticks are counted from
+    #            the wall clock so the bots selecting at the same time
+    #            do not advance the world any faster.
+    #
+
+    def catchUp (self):
+        if self._speed > 0:
+            with self._lock:
+                due = int ((time.perf_counter () - self._start) * self._tickRate * self._speed)
+                while self._ticks < due:
+                    self.tick ()
+
+    #
+    #  connect - record that bot, i, has an open connection.
+    #
+
+    def connect (self, i):
+        with self._stepped:
+            self._connected.add (i)
+
+    #
+    #  disconnect - record that bot, i, has closed its connection and
+    #               wake the bots waiting for it to select.
+    #
+
+    def disconnect (self, i):
+        with self._stepped:
+            self._connected.discard (i)
+            self._stepped.notify_all ()
+
+    #
+    #  _mayStep - return True if every bot waiting in select has seen
+    #             the current tick and, if everyone is True, every
+    #             connected bot is waiting.
+    #
+
+    def _mayStep (self, everyone):
+        for t in self._waiting.values ():
+            if t != self._ticks:
+                return False
+        if everyone:
+            for i in self._connected:
+                if i not in self._waiting:
+                    return False
+        return True
+
+    #
+    #  _finished - return the bit of the move or turn activity, mask, of
+    #              entity, e, which has finished or None.
+    #
+
+    def _finished (self, e, mask):
+        for b in [moveBit, turnBit]:
+            if (mask & b) and not (e.busy () & b):
+                return b
+        return None
+
+    #
+    #  select - advance the world until one of the activities, mask, of
+    #           entity, i, has finished.  It returns the finished bit.
+    #           Without a speed the bots step the world together: a
+    #           tick is made once every connected bot is waiting in
+    #           select and has seen the last tick, so the world advances
+    #           once per step however many bots are connected.  A bot
+    #           which does not select within stepWait is not waited for.
+    #
+
+    def select (self, i, mask):
+        e = self.getEntity (i)
+        self.catchUp ()
+        for b in [fireBit, reloadBit, moveBit, turnBit]:
+            if (mask & b) and not (e.busy () & b):
+                return b
+        if self._speed > 0:
+            while True:
+                time.sleep (1.0 / (self._tickRate * self._speed))
+                self.catchUp ()
+                b = self._finished (e, mask)
+                if b != None:
+                    return b
+        with self._stepped:
+            try:
+                while True:
+                    self._waiting[i] = self._ticks
+                    b = self._finished (e, mask)
+                    if b != None:
+                        return b
+                    if self._mayStep (True):
+                        self.tick ()
+                        self._stepped.notify_all ()
+                    elif not self._stepped.wait (stepWait):
+                        if self._mayStep (False):
+                            self.tick ()
+                            self._stepped.notify_all ()
+            finally:
+                del self._waiting[i]
+                self._stepped.notify_all ()
+
+    #
+    #  getTicks - return the number of ticks simulated.
+    #
+
+    def getTicks (self):
+        return self._ticks
+
+
+#
+#  botHandler - serve the requests of one bot connection.
+#
+
+class botHandler (socketserver.StreamRequestHandler):
+    def handle (self):
+        w = self.server.world
+        me = self.server.botId
+        w.connect (me)
+        try:
+            for line in self.rfile:
+                words = line.decode ('utf-8').split ()
+                if words != []:
+                    w.catchUp ()
+                    reply = self.server.dispatch (w, me, words)
+                    self.wfile.write ((str (reply) + "\n").encode ('utf-8'))
+                    self.wfile.flush ()
+        finally:
+            w.disconnect (me)
+
+
+#
+#  superHandler - answer a superserver request.  "super" is answered
+#                 with the superserver port and a bot name with the
+#                 port of its bot server (or 0 if it is unknown).
+#
+
+class superHandler (socketserver.StreamRequestHandler):
+    def handle (self):
+        line = self.rfile.readline ().decode ('utf-8').strip ()
+        if line == "super":
+            reply = self.server.server_address[1]
+        else:
+            reply = self.server.ports.get (line, 0)
+        self.wfile.write (("%d\n" % reply).encode ('utf-8'))
+        self.wfile.flush ()
+
+
+class threadedServer (socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+#
+#  vector - return the doom3 coordinate, v, as protocol text.
+#
+
+def vector (v):
+    return "%d %d %d" % (int (v[0]), int (v[1]), int (v[2]))
+
+
+#
+#  dispatch - return the reply to the request, words, from bot, me.
+#
+
+def dispatch (w, me, words):
+    cmd = words[0]
+    args = words[1:]
+    e = w.getEntity (me)
+    if cmd == "self":
+        return me
+    elif cmd == "getpos":
+        o = w.getEntity (int (args[0]))
+        if o == None:
+            return "0 0 0"
+        return "%f %f %f" % (o.pos[0], o.pos[1], o.pos[2])
+    elif cmd == "get_entity_pos":
+        o = w.getEntity (int (args[0]))
+        if o == None:
+            return "0 0 0"
+        return vector (o.spawn)
+    elif cmd == "get_entity_name":
+        o = w.getEntity (int (args[0]))
+        if o == None:
+            return ""
+        return o.name
+    elif cmd == "objectname":
+        o = w.getEntity (int (args[0]))
+        if o == None:
+            return ""
+        return o.classname
+    elif cmd == "health":
+        return e.health
+    elif cmd == "angle":
+        return int (e.yaw)
+    elif cmd == "maxobj":
+        return w.maxobj ()
+    elif cmd == "forward":
+        return w.startMove (me, 1, 0, int (args[0]), int (args[1]))
+    elif cmd == "right":
+        return w.startMove (me, 0, 1, int (args[0]), int (args[1]))
+    elif cmd == "step_up":
+        return w.startMove (me, 1, 0, int (args[0]), int (args[1]))
+    elif cmd == "stepvec":
+        return w.startMove (me, int (args[0]), int (args[1]),
+                            math.sqrt (int (args[0]) ** 2 + int (args[1]) ** 2), int (args[2]))
+    elif cmd == "turn":
+        return w.startTurn (me, int (args[0]), int (args[1]))
+    elif cmd == "select":
+        if args == ["any"]:
+            return w.select (me, moveBit | fireBit | turnBit | reloadBit)
+        return w.select (me, int (args[0]))
+    elif cmd == "start_firing":
+        e.firing = True
+        e.ammo = max (0, e.ammo - 1)
+        return e.ammo
+    elif cmd == "stop_firing":
+        e.firing = False
+        return e.ammo
+    elif cmd == "reload_weapon":
+        e.ammo = defaultAmmo
+        return e.ammo
+    elif cmd == "change_weapon":
+        e.weapon = int (args[0])
+        return e.ammo
+    elif cmd == "ammo":
+        return e.ammo
+    elif cmd == "aim":
+        if w.canSee (me, int (args[0])):
+            return "true"
+        return "false"
+    elif cmd == "tag":
+        if args[0] == "bulk_startup":
+            return str (bulkStartup).lower ()
+        return w.getTag (args[0])
+    elif (cmd == "get_startup") and bulkStartup:
+        start = w.getEntity (w.findEntity ("classname", "info_player_start"))
+        values = [str (me), e.name, vector (e.spawn), vector (start.spawn)]
+        for name in args:
+            values += [w.getTag (name)]
+        return "\t".join (values)
+    elif cmd == "get_class_name_entity":
+        return w.findClassName (args[0])
+    elif cmd == "get_pair_name_entity":
+        return w.findEntity (args[0], args[1])
+    elif cmd == "can_see_entity":
+        if w.canSee (me, int (args[0])):
+            return 1
+        return 0
+    elif cmd == "map_to_runtime_entity":
+        return int (args[0])
+    log.warning ("unknown request: %s", " ".join (words))
+    return 0
+
+
+#
+#  server - the superserver and one bot server per bot, all sharing a
+#           simulated world.
+#
+
+class server:
+    def __init__ (self, penname, botNames, port = defaultPort, tickRate = defaultTickRate, speed = 0, host = "localhost"):
+        self._world = world (penname, botNames, tickRate, speed)
+        self._servers = []
+        ports = {}
+        for i, name in enumerate (botNames):
+            s = threadedServer ((host, port + botPortOffset + i), botHandler)
+            s.world = self._world
+            s.botId = self._world.botId (name)
+            s.dispatch = dispatch
+            self._servers += [s]
+            ports[name] = s.server_address[1]
+        s = threadedServer ((host, port), superHandler)
+        s.ports = ports
+        self._servers += [s]
+
+    #
+    #  getWorld - return the simulated world.
+    #
+
+    def getWorld (self):
+        return self._world
+
+    #
+    #  start - serve requests in background threads.
+    #
+
+    def start (self):
+        for s in self._servers:
+            t = threading.Thread (target=s.serve_forever)
+            t.daemon = True
+            t.start ()
+
+    #
+    #  stop - stop serving requests.
+    #
+
+    def stop (self):
+        for s in self._servers:
+            s.shutdown ()
+            s.server_close ()
+
+
+def usage (code):
+    print ("Usage: botsim [-h] [-b bots] [-p port] [-s speed] [-t tickrate] penfile")
+    print ("  -b bots       number of python_doommarine bots to serve (default 1)")
+    print ("  -h            help")
+    print ("  -p port       superserver port (default %d)" % defaultPort)
+    print ("  -s speed      run at speed times real time (default 0, as fast as possible)")
+    print ("  -t tickrate   ticks per simulated second (default %d)" % defaultTickRate)
+    sys.exit (code)
+
+
+def main ():
+    bots, port, speed, tickRate = 1, defaultPort, 0, defaultTickRate
+    try:
+        optlist, l = getopt.getopt (sys.argv[1:], ':b:hp:s:t:')
+        for opt in optlist:
+            if opt[0] == '-b':
+                bots = int (opt[1])
+            elif opt[0] == '-h':
+                usage (0)
+            elif opt[0] == '-p':
+                port = int (opt[1])
+            elif opt[0] == '-s':
+                speed = float (opt[1])
+            elif opt[0] == '-t':
+                tickRate = int (opt[1])
+    except getopt.GetoptError:
+        usage (1)
+    if len (l) != 1:
+        usage (1)
+    names = []
+    for i in range (bots):
+        names += ["python_doommarine %d" % (i + 1)]
+    s = server (l[0], names, port, tickRate, speed)
+    s.start ()
+    print ("botsim serving", ", ".join (names), "on superserver port", port)
+    try:
+        while True:
+            time.sleep (1)
+    except KeyboardInterrupt:
+        s.stop ()
+
+
+if __name__ == "__main__":
+    main ()
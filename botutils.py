@@ -22,8 +22,24 @@
 # Author Gaius Mulley <gaius.mulley@southwales.ac.uk>
 #
 
+import logging
+import sys
+
 pending = ""
 
+#
+#  log levels used by the bot layers.  TRACE is below DEBUG and is used
+#  for per square route detail and whole floor plans.
+#
+
+TRACE = 5
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+
+logging.addLevelName (TRACE, "TRACE")
+logging.getLogger ("chisel").setLevel (WARNING)
+
 #
 #  printf - keeps C programmers happy :-)
 #
@@ -38,3 +54,31 @@ def printf (format, *args):
         print (str (format) % args, end=' ')
     except BlockingIOError:
         pending += str (format) % args
+
+
+#
+#  getLog - return the logger for the bot layer, name.  Messages use
+#           lazy % formatting, log.debug ("at %s", pos), so nothing
+#           is formatted unless the level is enabled.  Only warnings
+#           are shown until setLogLevel is called.
+#
+
+def getLog (name):
+    return logging.getLogger ("chisel." + name)
+
+
+#
+#  setLogLevel - show the messages at or above, level, of the bot layer,
+#                name, (or all layers if name is None) on stderr.
+#
+
+def setLogLevel (level, name = None):
+    root = logging.getLogger ("chisel")
+    if root.handlers == []:
+        handler = logging.StreamHandler (sys.stderr)
+        handler.setFormatter (logging.Formatter ("%(name)s:%(levelname)s: %(message)s"))
+        root.addHandler (handler)
+    if name == None:
+        root.setLevel (level)
+    else:
+        getLog (name).setLevel (level)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2020
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  chgrid - compact two dimensional grids held in a single typed array.
+#
+#  The grids provide the get, set, inRange and high methods of array2d.
+#  A grid grows when a square beyond its current size is set and high
+#  returns the size [width, height].  Squares outside the grid read as
+#  the initial value.  numberGrid holds small unsigned integers (one
+#  byte per square by default) and glyphGrid holds single characters.
+#
+
+from array import array
+
+
+class numberGrid:
+    def __init__ (self, width, height, value = 0, typecode = 'B'):
+        self._value = value
+        self._typecode = typecode
+        self._width = width
+        self._height = height
+        self._stride = max (width, 1)
+        self._rows = max (height, 1)
+        self._data = array (typecode, [value]) * (self._stride * self._rows)
+
+    #
+    #  _grow - enlarge the storage so that square x, y can be held.
+    #          The storage at least doubles so that drawing a map
+    #          square by square only copies the grid a few times.
+    #
+
+    def _grow (self, x, y):
+        stride = self._stride
+        rows = self._rows
+        if x >= stride:
+            stride = max (x + 1, stride * 2)
+        if y >= rows:
+            rows = max (y + 1, rows * 2)
+        data = array (self._typecode, [self._value]) * (stride * rows)
+        for j in range (self._rows):
+            data[j * stride:j * stride + self._stride] = self._data[j * self._stride:(j + 1) * self._stride]
+        self._data = data
+        self._stride = stride
+        self._rows = rows
+
+    #
+    #  set - assign value, v, to square x, y.
+    #
+
+    def set (self, x, y, v):
+        if (x < 0) or (y < 0):
+            raise IndexError ("grid square %d, %d is negative" % (x, y))
+        if (x >= self._stride) or (y >= self._rows):
+            self._grow (x, y)
+        self._width = max (self._width, x + 1)
+        self._height = max (self._height, y + 1)
+        self._data[y * self._stride + x] = v
+
+    #
+    #  get - return the value of square x, y.
+    #
+
+    def get (self, x, y):
+        if (x >= 0) and (y >= 0) and (x < self._stride) and (y < self._rows):
+            return self._data[y * self._stride + x]
+        return self._value
+
+    #
+    #  inRange - return True if square x, y lies within the grid.
+    #
+
+    def inRange (self, x, y):
+        return (x >= 0) and (y >= 0) and (x < self._width) and (y < self._height)
+
+    #
+    #  high - return the size of the grid [width, height].
+    #
+
+    def high (self):
+        return [self._width, self._height]
+
+    #
+    #  row - return the values of row, y, as a memoryview of the
+    #        underlying array.  It is invalidated if the grid grows.
+    #
+
+    def row (self, y):
+        return memoryview (self._data)[y * self._stride:y * self._stride + self._width]
+
+
+class glyphGrid (numberGrid):
+    def __init__ (self, width, height, value = ' '):
+        numberGrid.__init__ (self, width, height, ord (value), 'B')
+
+    def set (self, x, y, v):
+        numberGrid.set (self, x, y, ord (v))
+
+    def get (self, x, y):
+        return chr (numberGrid.get (self, x, y))
+
+    #
+    #  rowText - return row, y, as a string.
+    #
+
+    def rowText (self, y):
+        return self.row (y).tobytes ().decode ('latin-1')
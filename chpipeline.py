@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2020
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  chpipeline - run the txt -> pen -> map -> aas tool chain in one
+#               process.  The ascii map is parsed once into a
+#               chroom.penMap which is handed directly to pen2map and
+#               to the bot area awareness.  The pen file is only
+#               written if it is asked for.
+#
+
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+from botaa import aas
+from chpvs import savePvs, pvsName
+
+tooldir = os.path.dirname (os.path.abspath (__file__))
+
+
+#
+#  loadTool - load a fresh copy of the tool, name, (txt2pen or pen2map).
+#             The tools keep their state in module globals so each map
+#             is given its own copy.  The copy is entered into sys.modules
+#             so that the pen2map worker processes can find it.
+#
+
+def loadTool (name):
+    filename = os.path.join (tooldir, name + ".py.txt")
+    loader = importlib.machinery.SourceFileLoader (name, filename)
+    spec = importlib.util.spec_from_loader (name, loader)
+    module = importlib.util.module_from_spec (spec)
+    sys.modules[name] = module
+    loader.exec_module (module)
+    return module
+
+
+#
+#  txt2model - parse the ascii map, txtname, and return its map model
+#              (a chroom.penMap) or None if the map has no rooms.
+#              args is a list of txt2pen command line options.
+#
+
+def txt2model (txtname, args = None):
+    if args == None:
+        args = []
+    t = loadTool ("txt2pen")
+    t.handleOptions (args + [txtname])
+    t.inputFile = txtname
+    with open (txtname, 'r') as i:
+        return t.buildModel (i.readlines ())
+
+
+#
+#  writePen - write the map model, m, to the pen file, penname.
+#
+
+def writePen (m, penname):
+    with open (penname, 'w') as o:
+        m.write (o)
+
+
+#
+#  model2map - generate the doom3 map file, mapname, from the map model, m.
+#              penname is the name recorded in the map file and args is
+#              a list of pen2map command line options.  The room
+#              visibility table is written beside the map file.
+#
+
+def model2map (m, penname, mapname, args = None):
+    if args == None:
+        args = []
+    p = loadTool ("pen2map")
+    p.handleOptions (args + [penname])
+    p.checkRegression ()
+    p.inputFile = penname
+    with open (mapname, 'w') as o:
+        p.processModel (m, o)
+    if not p.toTxt:
+        savePvs (m, pvsName (mapname))
+
+
+#
+#  model2aas - return the area awareness of the map model, m.
+#
+
+def model2aas (m, penname):
+    return aas (penname, m)
+
+
+#
+#  build - convert the ascii map, txtname, into the doom3 map, mapname.
+#          The pen file is only written if penname is given.  It returns
+#          the map model which can be given to model2aas.
+#
+
+def build (txtname, mapname, penname = None, txtArgs = None, mapArgs = None):
+    m = txt2model (txtname, txtArgs)
+    if m == None:
+        return None
+    if penname == None:
+        name = os.path.splitext (txtname)[0] + ".pen"
+    else:
+        name = penname
+        writePen (m, penname)
+    model2map (m, name, mapname, mapArgs)
+    return m
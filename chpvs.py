@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2020
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  chpvs - the potentially visible set (PVS) of the rooms in a pen map.
+#
+#  Room a can potentially see room b if some line from room a reaches
+#  room b without crossing a wall.  The set is computed from the 2D
+#  walls and doors of a chroom.penMap and errs on the side of
+#  visibility: every door is treated as open, the walls inside a room
+#  are ignored and a chain of doors is visible if a single straight
+#  line passes through the whole opening of every door of the chain.
+#  A room which is not in the set of another cannot be seen from it.
+#
+#  The set is written next to the map file as:
+#
+#  ROOM 1 SEES 1 2 3
+#  ROOM 2 SEES 1 2
+#  END.
+#
+
+import os
+
+
+#
+#  lineSquares - return the list of squares on the line between, a, and, b.
+#
+
+def lineSquares (a, b):
+    l = []
+    if a[0] == b[0]:
+        for y in range (min (a[1], b[1]), max (a[1], b[1])+1):
+            l += [(a[0], y)]
+    else:
+        for x in range (min (a[0], b[0]), max (a[0], b[0])+1):
+            l += [(x, a[1])]
+    return l
+
+
+#
+#  doorSquares - return the list of squares covered by the door line, d.
+#
+
+def doorSquares (d):
+    return lineSquares (d[0], d[1])
+
+
+#
+#  doorKey - return a key for the door line, d, which is the same for
+#            both rooms which share the doorway.
+#
+
+def doorKey (d):
+    a = (d[0][0], d[0][1])
+    b = (d[1][0], d[1][1])
+    return (min (a, b), max (a, b))
+
+
+#
+#  floorPlan - return a dictionary mapping every floor square of the
+#              map, m, onto its room number (a string).  Each room is
+#              flooded from its inside position and the walls, which
+#              include the doors, bound the flood.
+#
+
+def floorPlan (m):
+    walls = set ()
+    for r in m.rooms.values ():
+        for w in r.walls:
+            walls.update (lineSquares (w[0], w[1]))
+    plan = {}
+    for n, r in m.rooms.items ():
+        if r.inside != None:
+            todo = [(r.inside[0], r.inside[1])]
+            while todo != []:
+                p = todo.pop ()
+                if (p not in walls) and (p not in plan):
+                    plan[p] = n
+                    todo += [(p[0]-1, p[1]), (p[0]+1, p[1]),
+                             (p[0], p[1]-1), (p[0], p[1]+1)]
+    return plan
+
+
+#
+#  doorPortal - return the opening of the door line, d, as seen by a
+#               viewer leaving room, r, as the pair of points [left,
+#               right] on the left and on the right of the direction
+#               of travel.  The opening runs through the middle of the
+#               door squares, which any line passing through the door
+#               squares must cross.  None is returned if the side of
+#               the door on which room, r, lies is not known.
+#
+
+def doorPortal (plan, d, r):
+    squares = doorSquares (d)
+    xs = [p[0] for p in squares]
+    ys = [p[1] for p in squares]
+    x0, x1 = min (xs), max (xs) + 1
+    y0, y1 = min (ys), max (ys) + 1
+    for x, y in squares:
+        if plan.get ((x-1, y)) == r:
+            return [(x0 + 0.5, y1), (x0 + 0.5, y0)]
+        if plan.get ((x+1, y)) == r:
+            return [(x0 + 0.5, y0), (x0 + 0.5, y1)]
+        if plan.get ((x, y-1)) == r:
+            return [(x0, y0 + 0.5), (x1, y0 + 0.5)]
+        if plan.get ((x, y+1)) == r:
+            return [(x1, y0 + 0.5), (x0, y0 + 0.5)]
+    return None
+
+
+#
+#  cross - return the cross product of the vectors a->b and a->c.
+#
+
+def cross (a, b, c):
+    return (b[0]-a[0]) * (c[1]-a[1]) - (b[1]-a[1]) * (c[0]-a[0])
+
+
+#
+#  stabbed - return True if a single directed line passes through every
+#            portal in the list, portals, (as given by doorPortal).
+#            Such a line has every left point on its left and every
+#            right point on its right.  If one exists then one also
+#            exists through two of the points so only those are tried.
+#
+
+def stabbed (portals):
+    if len (portals) < 2:
+        return True
+    left = [p[0] for p in portals]
+    right = [p[1] for p in portals]
+    points = left + right
+    for a in points:
+        for b in points:
+            if a != b:
+                ok = True
+                for p in left:
+                    if cross (a, b, p) < -1e-9:
+                        ok = False
+                        break
+                if ok:
+                    for p in right:
+                        if cross (a, b, p) > 1e-9:
+                            ok = False
+                            break
+                if ok:
+                    return True
+    return False
+
+
+#
+#  visibleFrom - return the set of rooms which room, n, of map, m, can
+#                potentially see.  Each door of room, n, is followed
+#                through the rooms beyond it for as long as a single
+#                line can pass through every door on the way.
+#
+
+def visibleFrom (m, plan, n):
+    seen = set ([n])
+    for first, status, leadsTo in m.rooms[n].doors:
+        t = str (leadsTo)
+        if t in m.rooms:
+            seen.add (t)
+            portals = []
+            p = doorPortal (plan, first, n)
+            if p != None:
+                portals += [p]
+            todo = [(t, [doorKey (first)], portals)]
+            while todo != []:
+                r, doors, portals = todo.pop ()
+                for d, s, l in m.rooms[r].doors:
+                    k = doorKey (d)
+                    t = str (l)
+                    if (k not in doors) and (t in m.rooms):
+                        p = doorPortal (plan, d, r)
+                        if p == None:
+                            chain = portals
+                        else:
+                            chain = portals + [p]
+                        if stabbed (chain):
+                            seen.add (t)
+                            todo += [(t, doors + [k], chain)]
+    return seen
+
+
+#
+#  computePvs - return a dictionary mapping each room number of map, m,
+#               onto the sorted list of room numbers it can potentially see.
+#
+
+def computePvs (m):
+    plan = floorPlan (m)
+    pvs = {}
+    for n in m.rooms.keys ():
+        pvs[n] = sorted (visibleFrom (m, plan, n), key=int)
+    return pvs
+
+
+#
+#  pvsName - return the name of the pvs file which accompanies, mapname.
+#
+
+def pvsName (mapname):
+    return os.path.splitext (mapname)[0] + ".pvs"
+
+
+#
+#  writePvs - write the potentially visible set, pvs, to, o.
+#
+
+def writePvs (pvs, o):
+    for n in sorted (pvs.keys (), key=int):
+        o.write ("ROOM " + n + " SEES " + " ".join (pvs[n]) + "\n")
+    o.write ("END.\n")
+    return o
+
+
+#
+#  savePvs - compute the potentially visible set of map, m, and write it
+#            to the file, filename.
+#
+
+def savePvs (m, filename):
+    with open (filename, 'w') as o:
+        writePvs (computePvs (m), o)
+
+
+#
+#  loadPvs - return the potentially visible set held in the file,
+#            filename, or None if the file does not exist.
+#
+
+def loadPvs (filename):
+    if not os.path.isfile (filename):
+        return None
+    pvs = {}
+    with open (filename, 'r') as i:
+        for l in i.readlines ():
+            w = l.split ()
+            if (len (w) >= 3) and (w[0] == "ROOM") and (w[2] == "SEES"):
+                pvs[w[1]] = w[3:]
+    return pvs
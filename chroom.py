@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2020
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  chroom - the in memory room model of a pen map and the pen parser.
+#
+#  All coordinates are integer pen coordinates.  txt2pen builds this
+#  model and writes it out as a pen file, pen2map and botaa either
+#  load it directly or obtain it by parsing the pen file with parsePen.
+#  A penMap holds no global state so many maps can coexist in one
+#  process.
+#
+
+import sys
+
+
+#
+#  writeCoord - write the pen coordinate, c, to, o.
+#
+
+def writeCoord (c, o):
+    o.write (str (c[0]) + " " + str (c[1]))
+    return o
+
+
+class room:
+    __slots__ = ('roomNo', 'walls', 'doors', 'monsters', 'ammo', 'weapons',
+                 'lights', 'worldspawn', 'inside', 'defaultColours',
+                 'defaultTextures', 'sounds', 'labels')
+
+    def __init__ (self, n):
+        self.roomNo = n
+        self.walls = []           #  [[x0, y0], [x1, y1]]
+        self.doors = []           #  [[[x0, y0], [x1, y1]], status, leadsTo]
+        self.monsters = []        #  [kind, pos]
+        self.ammo = []            #  [kind, amount, pos]
+        self.weapons = []         #  [weapon, pos]
+        self.lights = []          #  [pos, colour or None, on or None]
+        self.worldspawn = []      #  [pos]
+        self.inside = None
+        self.defaultColours = {}  #  'FLOOR', 'MID' or 'CEILING' : [r, g, b]
+        self.defaultTextures = {} #  'FLOOR', 'WALL' or 'CEILING' : texture
+        self.sounds = []          #  [pos, filename, volume, looping, wait]
+        self.labels = []          #  [pos, label]
+
+    #
+    #  write - write this room in pen format to, o.
+    #
+
+    def write (self, o):
+        o.write ("ROOM " + str (self.roomNo) + "\n")
+        for k in self.defaultColours:
+            c = self.defaultColours[k]
+            o.write ("   DEFAULT COLOUR %s %d %d %d\n" % (k, c[0], c[1], c[2]))
+        for k in self.defaultTextures:
+            o.write ("   DEFAULT TEXTURE %s %s\n" % (k, self.defaultTextures[k]))
+        o.write ("   WALL\n")
+        for w in self.walls:
+            o.write ("   ")
+            for c in w:
+                o.write ("  ")
+                writeCoord (c, o)
+            o.write ("\n")
+        for line, status, leadsTo in self.doors:
+            o.write ("   DOOR ")
+            for c in line:
+                writeCoord (c, o)
+                o.write (" ")
+            o.write ("STATUS " + status + " LEADS TO " + str (leadsTo) + "\n")
+        for kind, pos in self.monsters:
+            o.write ("   MONSTER " + kind + " AT ")
+            writeCoord (pos, o)
+            o.write ("\n")
+        for kind, amount, pos in self.ammo:
+            o.write ("   AMMO " + kind + " AMOUNT " + str (amount) + " AT ")
+            writeCoord (pos, o)
+            o.write ("\n")
+        for weapon, pos in self.weapons:
+            o.write ("   WEAPON " + str (weapon) + " AT ")
+            writeCoord (pos, o)
+            o.write ("\n")
+        for pos, colour, on in self.lights:
+            o.write ("   LIGHT AT ")
+            writeCoord (pos, o)
+            if colour != None:
+                o.write (" COLOUR %d %d %d" % (colour[0], colour[1], colour[2]))
+            if on != None:
+                o.write (" ON " + on)
+            o.write ("\n")
+        for pos in self.worldspawn:
+            o.write ("   SPAWN PLAYER AT ")
+            writeCoord (pos, o)
+            o.write ("\n")
+        if self.inside != None:
+            o.write ("   INSIDE AT ")
+            writeCoord (self.inside, o)
+            o.write ("\n")
+        for pos, filename, volume, looping, wait in self.sounds:
+            o.write ("   SOUND AT ")
+            writeCoord (pos, o)
+            o.write (" %s " % filename)
+            if volume != None:
+                o.write ("VOLUME %d " % volume)
+            if looping:
+                o.write ("LOOPING ")
+            if wait != None:
+                o.write ("WAIT %d " % wait)
+            o.write ("\n")
+        for pos, label in self.labels:
+            o.write ("   LABEL AT ")
+            writeCoord (pos, o)
+            o.write (" %s\n" % label)
+        o.write ("END\n\n")
+        return o
+
+
+class penMap:
+    __slots__ = ('rooms',)
+
+    def __init__ (self):
+        self.rooms = {}           #  room number (string) : room
+
+    #
+    #  addRoom - add and return a new room, n.
+    #
+
+    def addRoom (self, n):
+        r = room (n)
+        self.rooms[str (n)] = r
+        return r
+
+    #
+    #  write - write the whole map in pen format to, o.
+    #
+
+    def write (self, o):
+        for r in self.rooms.values ():
+            r.write (o)
+        o.write ("END.\n")
+        return o
+
+
+#
+#  penParser - a recursive descent parser for the pen file format.
+#              The tokens are read one at a time from the tokenStream
+#              generator and only the current token and its line
+#              number are held.
+#
+
+class penParser:
+    def __init__ (self, filename, error = None):
+        self._filename = filename
+        self._error = error
+        self._tokens = None
+        self._token = '<eof>'
+        self._lineNo = 0
+        self._map = None
+        self._curRoom = None
+        self._curInteger = None
+        self._curPos = None
+        self._curCol = None
+        self._curStatus = None
+
+    #
+    #  tokenStream - yield each token of the pen file, i, together with
+    #                its line number.  <eof> is yielded forever at the end.
+    #
+
+    def tokenStream (self, i):
+        lineNo = 0
+        for lineNo, l in enumerate (i, 1):
+            for w in l.split ():
+                yield w, lineNo
+        while True:
+            yield '<eof>', lineNo
+
+    #
+    #  lexicalPen - start reading tokens from the pen file, i.  Only the
+    #               next token is held so the file is read as it is parsed.
+    #
+
+    def lexicalPen (self, i):
+        self._tokens = self.tokenStream (i)
+        self._token, self._lineNo = next (self._tokens)
+
+    #
+    #  errorLine - report an error at the line of the current token.
+    #              The error function is called if one was supplied
+    #              otherwise the error is written to stderr in GNU format.
+    #
+
+    def errorLine (self, text):
+        lineNo = self._lineNo
+        if self._error == None:
+            sys.stderr.write ("%s:%d:%s\n" % (self._filename, lineNo, text))
+        else:
+            self._error (lineNo, text)
+
+    #
+    #  get - consume and return the next token.
+    #
+
+    def get (self):
+        t = self._token
+        self._token, self._lineNo = next (self._tokens)
+        return t
+
+    #
+    #  peek - return the next token without consuming it.
+    #
+
+    def peek (self):
+        return self._token
+
+    #
+    #  expect - expect a token, t.
+    #
+
+    def expect (self, t):
+        g = self.get ()
+        if g != t:
+            self.errorLine ('expecting ' + t + ' and seen ' + g)
+
+    #
+    #  expecting - return True if the next token is one of, l.
+    #
+
+    def expecting (self, l):
+        return self.peek () in l
+
+    #
+    #  integer - if the next token is an integer then
+    #               consume it and save it into _curInteger
+    #               return True
+    #            else:
+    #               return False
+    #
+
+    def integer (self):
+        i = self.peek ()
+        if i.isdigit () or ((i[0] == '-') and i[1:].isdigit ()):
+            self._curInteger = int (self.get ())
+            return True
+        return False
+
+    #
+    #  lineCoords - return True if four integers were seen.
+    #               They are saved as a line in _curPos.
+    #
+
+    def lineCoords (self, kind):
+        if self.integer ():
+            x0 = self._curInteger
+            if self.integer ():
+                y0 = self._curInteger
+                if self.integer ():
+                    x1 = self._curInteger
+                    if self.integer ():
+                        self._curPos = [[x0, y0], [x1, self._curInteger]]
+                        return True
+                    else:
+                        self.errorLine ('expecting fourth integer for a ' + kind)
+                else:
+                    self.errorLine ('expecting third integer for a ' + kind)
+            else:
+                self.errorLine ('expecting second integer for a ' + kind)
+        return False
+
+    #
+    #  wallDesc := 'WALL' wallCoords { wallCoords } =:
+    #
+
+    def wallDesc (self):
+        self.expect ('WALL')
+        while self.lineCoords ('wall'):
+            self._curRoom.walls += [self._curPos]
+
+    #
+    #  status := "STATUS" ( 'OPEN' | 'CLOSED' | 'SECRET' ) =:
+    #
+
+    def status (self):
+        self.expect ('STATUS')
+        if self.expecting (['OPEN', 'CLOSED', 'SECRET']):
+            self._curStatus = self.get ()
+            return True
+        self.errorLine ('expecting OPEN, CLOSED or SECRET after STATUS')
+        return False
+
+    #
+    #  doorDesc := "DOOR" doorCoords { doorCoords } =:
+    #  doorCoords := integer integer integer integer status "LEADS" "TO" integer =:
+    #
+
+    def doorDesc (self):
+        self.expect ('DOOR')
+        while self.lineCoords ('door'):
+            line = self._curPos
+            if self.status ():
+                self.expect ("LEADS")
+                self.expect ("TO")
+                if self.integer ():
+                    self._curRoom.doors += [[line, self._curStatus, self._curInteger]]
+                else:
+                    self.errorLine ('expecting a room number after LEADS TO')
+
+    #
+    #  posDesc := integer integer =:
+    #
+
+    def posDesc (self):
+        if self.integer ():
+            x = self._curInteger
+            if self.integer ():
+                self._curPos = [x, self._curInteger]
+                return True
+            else:
+                self.errorLine ('expecting second integer in the position pair')
+        return False
+
+    #
+    #  ammoDesc := "AMMO" string "AMOUNT" integer "AT" posDesc =:
+    #
+
+    def ammoDesc (self):
+        self.expect ('AMMO')
+        ammoType = self.get ()
+        self.expect ('AMOUNT')
+        if self.integer ():
+            ammoAmount = self._curInteger
+            self.expect ('AT')
+            if self.posDesc ():
+                self._curRoom.ammo += [[ammoType, ammoAmount, self._curPos]]
+            else:
+                self.errorLine ('expecting a position for the ammo')
+        else:
+            self.errorLine ('expecting an amount of ammo')
+
+    #
+    #  colDesc := integer integer integer =:
+    #
+
+    def colDesc (self):
+        self._curCol = []
+        if self.integer ():
+            self._curCol += [self._curInteger]
+            if self.integer ():
+                self._curCol += [self._curInteger]
+                if self.integer ():
+                    self._curCol += [self._curInteger]
+                    return True
+                else:
+                    self.errorLine ('expecting blue colour component')
+            else:
+                self.errorLine ('expecting green colour component')
+        else:
+            self.errorLine ('expecting red colour component')
+        return False
+
+    #
+    #  lightDesc := 'LIGHT' 'AT' posDesc [ 'COLOUR' colDesc ] [ 'ON' string ] =:
+    #
+
+    def lightDesc (self):
+        self.expect ('LIGHT')
+        self.expect ('AT')
+        if self.posDesc ():
+            pos = self._curPos
+            colour = None
+            on = None
+            if self.expecting (['COLOUR']):
+                self.expect ('COLOUR')
+                if self.colDesc ():
+                    colour = self._curCol
+            if self.expecting (['ON']):
+                self.expect ('ON')
+                on = self.get ()
+            self._curRoom.lights += [[pos, colour, on]]
+        else:
+            self.errorLine ('expecting a position for a light')
+
+    #
+    #  insideDesc := 'INSIDE' 'AT' posDesc =:
+    #
+
+    def insideDesc (self):
+        self.expect ('INSIDE')
+        self.expect ('AT')
+        if self.posDesc ():
+            self._curRoom.inside = self._curPos
+        else:
+            self.errorLine ('expecting a position for an inside declaration')
+
+    #
+    #  weaponDesc := 'WEAPON' integer 'AT' posDesc =:
+    #
+
+    def weaponDesc (self):
+        self.expect ('WEAPON')
+        if self.integer ():
+            weapon = self._curInteger
+            self.expect ('AT')
+            if self.posDesc ():
+                self._curRoom.weapons += [[weapon, self._curPos]]
+            else:
+                self.errorLine ('expecting a position for a weapon')
+        else:
+            self.errorLine ('expecting a weapon number')
+
+    #
+    #  labelDesc := 'LABEL' 'AT' posDesc string =:
+    #
+
+    def labelDesc (self):
+        self.expect ('LABEL')
+        self.expect ('AT')
+        if self.posDesc ():
+            pos = self._curPos
+            self._curRoom.labels += [[pos, self.get ()]]
+        else:
+            self.errorLine ('expecting a position for a label')
+
+    #
+    #  monsterDesc := 'MONSTER' string 'AT' posDesc =:
+    #
+
+    def monsterDesc (self):
+        self.expect ('MONSTER')
+        monType = self.get ()
+        self.expect ('AT')
+        if self.posDesc ():
+            self._curRoom.monsters += [[monType, self._curPos]]
+        else:
+            self.errorLine ('expecting a position for a monster')
+
+    #
+    #  spawnDesc := "SPAWN" "PLAYER" "AT" posDesc =:
+    #
+
+    def spawnDesc (self):
+        self.expect ('SPAWN')
+        self.expect ('PLAYER')
+        self.expect ('AT')
+        if self.posDesc ():
+            self._curRoom.worldspawn += [self._curPos]
+        else:
+            self.errorLine ('expecting a position for a player spawn')
+
+    #
+    #  defaultDesc := "DEFAULT" ( "COLOUR" ( "FLOOR" | "MID" | "CEILING" ) colDesc |
+    #                             "TEXTURE" ( "FLOOR" | "WALL" | "CEILING" ) string ) =:
+    #
+
+    def defaultDesc (self):
+        self.expect ('DEFAULT')
+        if self.expecting (['COLOUR']):
+            self.expect ('COLOUR')
+            if self.expecting (['FLOOR', 'MID', 'CEILING']):
+                k = self.get ()
+                if self.colDesc ():
+                    self._curRoom.defaultColours[k] = self._curCol
+            else:
+                self.errorLine ("expecting FLOOR, MID or CEILING after DEFAULT COLOUR")
+        elif self.expecting (['TEXTURE']):
+            self.expect ('TEXTURE')
+            if self.expecting (['FLOOR', 'WALL', 'CEILING']):
+                k = self.get ()
+                self._curRoom.defaultTextures[k] = self.get ()
+            else:
+                self.errorLine ("expecting FLOOR, WALL or CEILING after DEFAULT TEXTURE")
+        else:
+            self.errorLine ('expecting COLOUR or TEXTURE after DEFAULT')
+
+    #
+    #  soundDesc := "SOUND" "AT" posDesc string { "VOLUME" integer | "LOOPING" | "WAIT" integer } =:
+    #
+
+    def soundDesc (self):
+        self.expect ('SOUND')
+        self.expect ('AT')
+        if self.posDesc ():
+            pos = self._curPos
+            filename = self.get ()
+            volume, looping, wait = None, False, None
+            while self.expecting (['VOLUME', 'LOOPING', 'WAIT']):
+                if self.expecting (['VOLUME']):
+                    self.expect ('VOLUME')
+                    if self.integer ():
+                        volume = self._curInteger
+                    else:
+                        self.errorLine ('expecting an integer after the VOLUME keyword')
+                elif self.expecting (['LOOPING']):
+                    self.expect ('LOOPING')
+                    looping = True
+                else:
+                    self.expect ('WAIT')
+                    if self.integer ():
+                        wait = self._curInteger
+                    else:
+                        self.errorLine ('expecting an integer after the WAIT keyword')
+            self._curRoom.sounds += [[pos, filename, volume, looping, wait]]
+        else:
+            self.errorLine ('expecting a position for a sound')
+
+    #
+    #  roomDesc := "ROOM" integer { doorDesc | wallDesc | ammoDesc | lightDesc |
+    #                               insideDesc | weaponDesc | labelDesc |
+    #                               monsterDesc | spawnDesc | defaultDesc |
+    #                               soundDesc } "END" =:
+    #
+
+    def roomDesc (self):
+        if self.expecting (['ROOM']):
+            self.expect ('ROOM')
+            if self.integer ():
+                n = str (self._curInteger)
+                if n in self._map.rooms:
+                    self.errorLine ("room " + n + " has already been defined")
+                self._curRoom = self._map.addRoom (n)
+                while self.expecting (self._roomDesc):
+                    self._roomDesc[self.peek ()] (self)
+                self.expect ('END')
+                return True
+            else:
+                self.errorLine ('expecting an integer after ROOM')
+        return False
+
+    _roomDesc = {'DOOR': doorDesc, 'WALL': wallDesc, 'AMMO': ammoDesc,
+                 'WEAPON': weaponDesc, 'LABEL': labelDesc,
+                 'LIGHT': lightDesc, 'INSIDE': insideDesc,
+                 'MONSTER': monsterDesc, 'SPAWN': spawnDesc,
+                 'DEFAULT': defaultDesc, 'SOUND': soundDesc}
+
+    #
+    #  parsePen := roomDesc { roomDesc } "END." =:
+    #
+
+    def parsePen (self, i):
+        self.lexicalPen (i)
+        self._map = penMap ()
+        if self.roomDesc ():
+            while self.roomDesc ():
+                pass
+            self.expect ("END.")
+            return self._map
+        self.errorLine ('expecting ROOM')
+        return None
+
+
+#
+#  parsePen - parse the pen file, i, and return its penMap or None.
+#             filename is used in error messages.  If error is
+#             supplied it is called with the line number and text
+#             of each error.
+#
+
+def parsePen (i, filename, error = None):
+    return penParser (filename, error).parsePen (i)
+
+
+#
+#  readPen - parse the pen file, filename, and return its penMap or None.
+#
+
+def readPen (filename, error = None):
+    with open (filename, 'r') as i:
+        return parsePen (i, filename, error)
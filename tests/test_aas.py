@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2022
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  test_aas - check the searches and caches of the area awareness on
+#             the maps of the benchmark.  Only the txt map is needed.
+#
+
+import math
+import os
+import random
+import shutil
+import sys
+import threading
+
+import pytest
+
+topdir = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+sys.path.insert (0, topdir)
+
+import botaa
+import botbench
+import chpipeline
+
+
+#
+#  buildAas - return the area awareness of the txt map, lines, built
+#             with the txt2pen options, args.
+#
+
+def buildAas (tmp_path, lines, name = "test", args = None):
+    txtname = os.path.join (str (tmp_path), name + ".txt")
+    with open (txtname, 'w') as f:
+        f.write ("\n".join (lines) + "\n")
+    m = chpipeline.txt2model (txtname, args)
+    return chpipeline.model2aas (m, os.path.join (str (tmp_path), name + ".pen"))
+
+
+#
+#  tinyAas - return the area awareness of the tiny map.
+#
+
+def tinyAas (tmp_path):
+    txtname = os.path.join (str (tmp_path), "tiny.txt")
+    shutil.copy (os.path.join (topdir, "tiny.txt.txt"), txtname)
+    m = chpipeline.txt2model (txtname)
+    return chpipeline.model2aas (m, os.path.join (str (tmp_path), "tiny.pen"))
+
+
+#
+#  freeSquares - return the list of squares of the rooms of, a, which
+#                can be entered.
+#
+
+def freeSquares (a):
+    high = a._floor.high ()
+    free = []
+    for x in range (high[0] + 1):
+        for y in range (high[1] + 1):
+            if a._walkable (x, y) and (a.getRoom ([x, y]) != None):
+                free += [[x, y]]
+    return free
+
+
+#
+#  referenceCost - return the cost (as calcnav) of the route from, src,
+#                  to, dest, found by a search which uses no cache.
+#
+
+def referenceCost (a, src, dest):
+    cost = a._dijkstra (src, [(dest[0], dest[1])])[0]
+    if (dest[0], dest[1]) not in cost:
+        return None
+    return cost[(dest[0], dest[1])] + 1
+
+
+#
+#  routeCost - return the cost (as calcnav) of walking, route, from its
+#              first square, checking that each step is to a neighbour.
+#
+
+def routeCost (a, route):
+    cost = 1
+    for u, v in zip (route, route[1:]):
+        assert [v[0], v[1]] in [[n[0], n[1]] for n in a._getNeighbours (u)]
+        cost += a._getLength (v)
+    return cost
+
+
+#
+#  searchPairs - return, n, pairs of different squares of, a, which can
+#                reach each other.
+#
+
+def searchPairs (a, n, rnd):
+    free = freeSquares (a)
+    pairs = []
+    while len (pairs) < n:
+        src, dest = rnd.choice (free), rnd.choice (free)
+        if (src != dest) and (referenceCost (a, src, dest) != None):
+            pairs += [[src, dest]]
+    return pairs
+
+
+@pytest.mark.parametrize ("seed", range (4))
+def test_room_search_is_exact_in_a_maze (tmp_path, seed):
+    rnd = random.Random (seed)
+    a = buildAas (tmp_path, botbench.mazeMap (3, 3, 4, seed))
+    for src, dest in searchPairs (a, 30, rnd):
+        expected = referenceCost (a, src, dest)
+        assert a.calcnav (src, dest, botaa.gridSearch) == expected
+        assert a.calcnav (src, dest, botaa.roomSearch) == expected
+        assert a._route[0] == src
+        assert a._route[-1] == dest
+        assert routeCost (a, a._route) == expected
+
+
+@pytest.mark.parametrize ("seed", range (4))
+def test_room_search_routes_are_walkable (tmp_path, seed):
+    rnd = random.Random (seed)
+    a = buildAas (tmp_path, botbench.doorsMap (2, 3, 5, seed))
+    for src, dest in searchPairs (a, 30, rnd):
+        cost = a.calcnav (src, dest, botaa.roomSearch)
+        assert cost >= referenceCost (a, src, dest)
+        assert a._route[0] == src
+        assert a._route[-1] == dest
+        assert routeCost (a, a._route) == cost
+
+
+@pytest.mark.parametrize ("seed", range (4))
+def test_jump_search_is_exact (tmp_path, seed):
+    rnd = random.Random (seed)
+    a = buildAas (tmp_path, botbench.doorsMap (2, 2, 7, seed), args=["-l", "-f", "3"])
+    assert sum ([len (a._pillars (r)) for r in a._map.rooms.values ()]) > 0
+    free = freeSquares (a)
+    for i in range (len (free) // 8):
+        p = rnd.choice (free)
+        a.setBlocked (p)
+    for src, dest in searchPairs (a, 40, rnd):
+        expected = referenceCost (a, src, dest)
+        assert a.calcnav (src, dest, botaa.jumpSearch) == expected
+        assert a._route[0] == src
+        assert a._route[-1] == dest
+        assert routeCost (a, a._route) == expected
+
+
+@pytest.mark.parametrize ("seed", range (4))
+def test_nearest_matches_calcnav (tmp_path, seed):
+    rnd = random.Random (seed)
+    a = buildAas (tmp_path, botbench.doorsMap (2, 3, 5, seed))
+    free = freeSquares (a)
+    for i in range (10):
+        p = rnd.choice (free)
+        a.setPenalty (p, rnd.randint (1, 20))
+    src = rnd.choice (free)
+    for i in range (20):
+        targets = [t for t in rnd.sample (free, rnd.randint (1, 6)) if t != src]
+        costs = [a.calcnav (src, t) for t in targets]
+        found = a.nearest (src, targets)
+        if targets == []:
+            assert found == None
+        else:
+            assert found[0] in targets
+            assert found[1] == min (costs)
+            assert found[1] == costs[targets.index (found[0])]
+            assert a._route[0] == src
+            assert routeCost (a, a._route) == found[1]
+
+
+def test_nearest_ignores_unreachable_targets (tmp_path):
+    a = tinyAas (tmp_path)
+    assert a.nearest ((4, 16), [(99, 99), (-1, -1)]) == None
+    found = a.nearest ((4, 16), [(99, 99), (10, 16)])
+    assert found == [[10, 16], a.calcnav ([4, 16], [10, 16])]
+
+
+@pytest.mark.parametrize ("seed", range (3))
+def test_flow_field_matches_calcnav (tmp_path, seed):
+    rnd = random.Random (seed)
+    a = buildAas (tmp_path, botbench.doorsMap (2, 3, 5, seed))
+    free = freeSquares (a)
+    for i in range (10):
+        a.setPenalty (rnd.choice (free), rnd.randint (1, 20))
+    dest = rnd.choice (free)
+    f = a.getFlowField (dest)
+    for src in free:
+        if src != dest:
+            cost = referenceCost (a, src, dest)
+            if cost == None:
+                assert f.cost (src) == None
+                assert a.nextHop (src, dest) == None
+            else:
+                assert f.cost (src) + 1 == cost
+                route = f.route (src)
+                assert route[0] == src
+                assert route[-1] == dest
+                assert routeCost (a, route) == cost
+                assert a.nextHop (src, dest) == route[1]
+
+
+def test_flow_fields_are_shared_while_costs_are_uniform (tmp_path):
+    lines = botbench.hallMap (20, 10)
+    a = buildAas (tmp_path, lines, "shared")
+    b = buildAas (tmp_path, lines, "shared")
+    assert a.getFlowField ([5, 5]) is b.getFlowField ([5, 5])
+    for y in range (12):
+        a.setPenalty ((6, y), 10)
+    f = a.getFlowField ([5, 5])
+    assert f is not b.getFlowField ([5, 5])
+    assert f.cost ([7, 5]) == b.getFlowField ([5, 5]).cost ([7, 5]) + 10
+    assert a.getFlowField ([5, 5]) is f
+    a.setBlocked ((6, 5))
+    assert a.getFlowField ([5, 5]) is not f
+
+
+#
+#  hopsFrom - return a dictionary mapping each square of, a, within,
+#             limit, steps of square, p, onto its number of steps.
+#
+
+def hopsFrom (a, p, limit):
+    hops = {(p[0], p[1]): 0}
+    frontier = [(p[0], p[1])]
+    for step in range (1, limit + 1):
+        reached = []
+        for u in frontier:
+            for v in a._getNeighbours (u):
+                v = (v[0], v[1])
+                if v not in hops:
+                    hops[v] = step
+                    reached += [v]
+        frontier = reached
+    return hops
+
+
+def test_influence_spreads_around_walls (tmp_path):
+    a = buildAas (tmp_path, botbench.doorsMap (1, 2, 5, 1))
+    m = a.getInfluence ()
+    p = [5, 3]
+    m.setPresence ("enemy", "enemy", p, 2)
+    hops = hopsFrom (a, p, botaa.influenceRadius)
+    for q in freeSquares (a):
+        h = hops.get ((q[0], q[1]), None)
+        expected = 0
+        if h != None:
+            v = 2 * botaa.influenceFalloff ** h
+            if v >= botaa.influenceMinimum:
+                expected = v
+        assert m.get ("enemy", q) == pytest.approx (expected)
+
+
+def test_presence_moves_and_events_fade (tmp_path):
+    a = buildAas (tmp_path, botbench.hallMap (20, 10))
+    m = a.getInfluence ()
+    m.setPresence ("enemy", "enemy", [5, 5], 1)
+    m.setPresence ("enemy", "enemy", [15, 5], 1)
+    assert m.get ("enemy", [5, 5]) == 0
+    assert m.get ("enemy", [15, 5]) == 1
+    m.removePresence ("enemy")
+    assert m.get ("enemy", [15, 5]) == 0
+    m.addEvent ("damage", [5, 5], 1)
+    m.tick ()
+    assert m.get ("damage", [5, 5]) == pytest.approx (botaa.influenceDecay)
+    for i in range (40):
+        m.tick ()
+    assert m.get ("damage", [5, 5]) == 0
+    assert m._events["damage"] == {}
+
+
+def test_influence_is_a_cost_layer (tmp_path):
+    a = buildAas (tmp_path, botbench.hallMap (20, 10))
+    src, dest = [2, 5], [18, 5]
+    plain = a.calcnav (src, dest)
+    m = a.getInfluence ()
+    for y in range (12):
+        m.setPresence (("wall", y), "threat", [10, y], 1)
+    a.applyInfluence ({"threat": 10})
+    costs = m.costs ({"threat": 10})
+    assert costs[(10, 5)] == int (10 * m.get ("threat", [10, 5]))
+    assert m.costs ({"threat": 0}) == {}
+    cost = a.calcnav (src, dest)
+    assert cost > plain
+    assert cost == referenceCost (a, src, dest)
+    assert routeCost (a, a._route) == cost
+    a.clearInfluence ()
+    assert a.calcnav (src, dest) == plain
+
+
+def test_unblock_reaches_square_again (tmp_path):
+    a = tinyAas (tmp_path)
+    a.setBlocked ((10, 16))
+    assert a.nearest ((4, 16), [(10, 16)]) == None
+    assert a.calcnav ([4, 16], [10, 16]) == None
+    assert a.nearest ((4, 16), [(99, 99)]) == None
+    a.setBlocked ((10, 16), False)
+    assert a.nearest ((4, 16), [(10, 16)]) == [[10, 16], 7]
+    assert a.calcnav ([4, 16], [10, 16]) == 7
+
+
+def test_far_change_keeps_route (tmp_path):
+    a = buildAas (tmp_path, botbench.hallMap (40, 20))
+    a.calcnav ([2, 2], [6, 2])
+    a.setPenalty ((35, 18), 5)
+    a.calcnav ([2, 2], [6, 2])
+    assert a.routeCacheStats ()["hits"] == 1
+    a.setPenalty ((4, 2), 5)
+    a.calcnav ([2, 2], [6, 2])
+    assert a.routeCacheStats ()["hits"] == 1
+
+
+def test_route_cache_forgets_least_recent (tmp_path, monkeypatch):
+    monkeypatch.setattr (botaa, "routeCacheSize", 3)
+    a = buildAas (tmp_path, botbench.hallMap (20, 10))
+    ends = [[[2, 2], [2, 3 + i]] for i in range (4)]
+    for src, dest in ends[:3]:
+        a.calcnav (src, dest)
+    a.calcnav (ends[0][0], ends[0][1])
+    a.calcnav (ends[3][0], ends[3][1])
+    assert a.routeCacheStats ()["size"] == 3
+    hits = a.routeCacheStats ()["hits"]
+    a.calcnav (ends[0][0], ends[0][1])
+    assert a.routeCacheStats ()["hits"] == hits + 1
+    a.calcnav (ends[1][0], ends[1][1])
+    assert a.routeCacheStats ()["hits"] == hits + 1
+
+
+def test_remembered_route_is_not_shortened (tmp_path):
+    a = buildAas (tmp_path, botbench.hallMap (20, 10))
+    cost = a.calcnav ([2, 2], [12, 6])
+    route = list (a._route)
+    a.removeHop (0, route[0])
+    assert a.calcnav ([2, 2], [12, 6]) == cost
+    assert a._route == route
+    assert a.routeCacheStats ()["hits"] == 1
+
+
+def test_caches_follow_changes (tmp_path):
+    rnd = random.Random (1)
+    a = buildAas (tmp_path, botbench.doorsMap (2, 3, 5, 1))
+    free = freeSquares (a)
+    for i in range (200):
+        p = rnd.choice (free)
+        change = rnd.randint (0, 2)
+        if change == 0:
+            a.setBlocked (p, (p[0], p[1]) not in a._blocked)
+        elif change == 1:
+            a.setPenalty (p, rnd.choice ([0, 0, 3, 20]))
+        else:
+            a.decayPenalties ()
+        src = rnd.choice (free[:10])
+        dest = rnd.choice (free)
+        if (not a._walkable (src[0], src[1])) or (src == dest):
+            continue
+        expected = referenceCost (a, src, dest)
+        assert a.calcnav (src, dest) == expected
+        assert a.calcnav (src, dest, botaa.jumpSearch) == expected
+        cached = a.calcnav (src, dest, botaa.roomSearch)
+        a._routes.clear ()
+        assert a.calcnav (src, dest, botaa.roomSearch) == cached
+        found = a.nearest (src, [dest])
+        if expected == None:
+            assert found == None
+        else:
+            assert found == [dest, expected]
+
+
+def test_prefetch_answers_calcnav (tmp_path):
+    a = buildAas (tmp_path, botbench.doorsMap (2, 3, 5, 2))
+    free = freeSquares (a)
+    src, dest = free[0], free[-1]
+    a.prefetch (src, dest)
+    assert a.routeCacheStats ()["prefetches"] == 1
+    assert a.calcnav (src, dest) == referenceCost (a, src, dest)
+    assert a.routeCacheStats ()["prefetch_hits"] == 1
+    a.prefetch (src, dest)
+    assert a.routeCacheStats ()["prefetches"] == 1
+    a.setPenalty (a._route[len (a._route) // 2], 50)
+    assert a.calcnav (src, dest) == referenceCost (a, src, dest)
+    assert a.routeCacheStats ()["prefetch_hits"] == 1
+
+
+def test_prefetch_on_worker_thread (tmp_path):
+    rnd = random.Random (3)
+    a = buildAas (tmp_path, botbench.doorsMap (2, 3, 5, 3))
+    free = freeSquares (a)
+    pairs = [[rnd.choice (free), rnd.choice (free)] for i in range (60)]
+    worker = threading.Thread (target=lambda: [a.prefetch (src, dest) for src, dest in pairs])
+    worker.start ()
+    for i in range (200):
+        p = rnd.choice (free)
+        a.setBlocked (p, (p[0], p[1]) not in a._blocked)
+    worker.join ()
+    for src, dest in pairs:
+        if a._walkable (src[0], src[1]) and (src != dest):
+            assert a.calcnav (src, dest) == referenceCost (a, src, dest)
+
+
+#
+#  clearRay - return True if every point sampled every 1/20 of a square
+#             along the line from, p, to, q, lies in a square of, a,
+#             which is not opaque or holds an end of the line.
+#
+
+def clearRay (a, p, q):
+    ends = [(math.floor (p[0]), math.floor (p[1])), (math.floor (q[0]), math.floor (q[1]))]
+    n = int (max (abs (q[0]-p[0]), abs (q[1]-p[1])) * 20) + 1
+    for i in range (n + 1):
+        x = math.floor (p[0] + (q[0]-p[0]) * i / n)
+        y = math.floor (p[1] + (q[1]-p[1]) * i / n)
+        if ((x, y) not in ends) and (a._opaque.get (x, y) != 0):
+            return False
+    return True
+
+
+#
+#  sampledSight - return True if one of, samples, random lines between
+#                 points of the squares, src, and, dest, is clear.
+#
+
+def sampledSight (a, src, dest, samples, rnd):
+    for i in range (samples):
+        p = (src[0] + rnd.random (), src[1] + rnd.random ())
+        q = (dest[0] + rnd.random (), dest[1] + rnd.random ())
+        if clearRay (a, p, q):
+            return True
+    return False
+
+
+def test_line_of_sight_is_conservative (tmp_path):
+    rnd = random.Random (1)
+    blocked = 0
+    for seed in range (6):
+        a = buildAas (tmp_path, botbench.doorsMap (rnd.randint (1, 3), rnd.randint (2, 3),
+                                                   rnd.randint (3, 6), seed), "sight%d" % seed)
+        free = freeSquares (a)
+        for i in range (150):
+            src = rnd.choice (free)
+            dest = rnd.choice (free)
+            if not a.lineOfSight (src, dest):
+                blocked += 1
+                assert not sampledSight (a, src, dest, 300, rnd)
+    assert blocked > 0
+
+
+def test_fast_bot_keeps_slow_reservations ():
+    table = botaa.reservationTable ()
+    table.reserve (1, [(1, 1), (2, 1), (3, 1)], 0)
+    table.reserve (2, [(1, 5), (2, 5), (3, 5)], 0)
+    table.advanceOwner (1, 2)
+    assert table.now () == 0
+    assert not table.isFree ((2, 5), 1, 1)
+    table.advanceOwner (2, 2)
+    assert table.now () == 2
+    assert table.isFree ((2, 5), 1, 1)
+
+
+#
+#  cooperativeBots - return the area awareness of each of, n, bots on
+#                    the txt map, lines, sharing one reservation table.
+#
+
+def cooperativeBots (tmp_path, lines, n):
+    txtname = os.path.join (str (tmp_path), "coop.txt")
+    with open (txtname, 'w') as f:
+        f.write ("\n".join (lines) + "\n")
+    m = chpipeline.txt2model (txtname)
+    penname = os.path.join (str (tmp_path), "coop.pen")
+    return [chpipeline.model2aas (m, penname) for i in range (n)]
+
+
+@pytest.mark.parametrize ("seed", range (4))
+def test_cooperative_bots_never_collide (tmp_path, seed):
+    rnd = random.Random (seed)
+    bots = cooperativeBots (tmp_path, botbench.doorsMap (2, 2, 4, seed), 5)
+    free = freeSquares (bots[0])
+    pos = [tuple (p) for p in rnd.sample (free, len (bots))]
+    dest = [rnd.choice (free) for a in bots]
+    for i, a in enumerate (bots):
+        a.calcnavCooperative (list (pos[i]), dest[i], i)
+    arrived = 0
+    for t in range (150):
+        order = list (range (len (bots)))
+        rnd.shuffle (order)
+        new = list (pos)
+        for i in order:
+            a = bots[i]
+            assert a.calcnavCooperative (list (pos[i]), dest[i], i) != None
+            if (a.scheduledWait (pos[i]) == 0) and (a.noOfHops () > 1):
+                new[i] = tuple (a.getHop (1))
+            a.advanceSchedule (1)
+        assert len (set (new)) == len (bots)
+        for i in range (len (bots)):
+            for j in range (len (bots)):
+                assert (i == j) or (new[i] == pos[i]) or (new[i] != pos[j]) or (new[j] != pos[i])
+        pos = new
+        for i in range (len (bots)):
+            if list (pos[i]) == dest[i]:
+                arrived += 1
+                dest[i] = rnd.choice (free)
+    assert arrived > 0
+    for i, a in enumerate (bots):
+        a.releaseRoute (i)
+    assert bots[0].getReservations ()._owned == {}
+
+
+#
+#  fakeGame - the entities of a game as seen by the bot, me.  Each
+#             entity is given by its classname and pen square.
+#
+
+class fakeGame:
+    def __init__ (self, me, entities):
+        self._me = me
+        self._entities = entities
+
+    def me (self):
+        return self._me
+
+    def allobj (self):
+        return list (range (1, len (self._entities) + 1))
+
+    def objectname (self, e):
+        return self._entities[e - 1][0]
+
+    def getpos (self, e):
+        return self._entities[e - 1][1]
+
+    def d2pv (self, v):
+        return [v[0], v[1]]
+
+
+def test_entities_in_the_way_are_penalised (tmp_path):
+    a = tinyAas (tmp_path)
+    game = fakeGame (2, [["player", [4, 16]],
+                         ["python_doommarine_mp", [5, 16]],
+                         ["ammo_shells", [6, 16]],
+                         ["weapon_2", [7, 16]],
+                         ["monster_demon_imp", [8, 16]]])
+    a.updateKnowlege (game)
+    assert sorted (a._penalties.keys ()) == [(4, 16), (8, 16)]
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2022
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+#
+#  test_botsim - check that the bots of the simulated server step the
+#                world together rather than each advancing it.
+#
+
+import os
+import shutil
+import sys
+import threading
+
+topdir = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+sys.path.insert (0, topdir)
+
+import botsim
+import chpipeline
+
+
+#
+#  tinyWorld - return a world of the tiny map with the bots, names.
+#
+
+def tinyWorld (tmp_path, names):
+    txtname = os.path.join (str (tmp_path), "tiny.txt")
+    shutil.copy (os.path.join (topdir, "tiny.txt.txt"), txtname)
+    penname = os.path.join (str (tmp_path), "tiny.pen")
+    chpipeline.writePen (chpipeline.txt2model (txtname), penname)
+    return botsim.world (penname, names)
+
+
+#
+#  turnTogether - turn each bot of, w, by, angles, at, rate, degrees
+#                 per tick from its own thread and return the ticks
+#                 simulated.
+#
+
+def turnTogether (w, angles, rate):
+    ids = [w.botId (n) for n in w.botNames ()]
+    for i in ids:
+        w.connect (i)
+    done = []
+
+    def turn (i, angle):
+        w.startTurn (i, angle, rate)
+        done.append (w.select (i, botsim.turnBit))
+        w.disconnect (i)
+
+    threads = [threading.Thread (target=turn, args=(i, a)) for i, a in zip (ids, angles)]
+    for t in threads:
+        t.start ()
+    for t in threads:
+        t.join (10)
+    assert done == [botsim.turnBit] * len (ids)
+    return w.getTicks ()
+
+
+def test_one_bot_ticks (tmp_path):
+    w = tinyWorld (tmp_path, ["bot 1"])
+    assert turnTogether (w, [90], 3) == 30
+
+
+def test_bots_tick_once_per_step (tmp_path):
+    names = ["bot %d" % n for n in range (4)]
+    w = tinyWorld (tmp_path, names)
+    assert turnTogether (w, [90] * len (names), 3) == 30
+
+
+def test_bots_tick_until_the_longest_turn (tmp_path):
+    w = tinyWorld (tmp_path, ["bot 1", "bot 2", "bot 3"])
+    assert turnTogether (w, [30, 90, 60], 3) == 30
+
+
+def test_idle_bot_does_not_stop_the_world (tmp_path):
+    w = tinyWorld (tmp_path, ["bot 1", "bot 2"])
+    idle = w.botId ("bot 2")
+    w.connect (idle)
+    busy = w.botId ("bot 1")
+    w.startTurn (busy, 9, 3)
+    assert w.select (busy, botsim.turnBit) == botsim.turnBit
+    assert w.getTicks () == 3
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2022
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  test_chgrid - check the compact grids against a dictionary holding
+#                the same squares.
+#
+
+import os
+import random
+import sys
+
+import pytest
+
+topdir = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+sys.path.insert (0, topdir)
+
+from chgrid import numberGrid, glyphGrid
+
+
+def test_grid_matches_dictionary ():
+    rnd = random.Random (1)
+    g = numberGrid (3, 2, 1)
+    d = {}
+    for i in range (2000):
+        x, y = rnd.randint (0, 60), rnd.randint (0, 40)
+        v = rnd.randint (0, 255)
+        g.set (x, y, v)
+        d[(x, y)] = v
+    width = max ([3] + [k[0] + 1 for k in d])
+    height = max ([2] + [k[1] + 1 for k in d])
+    assert g.high () == [width, height]
+    for x in range (-2, width + 3):
+        for y in range (-2, height + 3):
+            assert g.get (x, y) == d.get ((x, y), 1)
+            assert g.inRange (x, y) == ((0 <= x < width) and (0 <= y < height))
+    for y in range (height):
+        assert list (g.row (y)) == [d.get ((x, y), 1) for x in range (width)]
+
+
+def test_grid_rejects_negative_squares ():
+    g = numberGrid (2, 2)
+    with pytest.raises (IndexError):
+        g.set (-1, 0, 1)
+
+
+def test_wide_grid_holds_large_values ():
+    g = numberGrid (2, 2, 0, 'H')
+    g.set (1, 1, 60000)
+    assert g.get (1, 1) == 60000
+    with pytest.raises (OverflowError):
+        numberGrid (2, 2).set (0, 0, 256)
+
+
+def test_glyph_grid_rows ():
+    g = glyphGrid (4, 2)
+    g.set (1, 0, '#')
+    g.set (5, 1, 'S')
+    assert g.get (1, 0) == '#'
+    assert g.get (9, 9) == ' '
+    assert g.high () == [6, 2]
+    assert g.rowText (0) == " #    "
+    assert g.rowText (1) == "     S"
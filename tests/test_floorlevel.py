@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2022
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  test_floorlevel - compare the floor levels of pen2map's calcFloorLevel
+#                    (union-find and a single BFS) with those of the
+#                    original lowerFloors search on tiny.txt and on
+#                    generated maps with and without secret doors.
+#
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip ("student.chcuboid")
+
+topdir = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+sys.path.insert (0, topdir)
+
+import botbench
+import chpipeline
+
+
+#
+#  secretDoors - return the txt map, lines, with every door in the wall
+#                columns whose index is a multiple of, every, turned
+#                into a secret door.
+#
+
+def secretDoors (lines, every):
+    result = []
+    for l in lines:
+        row = list (l)
+        for x, c in enumerate (row):
+            if (c == '.') and (x % every == 0):
+                row[x] = '='
+        result += ["".join (row)]
+    return result
+
+
+#
+#  floorMaps - return a list of [name, txt lines] of the maps to compare.
+#
+
+def floorMaps ():
+    with open (os.path.join (topdir, "tiny.txt.txt"), 'r') as f:
+        tiny = [l.rstrip ("\r\n") for l in f.readlines ()]
+    rooms = botbench.roomsMap (3, 4, 6)
+    return [["tiny", tiny],
+            ["maze", botbench.mazeMap (4, 4, 6, 1)],
+            ["rooms", rooms],
+            ["secret", secretDoors (rooms, 14)]]
+
+
+#
+#  oldFloorLevels - return the floor level of each room computed by
+#                   lowerFloors in the pen2map module, p.
+#
+
+def oldFloorLevels (p):
+    for r in p.rooms.keys ():
+        p.rooms[r].floorLevel = None
+    for s in p.getVirtualRoom (p.getSpawnRoom ()):
+        p.rooms[s].floorLevel = 0
+    p.lowerFloors (p.getSpawnRoom ())
+    levels = {}
+    for r in p.rooms.keys ():
+        levels[r] = p.rooms[r].floorLevel
+        if levels[r] is None:
+            levels[r] = 0
+    return levels
+
+
+#
+#  newFloorLevels - return the floor level of each room computed by
+#                   calcFloorLevel in the pen2map module, p.
+#
+
+def newFloorLevels (p):
+    p.calcFloorLevel ()
+    levels = {}
+    for r in p.rooms.keys ():
+        levels[r] = p.rooms[r].floorLevel
+    return levels
+
+
+@pytest.mark.parametrize ("name, lines", floorMaps ())
+def test_floor_levels (tmp_path, name, lines):
+    txtname = os.path.join (str (tmp_path), name + ".txt")
+    with open (txtname, 'w') as f:
+        f.write ("\n".join (lines) + "\n")
+    m = chpipeline.txt2model (txtname)
+    p = chpipeline.loadTool ("pen2map")
+    p.handleOptions (["-m", "-f", os.path.join (str (tmp_path), name + ".pen")])
+    assert p.loadModel (m)
+    assert newFloorLevels (p) == oldFloorLevels (p)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2022
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  test_pipeline - round trip tiny.txt through txt2pen and pen2map both
+#                  as command line tools and in process with chpipeline
+#                  and check that the maps are identical.  The maps built
+#                  with -j and -i must match the sequential build.
+#
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip ("student.chcuboid")
+
+topdir = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+sys.path.insert (0, topdir)
+
+import chpipeline
+
+
+#
+#  runTool - run the command line tool, name, with args in directory, d.
+#
+
+def runTool (name, args, d):
+    env = dict (os.environ)
+    env["PYTHONPATH"] = os.pathsep.join ([topdir] + sys.path)
+    subprocess.run ([sys.executable, os.path.join (topdir, name + ".py.txt")] + args,
+                    cwd=d, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+#
+#  readLines - return the lines of file, name.
+#
+
+def readLines (name):
+    with open (name, 'r') as f:
+        return f.readlines ()
+
+
+@pytest.mark.parametrize ("options", [["-m"], ["-m", "-b"], ["-m", "-f"], ["-m", "-q"]])
+def test_round_trip (tmp_path, options):
+    d = str (tmp_path)
+    shutil.copy (os.path.join (topdir, "tiny.txt.txt"), os.path.join (d, "tiny.txt"))
+    runTool ("txt2pen", ["-o", "tiny.pen", "tiny.txt"], d)
+    runTool ("pen2map", options + ["-o", "cli.map", "tiny.pen"], d)
+    cwd = os.getcwd ()
+    os.chdir (d)
+    try:
+        m = chpipeline.build ("tiny.txt", "api.map", "api.pen", None, options)
+    finally:
+        os.chdir (cwd)
+    assert m != None
+    assert readLines (os.path.join (d, "api.pen")) == readLines (os.path.join (d, "tiny.pen"))
+    cli = readLines (os.path.join (d, "cli.map"))
+    api = [l.replace ("api.pen", "tiny.pen") for l in readLines (os.path.join (d, "api.map"))]
+    assert cli == api
+    labels = [l for l in cli if l.strip ().startswith ('"label"')]
+    assert len (labels) == sum ([len (r.labels) for r in m.rooms.values ()])
+
+
+@pytest.mark.parametrize ("options", [["-j", "2"], ["-i", "cache"], ["-i", "cache", "-j", "2"]])
+def test_local_rooms_match_sequential (tmp_path, options):
+    d = str (tmp_path)
+    shutil.copy (os.path.join (topdir, "tiny.txt.txt"), os.path.join (d, "tiny.txt"))
+    runTool ("txt2pen", ["-o", "tiny.pen", "tiny.txt"], d)
+    runTool ("pen2map", ["-m", "-O", "-o", "sequential.map", "tiny.pen"], d)
+    runTool ("pen2map", ["-m", "-O"] + options + ["-o", "local.map", "tiny.pen"], d)
+    assert readLines (os.path.join (d, "local.map")) == readLines (os.path.join (d, "sequential.map"))
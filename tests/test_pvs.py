@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2022
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  test_pvs - check that the potentially visible set never hides a room
+#             which a finely sampled ray can see, on grids of rooms
+#             whose doors are placed at random offsets.
+#
+
+import math
+import os
+import random
+import sys
+
+import pytest
+
+topdir = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+sys.path.insert (0, topdir)
+
+import botbench
+import chpipeline
+import chpvs
+
+
+#
+#  buildModel - return the map model of the txt map, lines.
+#
+
+def buildModel (tmp_path, lines):
+    txtname = os.path.join (str (tmp_path), "doors.txt")
+    with open (txtname, 'w') as f:
+        f.write ("\n".join (lines) + "\n")
+    return chpipeline.txt2model (txtname)
+
+
+#
+#  openSquares - return the set of floor and door squares of map, m.
+#
+
+def openSquares (m, plan):
+    free = set (plan.keys ())
+    for r in m.rooms.values ():
+        for d in r.doors:
+            free.update (chpvs.doorSquares (d[0]))
+    return free
+
+
+#
+#  clearRay - return True if every point sampled every 1/20 of a square
+#             along the line from, p, to, q, lies in an open square.
+#
+
+def clearRay (free, p, q):
+    n = int (max (abs (q[0]-p[0]), abs (q[1]-p[1])) * 20) + 1
+    for i in range (n + 1):
+        x = p[0] + (q[0]-p[0]) * i / n
+        y = p[1] + (q[1]-p[1]) * i / n
+        if (math.floor (x), math.floor (y)) not in free:
+            return False
+    return True
+
+
+#
+#  seenRooms - return the pairs of rooms of map, m, joined by a clear
+#              ray between random points of their floors.
+#
+
+def seenRooms (m, samples, rnd):
+    plan = chpvs.floorPlan (m)
+    free = openSquares (m, plan)
+    squares = {}
+    for p, n in plan.items ():
+        squares.setdefault (n, []).append (p)
+    seen = set ()
+    for a in squares:
+        for b in squares:
+            if (a < b) and ((a, b) not in seen):
+                for i in range (samples):
+                    p = rnd.choice (squares[a])
+                    q = rnd.choice (squares[b])
+                    p = (p[0] + rnd.random (), p[1] + rnd.random ())
+                    q = (q[0] + rnd.random (), q[1] + rnd.random ())
+                    if clearRay (free, p, q):
+                        seen.add ((a, b))
+                        break
+    return seen
+
+
+@pytest.mark.parametrize ("seed", range (12))
+def test_pvs_never_hides_a_visible_room (tmp_path, seed):
+    rnd = random.Random (seed)
+    m = buildModel (tmp_path, botbench.doorsMap (rnd.randint (1, 3), rnd.randint (2, 4),
+                                                 rnd.randint (3, 7), seed))
+    pvs = chpvs.computePvs (m)
+    for a, b in seenRooms (m, 300, rnd):
+        assert b in pvs[a]
+        assert a in pvs[b]
+
+
+def test_pvs_culls_rooms (tmp_path):
+    m = buildModel (tmp_path, botbench.mazeMap (4, 4, 6, 1))
+    pvs = chpvs.computePvs (m)
+    assert sum ([len (l) for l in pvs.values ()]) < len (pvs) * len (pvs)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2022
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  test_startup - check that the bulk startup request is only sent to
+#                 a server which sets the bulk_startup tag and that a
+#                 closed connection is reported rather than waited on.
+#
+
+import os
+import socket
+import sys
+
+import pytest
+
+topdir = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+sys.path.insert (0, topdir)
+
+import botbasic
+import botcache
+
+
+#
+#  fakeBasic - a server connection which answers the tags, tags, and
+#              the startup request with, startup, recording the
+#              requests made.
+#
+
+class fakeBasic:
+    def __init__ (self, tags, startup):
+        self._tags = tags
+        self._startup = startup
+        self.requests = []
+
+    def getTag (self, name):
+        self.requests += ["tag " + name]
+        return self._tags.get (name, "")
+
+    def getStartup (self, names):
+        self.requests += ["get_startup"]
+        return self._startup
+
+
+#
+#  fakeCache - return a cache using the server connection, b.
+#
+
+def fakeCache (b):
+    c = botcache.cache.__new__ (botcache.cache)
+    c._basic = b
+    c._dict = {}
+    return c
+
+
+def test_startup_needs_tag ():
+    b = fakeBasic ({}, None)
+    c = fakeCache (b)
+    assert not c.startup (["penmap"])
+    assert "get_startup" not in b.requests
+
+
+def test_startup_reads_tag_once ():
+    b = fakeBasic ({"bulk_startup": "true"},
+                   [3, "python_doommarine_mp", [1, 2, 0], [4, 5, 0], ["tiny.pen"]])
+    c = fakeCache (b)
+    assert c.startup (["penmap"])
+    assert c.me () == 3
+    assert c.getTag ("bulk_startup") == "true"
+    assert c.getTag ("penmap") == "tiny.pen"
+    assert b.requests == ["tag bulk_startup", "get_startup"]
+
+
+def test_closed_connection_raises ():
+    a, b = socket.socketpair ()
+    c = botbasic.basic.__new__ (botbasic.basic)
+    c.s = a
+    b.sendall (b"partial")
+    b.close ()
+    with pytest.raises (ConnectionError):
+        c.getLine ()
+    a.close ()
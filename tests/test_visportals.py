@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2017-2022
+#               Free Software Foundation, Inc.
+# This file is part of Chisel.
+#
+# Chisel is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# Chisel is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Chisel; see the file COPYING.  If not, write to the
+# Free Software Foundation, 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+#
+#  test_visportals - check that the visportals planned by pen2map -p
+#                    seal every area: no visportal has the same area
+#                    on both of its sides.
+#
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip ("student.chcuboid")
+
+topdir = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+sys.path.insert (0, topdir)
+
+import botbench
+import chpipeline
+
+
+#
+#  portalMaps - return a list of [name, txt lines] of the maps to plan.
+#
+
+def portalMaps ():
+    with open (os.path.join (topdir, "tiny.txt.txt"), 'r') as f:
+        tiny = [l.rstrip ("\r\n") for l in f.readlines ()]
+    return [["tiny", tiny],
+            ["maze", botbench.mazeMap (4, 4, 6, 1)],
+            ["rooms", botbench.roomsMap (3, 4, 8)],
+            ["doors", botbench.doorsMap (2, 4, 6, 3)]]
+
+
+@pytest.mark.parametrize ("name, lines", portalMaps ())
+def test_visportals_seal_areas (tmp_path, name, lines):
+    txtname = os.path.join (str (tmp_path), name + ".txt")
+    with open (txtname, 'w') as f:
+        f.write ("\n".join (lines) + "\n")
+    m = chpipeline.txt2model (txtname)
+    p = chpipeline.loadTool ("pen2map")
+    p.handleOptions (["-m", "-p", os.path.join (str (tmp_path), name + ".pen")])
+    assert p.loadModel (m)
+    p.assignFloorLevel (0)
+    p.findOffsets ()
+    p.initRoomFloor ()
+    p.planVisportals ()
+    parent = {}
+    for r in p.rooms.keys ():
+        parent[r] = r
+    doors = []
+    for r in p.rooms.keys ():
+        for d in p.rooms[r].doors:
+            if d[1] in p.rooms:
+                if p.wantPortal (d[0]):
+                    doors += [[r, d[1]]]
+                else:
+                    parent[p.findVirtualRoom (parent, d[1])] = p.findVirtualRoom (parent, r)
+    assert p.portalPlan != {}
+    for r, n in doors:
+        assert p.findVirtualRoom (parent, r) != p.findVirtualRoom (parent, n)